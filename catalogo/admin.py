@@ -3,7 +3,8 @@ from django.contrib import admin
 # Register your models here.
 
 from django.contrib import admin
-from .models import Movie
+from .models import EnrichmentState, Movie, Volume
+from .search import fts_available, search_movies
 
 
 @admin.register(Movie)
@@ -19,12 +20,39 @@ class MovieAdmin(admin.ModelAdmin):
         "ultima_visione",
     )
     list_filter = (
-        "genere",
-        "regista",
+        "generi",
+        "registi",
         "visto",
         "codifica",
         "estensione",
         "anno",
         "voto",
+        "disponibile",
     )
     search_fields = ("titolo", "regista", "genere", "percorso")
+
+    def get_search_results(self, request, queryset, search_term):
+        # ricerca sull'indice full-text invece di un LIKE per campo (vedi search.py)
+        if not search_term.strip() or not fts_available():
+            return super().get_search_results(request, queryset, search_term)
+        return search_movies(queryset, search_term), False
+
+
+@admin.register(Volume)
+class VolumeAdmin(admin.ModelAdmin):
+    list_display = ("path", "online", "checked_at")
+    list_filter = ("online",)
+
+
+@admin.register(EnrichmentState)
+class EnrichmentStateAdmin(admin.ModelAdmin):
+    list_display = (
+        "movie",
+        "outcome",
+        "source",
+        "misses",
+        "last_attempt",
+        "next_attempt",
+    )
+    list_filter = ("outcome", "source")
+    search_fields = ("movie__titolo",)
@@ -0,0 +1,262 @@
+"""
+Cache persistente delle risposte di TMDB e OMDb.
+
+Le risposte JSON vengono salvate in un file SQLite a parte (non nel DB del
+catalogo: così le scritture della cache non contendono il lock del DB durante
+gli aggiornamenti in blocco), con chiave = endpoint + parametri normalizzati
+(senza api_key, testo della ricerca in minuscolo e senza spazi doppi).
+
+Ogni endpoint ha la sua durata (settings.API_CACHE_TTL). Una voce scaduta
+viene riscaricata, ma se la rete non risponde si usa comunque quella vecchia:
+i metadati di un film cambiano di rado e così l'arricchimento funziona anche
+offline. Quando il file supera settings.API_CACHE_MAX_MB si eliminano le voci
+usate meno di recente.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+DAY = 24 * 60 * 60
+
+DEFAULT_TTLS = {
+    "tmdb_search": 7 * DAY,
+    "tmdb_movie": 30 * DAY,
+    "tmdb_genres": 30 * DAY,
+    "omdb": 7 * DAY,
+}
+DEFAULT_TTL = 7 * DAY
+DEFAULT_MAX_MB = 200
+
+# parametri che non cambiano la risposta
+IGNORED_PARAMS = {"api_key", "apikey"}
+
+# controllo della dimensione ogni N scritture (non a ogni voce)
+EVICT_EVERY = 100
+
+# l'ultimo accesso di una voce si aggiorna al massimo una volta l'ora
+TOUCH_INTERVAL = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS response (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS response_accessed ON response (accessed_at);
+CREATE INDEX IF NOT EXISTS response_endpoint ON response (endpoint);
+"""
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    return value
+
+
+def make_key(endpoint: str, params: dict) -> str:
+    """Chiave della voce: hash di endpoint + parametri normalizzati e ordinati."""
+    clean = {
+        k: _normalize(v)
+        for k, v in (params or {}).items()
+        if k not in IGNORED_PARAMS and v is not None
+    }
+    raw = json.dumps([endpoint, clean], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache delle risposte JSON su file SQLite, usabile da più thread."""
+
+    def __init__(self, path, ttls: dict = None, max_bytes: int = None):
+        self.path = str(path)
+        self.ttls = ttls or DEFAULT_TTLS
+        self.max_bytes = max_bytes or DEFAULT_MAX_MB * 1024 * 1024
+        self.counters = defaultdict(lambda: {"hits": 0, "misses": 0, "stale": 0})
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, endpoint: str, counter: str):
+        with self._lock:
+            self.counters[endpoint][counter] += 1
+
+    def get(self, endpoint: str, params: dict):
+        """Ritorna (trovato, dati, fresco)."""
+        key = make_key(endpoint, params)
+        row = (
+            self._conn()
+            .execute(
+                "SELECT payload, created_at, accessed_at FROM response WHERE key = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return False, None, False
+
+        payload, created_at, accessed_at = row
+        now = time.time()
+        if now - accessed_at > TOUCH_INTERVAL:
+            self._conn().execute(
+                "UPDATE response SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        ttl = self.ttls.get(endpoint, DEFAULT_TTL)
+        return True, json.loads(payload), now - created_at < ttl
+
+    def set(self, endpoint: str, params: dict, data):
+        payload = json.dumps(data, separators=(",", ":"))
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO response "
+            "(key, endpoint, payload, size, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (make_key(endpoint, params), endpoint, payload, len(payload), now, now),
+        )
+        with self._lock:
+            self._writes += 1
+            check = self._writes % EVICT_EVERY == 0
+        if check:
+            self.evict()
+
+    def get_or_fetch(self, endpoint: str, params: dict, fetch):
+        """
+        Ritorna la risposta dalla cache o, se manca o è scaduta, chiama
+        fetch() e la salva. Se fetch() fallisce e c'è una voce scaduta,
+        ritorna quella; altrimenti rilancia l'eccezione.
+        """
+        found, data, fresh = self.get(endpoint, params)
+        if found and fresh:
+            self._count(endpoint, "hits")
+            return data
+
+        try:
+            data_new = fetch()
+        except Exception:
+            if found:
+                self._count(endpoint, "stale")
+                return data
+            raise
+
+        self._count(endpoint, "misses")
+        self.set(endpoint, params, data_new)
+        return data_new
+
+    def evict(self):
+        """Elimina le voci usate meno di recente finché la cache sta nel limite."""
+        conn = self._conn()
+        (total,) = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM response"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return 0
+
+        # si scende al 90% del limite, per non rifarlo alla scrittura successiva
+        to_free = total - int(self.max_bytes * 0.9)
+        freed = 0
+        keys = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM response ORDER BY accessed_at"
+        ):
+            keys.append(key)
+            freed += size
+            if freed >= to_free:
+                break
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            conn.execute(
+                f"DELETE FROM response WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+        return len(keys)
+
+    def purge_expired(self) -> int:
+        """Elimina le voci scadute. Ritorna il numero di voci eliminate."""
+        now = time.time()
+        conn = self._conn()
+        deleted = 0
+        endpoints = [
+            row[0] for row in conn.execute("SELECT DISTINCT endpoint FROM response")
+        ]
+        for endpoint in endpoints:
+            ttl = self.ttls.get(endpoint, DEFAULT_TTL)
+            deleted += conn.execute(
+                "DELETE FROM response WHERE endpoint = ? AND created_at < ?",
+                (endpoint, now - ttl),
+            ).rowcount
+        return deleted
+
+    def clear(self, endpoint: str = None) -> int:
+        conn = self._conn()
+        if endpoint:
+            return conn.execute(
+                "DELETE FROM response WHERE endpoint = ?", (endpoint,)
+            ).rowcount
+        return conn.execute("DELETE FROM response").rowcount
+
+    def summary(self) -> dict:
+        """Voci e byte per endpoint: {endpoint: {"entries": n, "bytes": n}}."""
+        return {
+            endpoint: {"entries": entries, "bytes": size}
+            for endpoint, entries, size in self._conn().execute(
+                "SELECT endpoint, COUNT(*), SUM(size) FROM response GROUP BY endpoint"
+            )
+        }
+
+    def stats(self) -> dict:
+        """Contatori di questo processo: {endpoint: {hits, misses, stale}}."""
+        with self._lock:
+            return {endpoint: dict(c) for endpoint, c in self.counters.items()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Ritorna la cache condivisa, configurata da settings (API_CACHE_PATH,
+    API_CACHE_TTL, API_CACHE_MAX_MB), oppure None se API_CACHE_ENABLED è False.
+    """
+    global _cache
+    if not getattr(settings, "API_CACHE_ENABLED", True):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            ttls = dict(DEFAULT_TTLS)
+            ttls.update(getattr(settings, "API_CACHE_TTL", {}))
+            _cache = ResponseCache(
+                getattr(
+                    settings, "API_CACHE_PATH", settings.BASE_DIR / "api_cache.sqlite3"
+                ),
+                ttls=ttls,
+                max_bytes=getattr(settings, "API_CACHE_MAX_MB", DEFAULT_MAX_MB)
+                * 1024
+                * 1024,
+            )
+        return _cache
+
+
+def cached_fetch(endpoint: str, params: dict, fetch):
+    """Legge attraverso la cache condivisa (o chiama fetch se è disattivata)."""
+    cache = get_cache()
+    if cache is None:
+        return fetch()
+    return cache.get_or_fetch(endpoint, params, fetch)
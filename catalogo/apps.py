@@ -1,6 +1,33 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class CatalogoConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'catalogo'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "catalogo"
+
+    def ready(self):
+        from .models import Movie
+        from .pagecache import bump_catalog_version
+        from .random_pick import invalidate_pools
+        from .taxonomy import sync_links_on_save
+
+        # film aggiunti, modificati o eliminati: gli elenchi per le scelte a caso
+        # vanno riletti
+        post_save.connect(
+            invalidate_pools, sender=Movie, dispatch_uid="random_pool_save"
+        )
+        post_delete.connect(
+            invalidate_pools, sender=Movie, dispatch_uid="random_pool_delete"
+        )
+        # pagine in cache (vedi pagecache.py) da rifare
+        post_save.connect(
+            bump_catalog_version, sender=Movie, dispatch_uid="catalog_version_save"
+        )
+        post_delete.connect(
+            bump_catalog_version, sender=Movie, dispatch_uid="catalog_version_delete"
+        )
+        # generi e registi normalizzati allineati ai campi di testo
+        post_save.connect(
+            sync_links_on_save, sender=Movie, dispatch_uid="movie_links_save"
+        )
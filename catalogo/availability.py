@@ -0,0 +1,169 @@
+"""
+Indice di disponibilità dei film su dischi rimovibili e di rete.
+
+Ogni cartella radice da cui arrivano i film è un Volume. Il controllo si fa
+una volta per volume (un solo stat sulla radice, con timeout: un NAS in
+standby o un disco di rete irraggiungibile non bloccano nessuno) e poi si
+aggiorna in blocco il campo Movie.disponibile di tutti i film sotto quella
+radice:
+
+- volume scollegato: tutti i film sotto la radice diventano non disponibili;
+- volume collegato: sono disponibili i film il cui file compare nel manifest
+  dell'ultima scansione (ScanEntry), senza fare uno stat per ogni file.
+
+Le view leggono solo il campo disponibile: per i film offline non parte
+nessun accesso al disco. Il refresh gira da comando (refresh_availability)
+o in un thread in background avviato dalle view al massimo ogni
+settings.AVAILABILITY_TTL secondi.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Movie, ScanEntry, Volume
+
+DEFAULT_AVAILABILITY_TTL = 300  # secondi tra un refresh automatico e l'altro
+DEFAULT_AVAILABILITY_TIMEOUT = 3.0  # secondi concessi a un volume per rispondere
+
+_refresh_lock = threading.Lock()
+_last_refresh = 0.0
+
+# volumi con uno stat ancora appeso (disco di rete che non risponde)
+_probe_lock = threading.Lock()
+_pending_probes = set()
+
+
+def _path_under_q(field: str, root: str) -> Q:
+    return Q(**{field: root}) | Q(
+        **{f"{field}__startswith": root.rstrip(os.sep) + os.sep}
+    )
+
+
+def is_reachable(path: str, timeout: float = None) -> bool:
+    """
+    True se la cartella risponde entro timeout secondi.
+
+    Lo stat gira in un thread daemon: se il disco non risponde il thread
+    resta appeso per conto suo (senza bloccare l'uscita del processo) ma chi
+    chiama torna subito con False. Finché quello stat non torna, il volume
+    risulta non raggiungibile senza avviare altri thread.
+    """
+    if timeout is None:
+        timeout = getattr(
+            settings, "AVAILABILITY_TIMEOUT", DEFAULT_AVAILABILITY_TIMEOUT
+        )
+    with _probe_lock:
+        if path in _pending_probes:
+            return False
+        _pending_probes.add(path)
+
+    result = []
+
+    def probe():
+        try:
+            result.append(os.path.isdir(path))
+        finally:
+            with _probe_lock:
+                _pending_probes.discard(path)
+
+    thread = threading.Thread(target=probe, name=f"stat {path}", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return bool(result and result[0])
+
+
+def register_volumes(roots):
+    """Registra le cartelle radice (es. quelle appena scansionate) come volumi."""
+    existing = set(Volume.objects.values_list("path", flat=True))
+    Volume.objects.bulk_create(
+        [
+            Volume(path=root)
+            for root in {os.path.normpath(r) for r in roots}
+            if root not in existing
+        ]
+    )
+
+
+def update_volume(volume: Volume, online: bool) -> int:
+    """
+    Aggiorna in blocco la disponibilità dei film sotto il volume.
+    Ritorna il numero di film non disponibili dopo l'aggiornamento.
+    """
+    movies = Movie.objects.filter(_path_under_q("percorso", volume.path))
+
+    if not online:
+        movies.filter(disponibile=True).update(disponibile=False)
+    elif not ScanEntry.objects.filter(path=volume.path, is_dir=True).exists():
+        # volume mai scansionato con il manifest: non sappiamo quali file ci
+        # sono, meglio non nascondere niente
+        movies.filter(disponibile=False).update(disponibile=True)
+    else:
+        # si scrivono solo i film che cambiano stato: un refresh senza
+        # novità non tocca righe e non invalida le pagine in cache
+        in_manifest = Exists(
+            ScanEntry.objects.filter(path=OuterRef("percorso"), is_dir=False)
+        )
+        movies.filter(disponibile=True).filter(~in_manifest).update(disponibile=False)
+        movies.filter(disponibile=False).filter(in_manifest).update(disponibile=True)
+
+    volume.online = online
+    volume.checked_at = timezone.now()
+    volume.save(update_fields=["online", "checked_at"])
+    return movies.filter(disponibile=False).count()
+
+
+def refresh_availability(timeout: float = None) -> dict:
+    """
+    Controlla tutti i volumi e aggiorna la disponibilità dei film.
+
+    Ritorna un dizionario con i contatori: volumes, online, offline, unavailable.
+    """
+    global _last_refresh
+
+    volumes = list(Volume.objects.all())
+    # i volumi si controllano in parallelo: uno lento non fa aspettare gli altri
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(volumes)))) as pool:
+        states = list(pool.map(lambda v: is_reachable(v.path, timeout), volumes))
+
+    stats = {"volumes": len(volumes), "online": 0, "offline": 0, "unavailable": 0}
+    for volume, online in zip(volumes, states):
+        stats["online" if online else "offline"] += 1
+        stats["unavailable"] += update_volume(volume, online)
+
+    _last_refresh = time.monotonic()
+    return stats
+
+
+def _refresh_worker():
+    try:
+        close_old_connections()
+        refresh_availability()
+    finally:
+        connection.close()
+        _refresh_lock.release()
+
+
+def refresh_in_background(force: bool = False) -> bool:
+    """
+    Avvia il refresh in un thread in background se l'ultimo è più vecchio di
+    settings.AVAILABILITY_TTL (o con force=True). Non blocca mai chi chiama.
+    Ritorna True se il refresh è stato avviato.
+    """
+    global _last_refresh
+
+    ttl = getattr(settings, "AVAILABILITY_TTL", DEFAULT_AVAILABILITY_TTL)
+    if not force and _last_refresh and time.monotonic() - _last_refresh < ttl:
+        return False
+    if not _refresh_lock.acquire(blocking=False):
+        return False  # già in corso
+    # anche se il refresh fallisce non lo ripetiamo a ogni richiesta
+    _last_refresh = time.monotonic()
+    threading.Thread(target=_refresh_worker, daemon=True).start()
+    return True
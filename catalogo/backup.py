@@ -0,0 +1,271 @@
+"""
+Esportazione del catalogo (CSV, NDJSON, XLSX) e ripristino da NDJSON.
+
+L'esportazione legge i film in streaming (values_list + iterator) e produce
+il file un pezzo alla volta con dei generatori, che la view passa a
+StreamingHttpResponse: la memoria usata non dipende dal numero di film. Per
+l'XLSX openpyxl (opzionale) lavora in modalità write-only su un file
+temporaneo, che poi viene letto a blocchi.
+
+Il ripristino legge l'NDJSON riga per riga e scrive a blocchi di
+RESTORE_BATCH_SIZE, un blocco per transazione. Un film già a catalogo si
+riconosce dal percorso oppure, se il percorso non corrisponde, dall'imdb_id
+(solo se un unico film a catalogo e un'unica riga del blocco lo hanno):
+quelli trovati vanno in bulk_update, gli altri in bulk_create (poi si
+aggiornano generi e registi normalizzati, vedi taxonomy.py). I film senza
+percorso né imdb_id (inseriti a mano o importati da foglio) si riconoscono
+da titolo e anno tra quelli a catalogo senza percorso, così ripristinare due
+volte lo stesso file non li duplica. Le pk non vengono esportate, così il
+ripristino funziona anche su un DB che ha già altri film.
+
+Non si esportano (e nel ripristino si ignorano) i campi che descrivono la
+macchina su cui gira il catalogo: copia locale delle locandine, impronta,
+firma dell'ultima lettura dell'header e disponibilità del file. Su un'altra
+macchina quei file non ci sono: le locandine si riscaricano con
+sync_posters, le impronte e la disponibilità si ricalcolano. La data
+dell'ultimo controllo OMDb invece viaggia con i voti della critica che
+accompagna, così dopo un ripristino i film non tornano in coda per OMDb.
+"""
+
+import csv
+import json
+import tempfile
+from collections import Counter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Movie
+from .taxonomy import sync_links
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # openpyxl è opzionale (solo per gli XLSX)
+    Workbook = None
+
+# SQLite ha un limite sul numero di parametri per query: lavoriamo a blocchi
+CHUNK_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+RESTORE_BATCH_SIZE = 2000
+STREAM_BLOCK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+}
+
+# stato locale della macchina, che non va portato su un'altra (vedi sopra)
+LOCAL_FIELDS = {
+    "locandina_hash",
+    "locandina_origine",
+    "locandina_lqip",
+    "locandina_colore",
+    "impronta",
+    "probe_firma",
+    "disponibile",
+}
+
+# tutti i campi del film tranne la pk e quelli locali, nell'ordine del model
+EXPORT_FIELDS = [
+    f.name
+    for f in Movie._meta.concrete_fields
+    if not f.primary_key and f.name not in LOCAL_FIELDS
+]
+
+
+class RestoreError(Exception):
+    """Riga NDJSON non valida durante il ripristino."""
+
+
+def export_rows(queryset=None):
+    """Genera una tupla di valori (nell'ordine di EXPORT_FIELDS) per film."""
+    qs = queryset if queryset is not None else Movie.objects.all()
+    if not qs.ordered:
+        qs = qs.order_by("pk")
+    return qs.values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class _Echo:
+    """File finto per csv.writer: write() restituisce la riga invece di scriverla."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset=None):
+    writer = csv.writer(_Echo())
+    yield "\ufeff"  # BOM: Excel riconosce l'UTF-8
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(queryset):
+        yield writer.writerow(["" if v is None else v for v in row])
+
+
+def stream_ndjson(queryset=None):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in export_rows(queryset):
+        yield encoder.encode(dict(zip(EXPORT_FIELDS, row))) + "\n"
+
+
+def xlsx_available() -> bool:
+    return Workbook is not None
+
+
+def stream_xlsx(queryset=None):
+    if Workbook is None:
+        raise RuntimeError("Per esportare in XLSX serve openpyxl.")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Film")
+    sheet.append(EXPORT_FIELDS)
+    for row in export_rows(queryset):
+        # openpyxl non accetta datetime con fuso orario
+        sheet.append(
+            [v.replace(tzinfo=None) if getattr(v, "tzinfo", None) else v for v in row]
+        )
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        while block := tmp.read(STREAM_BLOCK_SIZE):
+            yield block
+
+
+def stream_export(fmt: str, queryset=None):
+    """Generatore del file di esportazione nel formato fmt (csv, ndjson, xlsx)."""
+    streams = {"csv": stream_csv, "ndjson": stream_ndjson, "xlsx": stream_xlsx}
+    return streams[fmt](queryset)
+
+
+def _decode(raw: dict) -> dict:
+    """Valori della riga NDJSON convertiti nei tipi dei campi (date, numeri...)."""
+    values = {}
+    for name, value in raw.items():
+        if name not in EXPORT_FIELDS:
+            continue
+        field = Movie._meta.get_field(name)
+        if value is None and not field.null:
+            value = field.get_default()
+        values[name] = field.to_python(value)
+    return values
+
+
+def _existing_pks(field: str, keys) -> dict:
+    """{valore: [pk, ...]} dei film già a catalogo con field in keys."""
+    found = {}
+    keys = list(keys)
+    for i in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[i : i + CHUNK_SIZE]
+        for pk, key in (
+            Movie.objects.filter(**{f"{field}__in": chunk})
+            .order_by("pk")
+            .values_list("pk", field)
+        ):
+            found.setdefault(key, []).append(pk)
+    return found
+
+
+def _title_key(values: dict) -> tuple:
+    return values.get("titolo", ""), values.get("anno")
+
+
+def _existing_without_path(rows) -> dict:
+    """{(titolo, anno): pk} dei film a catalogo senza percorso con quei titoli."""
+    found = {}
+    titles = list({r.get("titolo", "") for r in rows})
+    for i in range(0, len(titles), CHUNK_SIZE):
+        for pk, titolo, anno in Movie.objects.filter(
+            percorso="", titolo__in=titles[i : i + CHUNK_SIZE]
+        ).values_list("pk", "titolo", "anno"):
+            found.setdefault((titolo, anno), pk)
+    return found
+
+
+def _restore_batch(rows, stats: dict):
+    by_path = {
+        path: pks[0]
+        for path, pks in _existing_pks(
+            "percorso", {r["percorso"] for r in rows if r.get("percorso")}
+        ).items()
+    }
+    unmatched = [r for r in rows if r.get("percorso") not in by_path]
+    # l'imdb_id basta solo se lo hanno un film a catalogo e una riga del
+    # backup: film in più parti o in più copie diventano film nuovi invece
+    # di finire tutti sullo stesso record
+    imdb_rows = Counter(r["imdb_id"] for r in unmatched if r.get("imdb_id"))
+    matched = set(by_path.values())
+    by_imdb = {
+        imdb_id: pks[0]
+        for imdb_id, pks in _existing_pks(
+            "imdb_id", [i for i, count in imdb_rows.items() if count == 1]
+        ).items()
+        if len(pks) == 1 and pks[0] not in matched
+    }
+    # senza percorso né imdb_id resta solo titolo + anno
+    by_title = _existing_without_path(
+        [r for r in unmatched if not r.get("percorso") and not r.get("imdb_id")]
+    )
+
+    # l'ultima riga con la stessa chiave vince, anche tra i film nuovi
+    to_create = {}
+    to_update = {}  # pk -> campi
+    for values in rows:
+        if values.get("percorso") or values.get("imdb_id"):
+            pk = by_path.get(values.get("percorso")) or by_imdb.get(
+                values.get("imdb_id")
+            )
+            key = values.get("percorso") or values.get("imdb_id")
+        else:
+            pk = by_title.get(_title_key(values))
+            key = _title_key(values)
+        if pk is not None:
+            to_update[pk] = values
+        else:
+            to_create[key] = Movie(**values)
+
+    # righe con campi diversi: un bulk_update per insieme di campi
+    groups = {}
+    for pk, values in to_update.items():
+        groups.setdefault(tuple(sorted(values)), []).append(Movie(pk=pk, **values))
+
+    with transaction.atomic():
+        created = Movie.objects.bulk_create(to_create.values(), batch_size=CHUNK_SIZE)
+        for fields, movies in groups.items():
+            Movie.objects.bulk_update(movies, fields, batch_size=CHUNK_SIZE)
+        sync_links([movie.pk for movie in created] + list(to_update))
+    stats["created"] += len(to_create)
+    stats["updated"] += len(to_update)
+
+
+def restore_ndjson(lines, progress=None) -> dict:
+    """
+    Ripristina i film da righe NDJSON (un file aperto o qualunque iterabile di
+    stringhe). progress, se passato, viene chiamato dopo ogni blocco.
+
+    Ritorna un dizionario con i contatori: rows, created, updated.
+    """
+    stats = {"rows": 0, "created": 0, "updated": 0}
+    batch = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            raw = json.loads(line)
+            if not isinstance(raw, dict):
+                raise ValueError("la riga non è un oggetto JSON")
+            batch.append(_decode(raw))
+        except Exception as exc:
+            raise RestoreError(f"Riga {number} non valida: {exc}") from exc
+        stats["rows"] += 1
+        if len(batch) >= RESTORE_BATCH_SIZE:
+            _restore_batch(batch, stats)
+            batch = []
+            if progress:
+                progress(stats)
+    if batch:
+        _restore_batch(batch, stats)
+        if progress:
+            progress(stats)
+    return stats
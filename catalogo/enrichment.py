@@ -0,0 +1,301 @@
+"""
+Arricchimento in blocco dei metadati (TMDB + voti della critica da OMDb).
+
+I film vengono letti dal DB in streaming (iterator) e lavorati a blocchi:
+per ogni blocco i lookup uguali (stesso titolo e anno, stesso imdb_id) si
+fanno una volta sola e i lookup diversi girano in parallelo in un pool di
+thread di dimensione fissa. La frequenza delle richieste HTTP è limitata dai
+secchielli di ratelimit.py, condivisi da tutti i thread. Le modifiche di un
+blocco vengono scritte con un solo bulk_update, insieme ai generi e registi
+normalizzati dei film a cui sono cambiati (vedi taxonomy.py). I voti della critica non si
+chiedono film per film: alla fine si svuota la coda di OMDb finché il budget
+giornaliero lo permette (vedi omdb_scheduler.py).
+
+L'esito di ogni tentativo viene salvato in EnrichmentState. Un film non
+trovato viene ricercato solo dopo un'attesa che raddoppia a ogni mancato
+(1 giorno, 2, 4, ...) e dopo settings.ENRICH_MAX_MISSES mancati consecutivi
+non viene più cercato (vedi unmatched_movies). I film mai cercati hanno la
+precedenza.
+
+L'arricchimento può girare da comando (enrich_movies) o in un thread in
+background avviato dalla view update_posters.
+"""
+
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import EnrichmentState, Movie
+from .omdb_scheduler import drain_ratings_queue
+from .taxonomy import RELATIONS, sync_links
+from .tmdb import apply_tmdb_data, fetch_movie_data_from_tmdb, get_tmdb_client
+
+DEFAULT_ENRICH_WORKERS = 8
+ENRICH_BATCH_SIZE = 200
+
+DEFAULT_RETRY_BASE_HOURS = 24
+DEFAULT_RETRY_MAX_DAYS = 180
+DEFAULT_MAX_MISSES = 8
+ERROR_RETRY = timedelta(hours=1)  # errore di rete: si riprova presto
+
+_job_lock = threading.Lock()
+_job_status = {"running": False, "stats": None, "error": None}
+
+
+def movies_missing_metadata():
+    """Film senza trama: quelli che update_posters deve completare."""
+    return Movie.objects.filter(Q(trama__isnull=True) | Q(trama__exact=""))
+
+
+def movies_to_enrich(now=None):
+    """
+    Film senza trama da cercare adesso: mai cercati (per primi) oppure con
+    il prossimo tentativo già scaduto.
+    """
+    now = now or timezone.now()
+    return (
+        movies_missing_metadata()
+        .filter(Q(enrichment__isnull=True) | Q(enrichment__next_attempt__lte=now))
+        .select_related("enrichment")
+        .order_by(F("enrichment__last_attempt").asc(nulls_first=True), "pk")
+    )
+
+
+def unmatched_movies():
+    """Film che TMDB non ha trovato per troppe volte: non vengono più cercati."""
+    return Movie.objects.filter(
+        enrichment__outcome=EnrichmentState.Outcome.MISS,
+        enrichment__next_attempt__isnull=True,
+    ).select_related("enrichment")
+
+
+def reset_unmatched() -> int:
+    """Rimette in coda i film non trovati (es. dopo aver corretto i titoli)."""
+    return EnrichmentState.objects.filter(outcome=EnrichmentState.Outcome.MISS).update(
+        misses=0, next_attempt=timezone.now()
+    )
+
+
+def _next_state(movie: Movie, outcome: str, source: str, now) -> EnrichmentState:
+    """Nuovo stato del film dopo un tentativo, con la data del prossimo."""
+    previous = getattr(movie, "enrichment", None)
+    misses = previous.misses if previous else 0
+    next_attempt = None
+
+    if outcome == EnrichmentState.Outcome.MISS:
+        misses += 1
+        if misses < getattr(settings, "ENRICH_MAX_MISSES", DEFAULT_MAX_MISSES):
+            base = timedelta(
+                hours=getattr(
+                    settings, "ENRICH_RETRY_BASE_HOURS", DEFAULT_RETRY_BASE_HOURS
+                )
+            )
+            cap = timedelta(
+                days=getattr(settings, "ENRICH_RETRY_MAX_DAYS", DEFAULT_RETRY_MAX_DAYS)
+            )
+            next_attempt = now + min(base * 2 ** (misses - 1), cap)
+    elif outcome == EnrichmentState.Outcome.ERROR:
+        next_attempt = now + ERROR_RETRY
+    else:
+        misses = 0
+
+    return EnrichmentState(
+        movie=movie,
+        last_attempt=now,
+        outcome=outcome,
+        source=source,
+        misses=misses,
+        next_attempt=next_attempt,
+    )
+
+
+def save_enrichment_states(states):
+    """Inserisce o aggiorna gli stati (uno per film) con un solo upsert."""
+    EnrichmentState.objects.bulk_create(
+        states,
+        batch_size=ENRICH_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["movie"],
+        update_fields=["last_attempt", "outcome", "source", "misses", "next_attempt"],
+    )
+
+
+def record_enrichment(movie: Movie, matched: bool, source: str = "tmdb"):
+    """Registra l'esito di un aggiornamento singolo (es. update_movie_poster)."""
+    outcome = (
+        EnrichmentState.Outcome.MATCHED if matched else EnrichmentState.Outcome.MISS
+    )
+    save_enrichment_states([_next_state(movie, outcome, source, timezone.now())])
+
+
+def _lookup_key(movie: Movie):
+    return (" ".join((movie.titolo or "").lower().split()), movie.anno)
+
+
+def _batches(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _enrich_batch(movies, pool, overwrite: bool, stats: dict):
+    # un solo lookup TMDB per titolo/anno, anche se compare più volte nel blocco
+    by_key = defaultdict(list)
+    for movie in movies:
+        by_key[_lookup_key(movie)].append(movie)
+    keys = list(by_key)
+    stats["checked"] += len(movies)
+    stats["lookups"] += len(keys)
+    stats["coalesced"] += len(movies) - len(keys)
+
+    def lookup(key):
+        group = by_key[key]
+        # regista e imdb_id arrivano dal dettaglio: se ci sono già basta la ricerca
+        details = overwrite or any(not m.regista or not m.imdb_id for m in group)
+        try:
+            data = fetch_movie_data_from_tmdb(
+                group[0].titolo, key[1], details=details, raise_errors=True
+            )
+        except Exception:
+            return EnrichmentState.Outcome.ERROR, None
+        if not data:
+            return EnrichmentState.Outcome.MISS, None
+        return EnrichmentState.Outcome.MATCHED, data
+
+    found = dict(zip(keys, pool.map(lookup, keys)))
+
+    now = timezone.now()
+    outcomes = {}
+    changed = {}
+    for key in keys:
+        outcome, data = found[key]
+        for movie in by_key[key]:
+            outcomes[movie.pk] = (movie, outcome, "tmdb" if data else "")
+        if outcome == EnrichmentState.Outcome.MISS:
+            stats["missed"] += len(by_key[key])
+        elif outcome == EnrichmentState.Outcome.ERROR:
+            stats["errors"] += len(by_key[key])
+        if not data:
+            continue
+        for movie in by_key[key]:
+            stats["matched"] += 1
+            changed[movie.pk] = (movie, apply_tmdb_data(movie, data, overwrite))
+
+    to_update = [movie for movie, fields in changed.values() if fields]
+    fields = sorted({f for _movie, fields in changed.values() for f in fields})
+    relinked = [
+        movie.pk
+        for movie, fields in changed.values()
+        if any(f in RELATIONS for f in fields)
+    ]
+    with transaction.atomic():
+        if to_update:
+            Movie.objects.bulk_update(to_update, fields, batch_size=ENRICH_BATCH_SIZE)
+        sync_links(relinked)
+        save_enrichment_states(
+            [
+                _next_state(movie, outcome, source, now)
+                for movie, outcome, source in outcomes.values()
+            ]
+        )
+    stats["updated"] += len(to_update)
+
+
+def enrich_movies(
+    queryset=None,
+    overwrite: bool = False,
+    workers: int = None,
+    progress=None,
+    drain_ratings: bool = True,
+) -> dict:
+    """
+    Completa i metadati dei film da TMDB e OMDb. Di default si cercano i film
+    senza trama mai cercati o con il prossimo tentativo scaduto
+    (movies_to_enrich); un queryset esplicito ignora il backoff.
+
+    Con overwrite=True sovrascrive anche i campi già valorizzati. progress, se
+    passato, viene chiamato con le statistiche parziali dopo ogni blocco.
+    Con drain_ratings=False la coda di OMDb non viene svuotata (es. import a
+    blocchi, che la svuota una volta sola alla fine).
+
+    Ritorna un dizionario con i contatori:
+      checked, lookups, coalesced, matched, missed, errors, ratings, updated
+    """
+    qs = queryset if queryset is not None else movies_to_enrich()
+    if not workers:
+        workers = getattr(settings, "ENRICH_WORKERS", DEFAULT_ENRICH_WORKERS)
+
+    stats = {
+        "checked": 0,
+        "lookups": 0,
+        "coalesced": 0,
+        "matched": 0,
+        "missed": 0,
+        "errors": 0,
+        "ratings": 0,
+        "updated": 0,
+    }
+    if get_tmdb_client() is None:
+        # senza chiave API ogni ricerca risulterebbe "non trovato"
+        return stats
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if not qs.ordered:
+            qs = qs.order_by("pk")
+        movies = qs.select_related("enrichment").iterator(chunk_size=ENRICH_BATCH_SIZE)
+        for batch in _batches(movies, ENRICH_BATCH_SIZE):
+            _enrich_batch(batch, pool, overwrite, stats)
+            if progress:
+                progress(stats)
+
+    # voti della critica dalla coda di OMDb, nei limiti del budget di oggi
+    if drain_ratings:
+        stats["ratings"] = drain_ratings_queue()["updated"]
+    return stats
+
+
+def _background_worker(kwargs):
+    def progress(stats):
+        _job_status["stats"] = dict(stats)
+
+    try:
+        close_old_connections()
+        _job_status["stats"] = enrich_movies(progress=progress, **kwargs)
+    except Exception as exc:
+        _job_status["error"] = str(exc)
+    finally:
+        _job_status["running"] = False
+        connection.close()
+        _job_lock.release()
+
+
+def start_background_enrichment(**kwargs) -> bool:
+    """
+    Avvia enrich_movies in un thread in background (stessi argomenti).
+    Ritorna False se un arricchimento è già in corso.
+    """
+    if not _job_lock.acquire(blocking=False):
+        return False
+    _job_status.update(running=True, stats=None, error=None)
+    threading.Thread(target=_background_worker, args=(kwargs,), daemon=True).start()
+    return True
+
+
+def enrichment_status() -> dict:
+    """Stato dell'ultimo arricchimento in background: running, stats, error."""
+    return {
+        "running": _job_status["running"],
+        "stats": dict(_job_status["stats"]) if _job_status["stats"] else None,
+        "error": _job_status["error"],
+    }
@@ -0,0 +1,245 @@
+"""
+Conteggi dei filtri della lista ("faccette"): quanti film restano
+scegliendo un genere, un decennio, una codifica, ...
+
+Invece di una COUNT per ogni valore di ogni filtro, tutte le faccette a
+valori singoli si ricavano da una sola query raggruppata sulla lista già
+filtrata: GROUP BY sulla combinazione (decennio, fascia di voto, fascia di
+dimensione, codifica, estensione, stato, visto, disponibile, locandina),
+che ha poche centinaia di righe anche con un catalogo grande, poi i totali
+di ogni faccetta si sommano in Python. I generi, che sono più d'uno per
+film, hanno una seconda query raggruppata sui legami MovieGenre, fatta
+sulla lista senza il filtro per genere: il parametro genere ne contiene uno
+solo, quindi scegliere un altro genere sostituisce quello attuale.
+
+Le opzioni di codifica ed estensione filtrano per valore esatto
+(codifica_eq, estensione_eq), come il GROUP BY che le conta: con il
+"contiene" dei campi del form "H.264" prenderebbe anche "H.264 10bit" e
+la lista avrebbe più film del numero mostrato.
+
+I conteggi sono "per restringere": ogni numero dice quanti film restano
+aggiungendo quel valore ai filtri attuali. Sono in cache per versione del
+catalogo e filtri (vedi pagecache.py), quindi si ricalcolano solo dopo una
+modifica ai film.
+"""
+
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, IntegerField, Q, Value, When
+
+from .models import Movie, MovieGenre
+from .pagecache import DEFAULT_PAGE_CACHE_TTL, catalog_version, normalized_query
+
+GENRE_FACET_LIMIT = 20
+VALUE_FACET_LIMIT = 12
+
+# parametri della querystring che non cambiano l'insieme dei film
+PAGING_PARAMS = ("cursor", "page")
+IGNORED_PARAMS = PAGING_PARAMS + ("sort",)
+
+# fasce: (etichetta, valore del CASE, parametri del filtro)
+VOTE_BANDS = (
+    ("8-10", "8", {"voto_da": "8"}),
+    ("6-7", "6", {"voto_da": "6", "voto_a": "7"}),
+    ("4-5", "4", {"voto_da": "4", "voto_a": "5"}),
+    ("1-3", "1", {"voto_a": "3"}),
+)
+SIZE_BANDS = (
+    ("< 1 GB", "0", {"dim_a": "1024"}),
+    ("1-4 GB", "1", {"dim_da": "1024", "dim_a": "4096"}),
+    ("4-10 GB", "4", {"dim_da": "4096", "dim_a": "10240"}),
+    ("> 10 GB", "10", {"dim_da": "10240"}),
+)
+
+
+def _band_case(field: str, bounds) -> Case:
+    """CASE che assegna la fascia: bounds = [(minimo, valore), ...] decrescenti."""
+    return Case(
+        *(When(**{f"{field}__gte": low}, then=Value(value)) for low, value in bounds),
+        default=Value(""),
+        output_field=CharField(),
+    )
+
+
+def _grouped_counts(queryset) -> list:
+    """Una riga per combinazione di valori, con il numero di film."""
+    return list(
+        queryset.order_by()
+        .values(
+            "codifica",
+            "estensione",
+            "stato",
+            "visto",
+            "disponibile",
+            decennio=Case(
+                When(anno__isnull=False, then=F("anno") / 10 * 10),
+                default=None,
+                output_field=IntegerField(),
+            ),
+            fascia_voto=_band_case("voto", [(8, "8"), (6, "6"), (4, "4"), (1, "1")]),
+            fascia_dim=_band_case(
+                "dimensione_file_mb",
+                [(10240, "10"), (4096, "4"), (1024, "1"), (0, "0")],
+            ),
+            senza_locandina=Case(
+                When(Q(locandina_url="") | Q(locandina_url__isnull=True), then=1),
+                default=0,
+                output_field=IntegerField(),
+            ),
+        )
+        .annotate(n=Count("pk"))
+    )
+
+
+def _genre_counts(queryset) -> list:
+    return list(
+        MovieGenre.objects.filter(movie_id__in=queryset.values("pk"))
+        .values("genre__nome")
+        .annotate(n=Count("id"))
+        .order_by("-n", "genre__nome")
+        .values_list("genre__nome", "n")[:GENRE_FACET_LIMIT]
+    )
+
+
+def compute_counts(queryset, genre_queryset=None) -> dict:
+    """
+    Conteggi grezzi per faccetta: {faccetta: [(valore, numero), ...]},
+    dal più frequente. genre_queryset: lista su cui contare i generi (di
+    default queryset).
+    """
+    totals = {
+        key: Counter()
+        for key in (
+            "decennio",
+            "fascia_voto",
+            "fascia_dim",
+            "codifica",
+            "estensione",
+            "stato",
+            "visto",
+            "disponibile",
+            "senza_locandina",
+        )
+    }
+    for row in _grouped_counts(queryset):
+        for key, counter in totals.items():
+            counter[row[key]] += row["n"]
+
+    counts = {key: counter.most_common() for key, counter in totals.items()}
+    counts["genere"] = _genre_counts(
+        queryset if genre_queryset is None else genre_queryset
+    )
+    return counts
+
+
+def cached_counts(request, queryset, genre_queryset=None) -> dict:
+    """compute_counts in cache per versione del catalogo e filtri della richiesta."""
+    query = request.GET.copy()
+    for param in IGNORED_PARAMS:
+        query.pop(param, None)
+    digest = hashlib.md5(normalized_query(query).encode()).hexdigest()
+    key = f"movie_facets:{catalog_version()}:{digest}"
+    counts = cache.get(key)
+    if counts is None:
+        counts = compute_counts(queryset, genre_queryset)
+        cache.set(
+            key,
+            counts,
+            getattr(settings, "PAGE_CACHE_TTL", DEFAULT_PAGE_CACHE_TTL),
+        )
+    return counts
+
+
+def _option(request, label: str, count: int, params: dict) -> dict:
+    """Voce di una faccetta, con la querystring che la applica o la toglie."""
+    query = request.GET.copy()
+    for param in PAGING_PARAMS:
+        query.pop(param, None)
+    active = all(query.get(k) == v for k, v in params.items())
+    for k, v in params.items():
+        if active:
+            query.pop(k, None)
+        else:
+            query[k] = v
+    return {
+        "label": label,
+        "count": count,
+        "query": query.urlencode(),
+        "active": active,
+    }
+
+
+def movie_facets(request, queryset, genre_queryset=None) -> list:
+    """
+    Faccette della lista per il template: [{titolo, options}], dove ogni
+    opzione ha label, count, query (querystring per la lista) e active.
+    genre_queryset: la lista con tutti i filtri tranne il genere.
+    """
+    counts = cached_counts(request, queryset, genre_queryset)
+    stato_labels = dict(Movie.Stato.choices)
+
+    def opt(label, count, **params):
+        return _option(request, label, count, params)
+
+    def banded(key, bands):
+        found = dict(counts[key])
+        return [
+            _option(request, label, found[value], params)
+            for label, value, params in bands
+            if found.get(value)
+        ]
+
+    decades = sorted(
+        ((d, n) for d, n in counts["decennio"] if d is not None), reverse=True
+    )
+    facets = [
+        ("Genere", [opt(nome, n, genere=nome) for nome, n in counts["genere"]]),
+        (
+            "Decennio",
+            [opt(f"{d}s", n, anno_da=str(d), anno_a=str(d + 9)) for d, n in decades],
+        ),
+        ("Voto", banded("fascia_voto", VOTE_BANDS)),
+        (
+            "Visto",
+            [
+                opt("Visti" if v else "Da vedere", n, visto="si" if v else "no")
+                for v, n in counts["visto"]
+            ],
+        ),
+        (
+            "Disco",
+            [
+                opt("Collegato" if v else "Offline", n, disponibile="si" if v else "no")
+                for v, n in counts["disponibile"]
+            ],
+        ),
+        (
+            "Stato",
+            [opt(stato_labels.get(v, v), n, stato=v) for v, n in counts["stato"] if v],
+        ),
+        (
+            "Codifica",
+            [opt(v, n, codifica_eq=v) for v, n in counts["codifica"] if v][
+                :VALUE_FACET_LIMIT
+            ],
+        ),
+        (
+            "Estensione",
+            [opt(v, n, estensione_eq=v) for v, n in counts["estensione"] if v][
+                :VALUE_FACET_LIMIT
+            ],
+        ),
+        ("Dimensione", banded("fascia_dim", SIZE_BANDS)),
+        (
+            "Locandina",
+            [
+                opt("Senza locandina", n, no_poster="1")
+                for v, n in counts["senza_locandina"]
+                if v
+            ],
+        ),
+    ]
+    return [{"titolo": titolo, "options": opts} for titolo, opts in facets if opts]
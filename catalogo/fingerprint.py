@@ -0,0 +1,127 @@
+"""
+Impronta "parziale" dei file video: dimensione + hash di tre blocchi
+(inizio, metà, fine). Costa tre letture brevi per file ma basta a riconoscere
+lo stesso film spostato in un'altra cartella o copiato su più dischi.
+
+compute_fingerprint gira in un pool di processi: questo modulo non deve
+importare i model a livello di modulo (su Windows i processi figli
+reimportano il modulo senza Django configurato).
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+
+BLOCK_SIZE = 64 * 1024
+
+DEFAULT_FINGERPRINT_WORKERS = 4
+FINGERPRINT_BATCH_SIZE = 200
+
+
+def compute_fingerprint(path: str) -> Optional[str]:
+    """
+    Ritorna l'impronta del file, es. '734003200:9f2c...' oppure None
+    se il file non è leggibile.
+    """
+    try:
+        size = os.path.getsize(path)
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            if size <= 3 * BLOCK_SIZE:
+                digest.update(f.read())
+            else:
+                for offset in (0, (size - BLOCK_SIZE) // 2, size - BLOCK_SIZE):
+                    f.seek(offset)
+                    digest.update(f.read(BLOCK_SIZE))
+    except OSError:
+        return None
+    return f"{size}:{digest.hexdigest()}"
+
+
+def fingerprint_workers() -> int:
+    return getattr(settings, "FINGERPRINT_WORKERS", DEFAULT_FINGERPRINT_WORKERS)
+
+
+def compute_fingerprints(paths, pool: ProcessPoolExecutor = None) -> dict:
+    """Calcola le impronte di più file in parallelo: {path: impronta o None}."""
+    paths = list(paths)
+    if not paths:
+        return {}
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=fingerprint_workers()) as own_pool:
+            return compute_fingerprints(paths, own_pool)
+    return dict(zip(paths, pool.map(compute_fingerprint, paths, chunksize=16)))
+
+
+def fingerprint_library(queryset=None, force: bool = False, progress=None) -> dict:
+    """
+    Calcola l'impronta dei film a catalogo che non ce l'hanno ancora
+    (o di tutti, con force=True).
+    Ritorna un dizionario con i contatori: checked, updated, failed.
+    """
+    from .models import Movie
+
+    qs = queryset if queryset is not None else Movie.objects.all()
+    if not force:
+        qs = qs.filter(impronta="")
+
+    stats = {"checked": 0, "updated": 0, "failed": 0}
+    last_pk = 0
+
+    with ProcessPoolExecutor(max_workers=fingerprint_workers()) as pool:
+        while True:
+            batch = list(
+                qs.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "percorso")[:FINGERPRINT_BATCH_SIZE]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            prints = compute_fingerprints([percorso for _pk, percorso in batch], pool)
+            to_update = []
+            for pk, percorso in batch:
+                stats["checked"] += 1
+                if prints.get(percorso):
+                    to_update.append(Movie(pk=pk, impronta=prints[percorso]))
+                else:
+                    stats["failed"] += 1
+
+            Movie.objects.bulk_update(to_update, ["impronta"])
+            stats["updated"] += len(to_update)
+            if progress:
+                progress(stats)
+
+    return stats
+
+
+def find_duplicates():
+    """
+    Ritorna i gruppi di film con la stessa impronta (stesso contenuto in
+    percorsi diversi), ordinati per dimensione decrescente.
+    """
+    from django.db.models import Count
+
+    from .models import Movie
+
+    dup_prints = (
+        Movie.objects.exclude(impronta="")
+        .values("impronta")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values_list("impronta", flat=True)
+    )
+
+    groups = {}
+    for movie in Movie.objects.filter(impronta__in=dup_prints).order_by("percorso"):
+        groups.setdefault(movie.impronta, []).append(movie)
+
+    return sorted(
+        groups.values(),
+        key=lambda movies: movies[0].dimensione_file_mb or 0,
+        reverse=True,
+    )
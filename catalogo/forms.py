@@ -14,6 +14,9 @@ class MovieForm(forms.ModelForm):
             "visto",
             "dimensione_file_mb",
             "codifica",
+            "risoluzione",
+            "durata",
+            "audio",
             "estensione",
             "percorso",
             "locandina_url",
@@ -0,0 +1,359 @@
+"""
+Import in blocco dei film da foglio di calcolo (XLSX o CSV).
+
+Le righe vengono lette in streaming (openpyxl in modalità read-only, csv
+riga per riga), per cui la memoria usata non cresce con la dimensione del
+file. Le colonne si riconoscono dall'intestazione (titolo/title/film,
+anno/year, regista/director, ...); serve almeno il titolo.
+
+Le righe vengono scritte a blocchi di IMPORT_BATCH_SIZE: i film già a
+catalogo (stesso titolo e anno) si riconoscono con una mappa in memoria
+caricata una volta sola, quelli nuovi vanno in un bulk_create e gli altri in
+bulk_update. Nella stessa transazione di ogni blocco si salva in
+ImportCheckpoint il numero di righe già scritte, e si aggiornano i generi
+e registi normalizzati dei film toccati: un import interrotto
+riparte dalla riga successiva. Il file si riconosce dall'impronta (vedi
+fingerprint.py), quindi anche se nel frattempo è stato spostato.
+
+Dopo ogni blocco i film nuovi passano dall'arricchimento concorrente di
+enrichment.py (lookup TMDB in parallelo e accorpati); la coda dei voti OMDb
+viene svuotata una volta sola alla fine. Se l'import si interrompe prima
+dell'arricchimento di un blocco, quei film restano tra i "mai cercati" e li
+completa il prossimo enrich_movies.
+
+openpyxl serve solo per i file XLSX ed è opzionale: senza si possono
+importare i CSV.
+"""
+
+import csv
+import os
+from datetime import datetime
+
+from django.db import transaction
+
+from .enrichment import enrich_movies
+from .fingerprint import compute_fingerprint
+from .models import ImportCheckpoint, Movie
+from .omdb_scheduler import drain_ratings_queue
+from .taxonomy import sync_links
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # openpyxl è opzionale (solo per gli XLSX)
+    load_workbook = None
+
+IMPORT_BATCH_SIZE = 500
+CSV_SNIFF_BYTES = 64 * 1024
+SKIPPED_EXAMPLES = 20  # righe saltate riportate per esteso
+
+# intestazione (in minuscolo) -> campo di Movie
+COLUMN_ALIASES = {
+    "titolo": "titolo",
+    "title": "titolo",
+    "film": "titolo",
+    "anno": "anno",
+    "year": "anno",
+    "genere": "genere",
+    "generi": "genere",
+    "genre": "genere",
+    "genres": "genere",
+    "regista": "regista",
+    "director": "regista",
+    "trama": "trama",
+    "plot": "trama",
+    "visto": "visto",
+    "watched": "visto",
+    "voto": "voto",
+    "rating": "voto",
+    "percorso": "percorso",
+    "path": "percorso",
+    "note": "note",
+    "notes": "note",
+}
+
+TRUE_VALUES = {"1", "x", "si", "sì", "s", "yes", "y", "true", "vero"}
+
+
+class ImportFormatError(Exception):
+    """File non leggibile, formato non supportato o colonna del titolo mancante."""
+
+
+def _movie_key(titolo: str, anno):
+    return (" ".join((titolo or "").lower().split()), anno)
+
+
+def _text(value, max_length: int = None) -> str:
+    if value is None:
+        return ""
+    text = str(value).strip()
+    if text.upper() == "N/A":
+        return ""
+    return text[:max_length] if max_length else text
+
+
+def _year(value):
+    if isinstance(value, datetime):
+        return value.year
+    text = _text(value)
+    try:
+        return int(text[:4]) if text else None
+    except ValueError:
+        return None
+
+
+def _vote(value):
+    text = _text(value).replace(",", ".")
+    try:
+        vote = round(float(text)) if text else None
+    except ValueError:
+        return None
+    return vote if vote is not None and 1 <= vote <= 10 else None
+
+
+def _bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return _text(value).lower() in TRUE_VALUES
+
+
+def _map_header(header) -> dict:
+    """{indice colonna: campo di Movie} dalle intestazioni riconosciute."""
+    columns = {}
+    for idx, cell in enumerate(header):
+        field = COLUMN_ALIASES.get(_text(cell).lower())
+        if field and field not in columns.values():
+            columns[idx] = field
+    if "titolo" not in columns.values():
+        raise ImportFormatError(
+            "Colonna del titolo non trovata (intestazioni attese: titolo, title o film)."
+        )
+    return columns
+
+
+def _iter_xlsx(path: str):
+    if load_workbook is None:
+        raise ImportFormatError("Per importare file XLSX serve openpyxl.")
+    workbook = load_workbook(filename=path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        yield next(rows, ())
+        yield from rows
+    finally:
+        workbook.close()
+
+
+def _iter_csv(path: str):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(CSV_SNIFF_BYTES)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def iter_rows(path: str):
+    """
+    Legge il file in streaming e genera (numero riga, {campo: valore grezzo})
+    per ogni riga di dati; le righe sono numerate come nel foglio (la prima
+    dopo l'intestazione è la 2).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        rows = _iter_xlsx(path)
+    elif ext in (".csv", ".tsv", ".txt"):
+        rows = _iter_csv(path)
+    else:
+        raise ImportFormatError(f"Formato non supportato: {ext or path}")
+
+    columns = _map_header(next(rows, ()))
+    for number, row in enumerate(rows, start=2):
+        yield number, {
+            field: row[idx] for idx, field in columns.items() if idx < len(row)
+        }
+
+
+def _movie_values(raw: dict, watched: bool) -> dict:
+    """Campi di Movie presenti nella riga (quelli vuoti restano fuori)."""
+    values = {
+        "titolo": _text(raw.get("titolo"), 200),
+        "anno": _year(raw.get("anno")),
+        "genere": _text(raw.get("genere"), 100),
+        "regista": _text(raw.get("regista"), 100),
+        "trama": _text(raw.get("trama")),
+        "voto": _vote(raw.get("voto")),
+        "percorso": _text(raw.get("percorso"), 500),
+        "note": _text(raw.get("note")),
+    }
+    values = {
+        field: value for field, value in values.items() if value not in ("", None)
+    }
+    # una cella vuota non toglie il "visto" a un film già a catalogo
+    if watched or _bool(raw.get("visto")):
+        values["visto"] = True
+    return values
+
+
+class _ImportWriter:
+    """Accumula le righe e le scrive sul DB a blocchi, con il checkpoint."""
+
+    def __init__(
+        self,
+        checkpoint: ImportCheckpoint,
+        stats: dict,
+        enrich: bool,
+        workers: int = None,
+        progress=None,
+    ):
+        self.checkpoint = checkpoint
+        self.stats = stats
+        self.enrich = enrich
+        self.workers = workers
+        self.progress = progress
+        self.known = None  # {(titolo normalizzato, anno): pk}, caricato una volta
+        self.rows = []  # (chiave, campi)
+        self.last_row = checkpoint.rows_done
+
+    def _load_known(self):
+        if self.known is None:
+            self.known = {
+                _movie_key(titolo, anno): pk
+                for pk, titolo, anno in Movie.objects.values_list(
+                    "pk", "titolo", "anno"
+                ).iterator(chunk_size=5000)
+            }
+        return self.known
+
+    def add(self, number: int, values: dict):
+        self.rows.append((_movie_key(values["titolo"], values.get("anno")), values))
+        self.last_row = number
+        if len(self.rows) >= IMPORT_BATCH_SIZE:
+            self.flush()
+
+    def skip(self, number: int):
+        self.last_row = number
+
+    def flush(self):
+        if self.last_row == self.checkpoint.rows_done:
+            return
+        known = self._load_known()
+
+        to_create = {}
+        # campi diversi da riga a riga: un bulk_update per insieme di campi
+        to_update = {}
+        for key, values in self.rows:
+            if key in to_create:
+                self.stats["duplicates"] += 1
+                continue
+            if key in known:
+                fields = tuple(sorted(f for f in values if f not in ("titolo", "anno")))
+                if fields:
+                    to_update.setdefault(fields, {})[known[key]] = values
+                continue
+            to_create[key] = Movie(**values)
+
+        with transaction.atomic():
+            created = Movie.objects.bulk_create(
+                to_create.values(), batch_size=IMPORT_BATCH_SIZE
+            )
+            for fields, rows in to_update.items():
+                Movie.objects.bulk_update(
+                    [Movie(pk=pk, **values) for pk, values in rows.items()],
+                    fields,
+                    batch_size=IMPORT_BATCH_SIZE,
+                )
+                self.stats["updated"] += len(rows)
+            sync_links(
+                [movie.pk for movie in created]
+                + [pk for rows in to_update.values() for pk in rows]
+            )
+            self.checkpoint.rows_done = self.last_row
+            self.checkpoint.save(update_fields=["rows_done", "updated_at"])
+
+        self.stats["created"] += len(created)
+        if created and created[0].pk is None:
+            # SQLite < 3.35 non restituisce le pk: ricarichiamo la mappa
+            self.known = None
+            known = self._load_known()
+        else:
+            for key, movie in zip(to_create, created):
+                known[key] = movie.pk
+        new_pks = [known[key] for key in to_create]
+        self.rows = []
+
+        if self.enrich and new_pks:
+            enriched = enrich_movies(
+                queryset=Movie.objects.filter(pk__in=new_pks),
+                workers=self.workers,
+                drain_ratings=False,
+            )
+            self.stats["enriched"] += enriched["matched"]
+        if self.progress:
+            self.progress(self.stats)
+
+
+def import_movies(
+    path: str,
+    watched: bool = False,
+    enrich: bool = True,
+    restart: bool = False,
+    workers: int = None,
+    progress=None,
+) -> dict:
+    """
+    Importa i film dal foglio di calcolo path (XLSX o CSV), riprendendo
+    dall'ultimo checkpoint se il file era già stato importato in parte
+    (restart=True ricomincia da capo). Con watched=True i film sono segnati
+    come visti; con enrich=False niente metadati da TMDB/OMDb. progress, se
+    passato, viene chiamato con le statistiche parziali dopo ogni blocco.
+
+    Ritorna un dizionario con i contatori:
+      rows, resumed_from, created, updated, duplicates, skipped, enriched,
+      ratings, più skipped_examples: le prime SKIPPED_EXAMPLES righe saltate
+      come (numero riga, motivo)
+    """
+    source = compute_fingerprint(path)
+    if source is None:
+        raise ImportFormatError(f"File non leggibile: {path}")
+
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+        source=source, defaults={"path": path}
+    )
+    if restart:
+        checkpoint.rows_done = 0
+    checkpoint.path = path
+
+    stats = {
+        "rows": 0,
+        "resumed_from": checkpoint.rows_done,
+        "created": 0,
+        "updated": 0,
+        "duplicates": 0,
+        "skipped": 0,
+        "skipped_examples": [],  # (numero riga, motivo), solo le prime
+        "enriched": 0,
+        "ratings": 0,
+    }
+    writer = _ImportWriter(checkpoint, stats, enrich, workers, progress)
+
+    for number, raw in iter_rows(path):
+        if number <= checkpoint.rows_done:
+            continue  # già importata prima dell'interruzione
+        stats["rows"] += 1
+        values = _movie_values(raw, watched)
+        if not values.get("titolo"):
+            stats["skipped"] += 1
+            if len(stats["skipped_examples"]) < SKIPPED_EXAMPLES:
+                stats["skipped_examples"].append((number, "Titolo mancante"))
+            writer.skip(number)
+        else:
+            writer.add(number, values)
+    writer.flush()
+
+    # import completato: un nuovo import dello stesso file riparte da capo
+    checkpoint.delete()
+
+    if enrich:
+        stats["ratings"] = drain_ratings_queue()["updated"]
+    return stats
@@ -0,0 +1,161 @@
+"""
+Ordinamenti della lista film e navigazione "a chiave" (keyset).
+
+Ogni ordinamento (parametro sort della querystring) è un campo più la pk
+come spareggio, così l'ordine è totale e stabile. I valori NULL (film senza
+anno, voto, ...) vanno sempre in fondo, in entrambe le direzioni.
+
+Invece di contare o scorrere le righe (OFFSET, liste di pk in memoria) si
+parte dai valori (campo, pk) di un film e si chiede al DB il primo film
+prima o dopo con una condizione < / > sugli stessi campi dell'ordinamento:
+una query per direzione, servita dagli indici (campo, id) del model.
+
+La paginazione della lista funziona allo stesso modo: il cursore di una
+pagina contiene (campo, pk) del suo ultimo film e la pagina successiva è
+"i primi N film dopo il cursore", senza COUNT né OFFSET.
+"""
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+DEFAULT_SORT = "titolo_az"
+
+# parametro sort -> (campo, decrescente)
+SORT_OPTIONS = {
+    "titolo_az": ("titolo", False),
+    "titolo_za": ("titolo", True),
+    "anno_desc": ("anno", True),
+    "anno_asc": ("anno", False),
+    "voto_desc": ("voto", True),
+    "voto_asc": ("voto", False),
+    "ultima_visione": ("ultima_visione", True),
+    "recenti": ("pk", True),
+    # solo con la ricerca libera: annotazione di search.search_movies
+    "rilevanza": ("search_rank", False),
+}
+
+
+def sort_key(sort_param: str):
+    """(campo, decrescente) per il parametro sort (quello di default se sconosciuto)."""
+    return SORT_OPTIONS.get(sort_param) or SORT_OPTIONS[DEFAULT_SORT]
+
+
+def ordering(sort_param: str, reverse: bool = False) -> list:
+    """Argomenti di order_by per il parametro sort, con la pk come spareggio."""
+    field, descending = sort_key(sort_param)
+    if reverse:
+        descending = not descending
+    pk = "-pk" if descending else "pk"
+    if field == "pk":
+        return [pk]
+    expr = F(field).desc if descending else F(field).asc
+    # NULL in fondo, quindi in cima quando l'ordine è rovesciato
+    return [expr(nulls_first=True) if reverse else expr(nulls_last=True), pk]
+
+
+def _after(field: str, value, pk, descending: bool) -> Q:
+    """Film che vengono dopo (value, pk) nell'ordinamento (NULL in fondo)."""
+    op = "lt" if descending else "gt"
+    if field == "pk":
+        return Q(**{f"pk__{op}": pk})
+    if value is None:
+        return Q(**{f"{field}__isnull": True, f"pk__{op}": pk})
+    return (
+        Q(**{f"{field}__{op}": value})
+        | Q(**{field: value, f"pk__{op}": pk})
+        | Q(**{f"{field}__isnull": True})
+    )
+
+
+def _before(field: str, value, pk, descending: bool) -> Q:
+    """Film che vengono prima di (value, pk) nell'ordinamento (NULL in fondo)."""
+    op = "gt" if descending else "lt"
+    if field == "pk":
+        return Q(**{f"pk__{op}": pk})
+    if value is None:
+        return Q(**{f"{field}__isnull": False}) | Q(
+            **{f"{field}__isnull": True, f"pk__{op}": pk}
+        )
+    return Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"pk__{op}": pk})
+
+
+def _sort_value(queryset, movie, field: str):
+    if field == "pk":
+        return movie.pk
+    if hasattr(movie, field):
+        return getattr(movie, field)
+    # annotazione (es. search_rank) assente sul film caricato a parte
+    return queryset.filter(pk=movie.pk).values_list(field, flat=True).first()
+
+
+def neighbours(queryset, movie, sort_param: str):
+    """
+    Film precedente e successivo a movie nella queryset (già filtrata)
+    ordinata secondo sort_param. Ritorna (precedente, successivo), None se
+    movie è il primo o l'ultimo.
+    """
+    field, descending = sort_key(sort_param)
+    value = _sort_value(queryset, movie, field)
+    prev_movie = (
+        queryset.filter(_before(field, value, movie.pk, descending))
+        .order_by(*ordering(sort_param, reverse=True))
+        .first()
+    )
+    next_movie = (
+        queryset.filter(_after(field, value, movie.pk, descending))
+        .order_by(*ordering(sort_param))
+        .first()
+    )
+    return prev_movie, next_movie
+
+
+def encode_cursor(movie, sort_param: str) -> str:
+    """Cursore (stringa da mettere nell'URL) che punta subito dopo movie."""
+    field, _descending = sort_key(sort_param)
+    value = movie.pk if field == "pk" else getattr(movie, field)
+    raw = json.dumps([value, movie.pk], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(model, cursor: str, sort_param: str):
+    """(valore, pk) dal cursore, oppure None se il cursore non è valido."""
+    field, _descending = sort_key(sort_param)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        pk = int(pk)
+        if field == "pk":
+            return pk, pk
+        try:
+            model_field = model._meta.get_field(field)
+        except FieldDoesNotExist:
+            # annotazione numerica (es. search_rank)
+            return (None if value is None else float(value)), pk
+        return model_field.to_python(value), pk
+    except (binascii.Error, ValueError, TypeError, ValidationError):
+        return None
+
+
+def keyset_page(queryset, sort_param: str, cursor: str = None, size: int = 24):
+    """
+    I primi size film della queryset (già filtrata) dopo il cursore, ordinati
+    secondo sort_param; senza cursore (o con un cursore non valido) la prima
+    pagina. Ritorna (film, cursore della pagina successiva o None).
+    """
+    field, descending = sort_key(sort_param)
+    qs = queryset.order_by(*ordering(sort_param))
+    position = decode_cursor(queryset.model, cursor, sort_param) if cursor else None
+    if position is not None:
+        qs = qs.filter(_after(field, position[0], position[1], descending))
+
+    # un film in più per sapere se c'è una pagina successiva
+    movies = list(qs[: size + 1])
+    if len(movies) <= size:
+        return movies, None
+    movies = movies[:size]
+    return movies, encode_cursor(movies[-1], sort_param)
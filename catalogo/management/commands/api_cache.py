@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.apicache import get_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra il contenuto della cache delle risposte TMDB/OMDb ed elimina "
+        "le voci scadute o tutte le voci."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--purge",
+            action="store_true",
+            help="Elimina le voci scadute",
+        )
+        parser.add_argument(
+            "--clear",
+            nargs="?",
+            const="",
+            metavar="ENDPOINT",
+            help="Svuota la cache (solo l'endpoint indicato, se passato)",
+        )
+
+    def handle(self, *args, **options):
+        cache = get_cache()
+        if cache is None:
+            raise CommandError("La cache delle API è disattivata (API_CACHE_ENABLED).")
+
+        if options["clear"] is not None:
+            deleted = cache.clear(options["clear"] or None)
+            self.stdout.write(self.style.SUCCESS(f"Eliminate {deleted} voci."))
+        elif options["purge"]:
+            deleted = cache.purge_expired()
+            self.stdout.write(self.style.SUCCESS(f"Eliminate {deleted} voci scadute."))
+
+        summary = cache.summary()
+        if not summary:
+            self.stdout.write("La cache è vuota.")
+            return
+        total = 0
+        for endpoint, info in sorted(summary.items()):
+            total += info["bytes"]
+            self.stdout.write(
+                f"  {endpoint:<18} {info['entries']:>7} voci "
+                f"{info['bytes'] / (1024 * 1024):8.1f} MB"
+            )
+        self.stdout.write(f"Totale: {total / (1024 * 1024):.1f} MB ({cache.path})")
@@ -0,0 +1,282 @@
+import csv
+import os
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.utils import parse_release_names
+
+# nomi reali etichettati a mano, con i titoli che contengono parole da
+# metadati ("The French Connection", "Charlottes Web", ...)
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "release_names.tsv")
+
+# Titoli reali (con i casi difficili: numeri e anni nel titolo, trattini, ...)
+TITLES = [
+    ("The Matrix", 1999),
+    ("Alien", 1979),
+    ("Aliens", 1986),
+    ("Blade Runner", 1982),
+    ("Blade Runner 2049", 2017),
+    ("2001 A Space Odyssey", 1968),
+    ("1917", 2019),
+    ("2012", 2009),
+    ("Se7en", 1995),
+    ("Spider-Man", 2002),
+    ("Spider-Man Into the Spider-Verse", 2018),
+    ("The Godfather", 1972),
+    ("The Godfather Part II", 1974),
+    ("Pulp Fiction", 1994),
+    ("Kill Bill Vol 1", 2003),
+    ("The Final Cut", 2004),
+    ("Inception", 2010),
+    ("Interstellar", 2014),
+    ("The Dark Knight", 2008),
+    ("Mad Max Fury Road", 2015),
+    ("Mission Impossible - Fallout", 2018),
+    ("La vita è bella", 1997),
+    ("Nuovo Cinema Paradiso", 1988),
+    ("Il buono il brutto il cattivo", 1966),
+    ("La grande bellezza", 2013),
+    ("Perfetti sconosciuti", 2016),
+    ("Cheri", 2009),
+    ("Amelie", 2001),
+    ("Parasite", 2019),
+    ("Oldboy", 2003),
+    ("Spirited Away", 2001),
+    ("Back to the Future", 1985),
+    ("Jurassic Park", 1993),
+    ("Terminator 2 Judgment Day", 1991),
+    ("The Shining", 1980),
+    ("Fight Club", 1999),
+    ("Gladiator", 2000),
+    ("The Prestige", 2006),
+    ("Memento", 2000),
+    ("No Country for Old Men", 2007),
+    ("Arrival", 2016),
+    ("Dune", 2021),
+    ("Her", 2013),
+    ("Up", 2009),
+    ("Heat", 1995),
+    ("Casablanca", 1942),
+    ("Vertigo", 1958),
+    ("Apocalypse Now", 1979),
+    ("Ocean's Eleven", 2001),
+    ("WALL-E", 2008),
+    ("Toy Story 3", 2010),
+    ("Rocky IV", 1985),
+    ("300", 2006),
+    ("District 9", 2009),
+    ("Apollo 13", 1995),
+    ("Blade Runner The Final Cut", 1982),
+    ("Everything Everywhere All at Once", 2022),
+    ("The Lord of the Rings The Return of the King", 2003),
+    ("Harry Potter and the Deathly Hallows Part 2", 2011),
+    ("Star Wars Episode IV A New Hope", 1977),
+]
+
+RESOLUTIONS = [
+    ("1080p", "1080p"),
+    ("720p", "720p"),
+    ("2160p", "2160p"),
+    ("4K", "2160p"),
+]
+CODECS = [
+    ("x264", "H.264"),
+    ("H.264", "H.264"),
+    ("x265", "HEVC"),
+    ("HEVC", "HEVC"),
+    ("XviD", "MPEG-4"),
+    ("AV1", "AV1"),
+]
+SOURCES = ["BluRay", "WEB-DL", "WEBRip", "BDRip", "DVDRip", "HDTV", "REMUX"]
+AUDIO = ["AC3", "DTS", "DD5.1", "AAC2.0", "TrueHD.7.1.Atmos", "EAC3"]
+LANGUAGES = [("iTALiAN", "ita"), ("ITA", "ita"), ("ENG", "eng"), ("MULTi", "multi")]
+EDITIONS = [("EXTENDED", "Extended"), ("REMASTERED", "Remastered"), ("UNCUT", "Uncut")]
+GROUPS = ["GBM", "SPARKS", "FGT", "RARBG", "TERMiNAL", "iNTERNAL", "YTS"]
+EXTENSIONS = [".mkv", ".mp4", ".avi"]
+
+
+def _scene(title, sep):
+    return sep.join(re.sub(r"[^\w'-]+", " ", title).split())
+
+
+def generate_corpus(size: int, seed: int = 42):
+    """
+    Genera nomi di release nello stile di quelli reali (scene, YTS, nomi
+    "a mano", parti CD) con le etichette attese. Usa gli stessi token del
+    parser, quindi serve per misurare la velocità, non l'accuratezza.
+    """
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        title, year = rnd.choice(TITLES)
+        res, res_val = rnd.choice(RESOLUTIONS)
+        codec, codec_val = rnd.choice(CODECS)
+        lang, lang_val = rnd.choice(LANGUAGES)
+        edition, edition_val = rnd.choice(EDITIONS)
+        ext = rnd.choice(EXTENSIONS)
+        group = rnd.choice(GROUPS)
+        style = rnd.randrange(6)
+
+        expected = {
+            "title": title,
+            "year": year,
+            "resolution": None,
+            "codec": None,
+            "language": None,
+            "edition": None,
+            "part": None,
+        }
+        if style == 0:
+            name = f"{_scene(title, '.')}.{year}.{res}.{rnd.choice(SOURCES)}.{codec}-{group}"
+            expected.update(resolution=res_val, codec=codec_val)
+        elif style == 1:
+            name = (
+                f"{_scene(title, '.')}.{year}.{lang}.{edition}.{rnd.choice(AUDIO)}."
+                f"{rnd.choice(SOURCES)}.{codec}.{group}"
+            )
+            expected.update(codec=codec_val, language=lang_val, edition=edition_val)
+        elif style == 2:
+            name = f"[{group}] {title} ({year}) [{res}] [{rnd.choice(SOURCES)}]"
+            expected.update(resolution=res_val)
+        elif style == 3:
+            name = f"{title} ({year})"
+        elif style == 4:
+            part = rnd.randint(1, 2)
+            name = f"{_scene(title, '_')}_{year}_{lang}_CD{part}"
+            expected.update(language=lang_val, part=part)
+        else:
+            name = f"{_scene(title, ' ')} {year} {res} {lang}-ENG {codec}"
+            expected.update(resolution=res_val, codec=codec_val, language=lang_val)
+        corpus.append((name + ext, expected))
+    return corpus
+
+
+def load_corpus(path: str):
+    """
+    Legge un corpus TSV: nome, titolo, anno, risoluzione, codec, lingua,
+    edizione, parte (colonne vuote = non verificate).
+    """
+    corpus = []
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.reader(f, delimiter="\t"):
+            if not row or row[0].startswith("#"):
+                continue
+            row = (row + [""] * 8)[:8]
+            name, title, year, res, codec, lang, edition, part = row
+            corpus.append(
+                (
+                    name,
+                    {
+                        "title": title,
+                        "year": int(year) if year else None,
+                        "resolution": res or None,
+                        "codec": codec or None,
+                        "language": lang or None,
+                        "edition": edition or None,
+                        "part": int(part) if part else None,
+                    },
+                )
+            )
+    return corpus
+
+
+def _norm_title(value: str) -> str:
+    return " ".join(re.sub(r"[^\w]+", " ", value or "").lower().split())
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark del parser dei nomi di release: nomi/secondo e accuratezza "
+        "per campo su un corpus TSV (di default quello di nomi reali) o generato."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--corpus",
+            default=DEFAULT_CORPUS,
+            help="File TSV con nome e valori attesi (vedi load_corpus)",
+        )
+        parser.add_argument(
+            "--generated",
+            action="store_true",
+            help="Usa un corpus generato di --size nomi invece del file TSV",
+        )
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=5000,
+            help="Numero di nomi del corpus generato",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Ripetizioni per la misura della velocità",
+        )
+        parser.add_argument(
+            "--show-errors",
+            type=int,
+            default=0,
+            help="Mostra i primi N nomi con il titolo sbagliato",
+        )
+
+    def handle(self, *args, **options):
+        if options["generated"]:
+            corpus = generate_corpus(options["size"])
+        else:
+            try:
+                corpus = load_corpus(options["corpus"])
+            except OSError as exc:
+                raise CommandError(f"Impossibile leggere il corpus: {exc}") from exc
+        if not corpus:
+            raise CommandError("Il corpus è vuoto.")
+
+        names = [name for name, _expected in corpus]
+
+        best = None
+        for _ in range(max(1, options["repeat"])):
+            started = time.perf_counter()
+            results = parse_release_names(names)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        checks = {
+            "title": lambda r, e: _norm_title(r["title"]) == _norm_title(e["title"]),
+            "year": lambda r, e: r["year"] == e["year"],
+            "resolution": lambda r, e: r["resolution"] == e["resolution"],
+            "codec": lambda r, e: r["codec"] == e["codec"],
+            "language": lambda r, e: e["language"] is None
+            or e["language"] in r["languages"],
+            "edition": lambda r, e: r["edition"] == e["edition"],
+            "part": lambda r, e: r["part"] == e["part"],
+        }
+        correct = dict.fromkeys(checks, 0)
+        exact = 0
+        errors = []
+        for (name, expected), result in zip(corpus, results):
+            ok_all = True
+            for field, check in checks.items():
+                if check(result, expected):
+                    correct[field] += 1
+                else:
+                    ok_all = False
+                    if field == "title":
+                        errors.append((name, result["title"], expected["title"]))
+            exact += ok_all
+
+        total = len(corpus)
+        self.stdout.write(
+            f"Corpus: {total} nomi - {total / best:,.0f} nomi/s "
+            f"(miglior tempo su {options['repeat']}: {best * 1000:.1f} ms)"
+        )
+        for field in checks:
+            self.stdout.write(f"  {field:<11} {correct[field] / total:7.2%}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Tutti i campi corretti: {exact / total:.2%}")
+        )
+
+        for name, got, want in errors[: options["show_errors"]]:
+            self.stdout.write(self.style.WARNING(f"{name}: '{got}' invece di '{want}'"))
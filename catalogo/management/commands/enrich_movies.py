@@ -0,0 +1,121 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.apicache import get_cache
+from catalogo.enrichment import enrich_movies, reset_unmatched, unmatched_movies
+from catalogo.models import Movie
+from catalogo.tmdb import get_tmdb_client
+from catalogo.tmdb_index import get_title_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Completa i metadati dei film da TMDB e i voti della critica da OMDb, "
+        "con lookup in parallelo e limite di richieste al secondo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Considera tutti i film, non solo quelli senza trama",
+        )
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Sovrascrive anche i campi già valorizzati",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Numero di lookup in parallelo",
+        )
+        parser.add_argument(
+            "--report-unmatched",
+            action="store_true",
+            help="Non cerca niente: elenca i film che TMDB non trova più",
+        )
+        parser.add_argument(
+            "--retry-unmatched",
+            action="store_true",
+            help="Rimette in coda i film non trovati (es. dopo aver corretto i titoli)",
+        )
+
+    def handle(self, *args, **options):
+        if options["report_unmatched"]:
+            self.report_unmatched()
+            return
+
+        if get_tmdb_client() is None:
+            raise CommandError("Chiave API di TMDB non configurata (TMDB_API_KEY).")
+
+        if options["retry_unmatched"]:
+            self.stdout.write(f"Rimessi in coda {reset_unmatched()} film non trovati.")
+
+        started = time.monotonic()
+
+        def progress(stats):
+            if options["verbosity"] > 1:
+                self.stdout.write(
+                    f"... {stats['checked']} film controllati, "
+                    f"{stats['updated']} aggiornati"
+                )
+
+        stats = enrich_movies(
+            queryset=Movie.objects.all() if options["all"] else None,
+            overwrite=options["overwrite"],
+            workers=options["workers"],
+            progress=progress,
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Arricchimento completato in {elapsed:.1f}s: "
+                f"{stats['checked']} film controllati ({stats['lookups']} ricerche TMDB, "
+                f"{stats['coalesced']} accorpate), {stats['matched']} trovati, "
+                f"{stats['missed']} non trovati, {stats['errors']} errori, "
+                f"{stats['ratings']} voti della critica, {stats['updated']} aggiornati."
+            )
+        )
+
+        cache = get_cache()
+        if cache is not None:
+            for endpoint, counters in sorted(cache.stats().items()):
+                self.stdout.write(
+                    f"  cache {endpoint:<18} {counters['hits']} hit, "
+                    f"{counters['misses']} miss, {counters['stale']} scadute usate"
+                )
+
+        index = get_title_index()
+        if index is not None:
+            s = index.stats
+            self.stdout.write(
+                f"  indice locale      {s['resolved']} risolti, "
+                f"{s['ambiguous']} ambigui, {s['unknown']} sconosciuti, "
+                f"{s['rejected']} scartati"
+            )
+
+        client = get_tmdb_client()
+        if client is not None:
+            for endpoint, m in sorted(client.metrics().items()):
+                self.stdout.write(
+                    f"  rete  {endpoint:<18} {m['calls']} chiamate "
+                    f"({m['errors']} errori), media {m['avg_ms']} ms, "
+                    f"max {m['max_ms']} ms"
+                )
+
+    def report_unmatched(self):
+        movies = unmatched_movies().order_by("titolo")
+        for movie in movies:
+            state = movie.enrichment
+            self.stdout.write(
+                f"  [{movie.pk}] {movie.titolo} ({movie.anno or '?'}) - "
+                f"{state.misses} tentativi, ultimo {state.last_attempt:%d/%m/%Y} - "
+                f"{movie.percorso}"
+            )
+        self.stdout.write(
+            self.style.WARNING(f"Film non trovati su TMDB: {movies.count()}.")
+        )
@@ -0,0 +1,57 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.backup import EXPORT_FORMATS, stream_export, xlsx_available
+from catalogo.models import Movie
+
+
+class Command(BaseCommand):
+    help = (
+        "Esporta tutti i film in CSV, NDJSON o XLSX, in streaming (memoria "
+        "costante). L'NDJSON si ripristina con restore_movies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=sorted(EXPORT_FORMATS),
+            default="ndjson",
+            help="Formato del file (default: ndjson)",
+        )
+        parser.add_argument(
+            "-o",
+            "--output",
+            default="-",
+            help='File di destinazione ("-" = standard output, non per XLSX)',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options["format"]
+        output = options["output"]
+        if fmt == "xlsx":
+            if not xlsx_available():
+                raise CommandError("Per esportare in XLSX serve openpyxl.")
+            if output == "-":
+                raise CommandError("Per l'XLSX serve un file di destinazione (-o).")
+
+        started = time.monotonic()
+        chunks = stream_export(fmt, Movie.objects.order_by("pk"))
+        if output == "-":
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+
+        if fmt == "xlsx":
+            f = open(output, "wb")
+        else:
+            f = open(output, "w", encoding="utf-8", newline="")
+        with f:
+            for chunk in chunks:
+                f.write(chunk)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Catalogo esportato in {output} in {elapsed:.1f}s.")
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from catalogo.fingerprint import find_duplicates, fingerprint_library
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcola l'impronta (dimensione + hash di inizio/metà/fine) dei film "
+        "che non ce l'hanno ed elenca i file con lo stesso contenuto."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Ricalcola l'impronta di tutti i film, non solo di quelli senza",
+        )
+        parser.add_argument(
+            "--report-only",
+            action="store_true",
+            help="Non calcola impronte: mostra solo i duplicati già noti",
+        )
+
+    def handle(self, *args, **options):
+        if not options["report_only"]:
+            stats = fingerprint_library(force=options["all"])
+            self.stdout.write(
+                f"Impronte calcolate: {stats['updated']} "
+                f"({stats['failed']} file non leggibili)."
+            )
+
+        groups = find_duplicates()
+        for movies in groups:
+            first = movies[0]
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{first.titolo} ({first.dimensione_file_mb} MB) - {len(movies)} copie:"
+                )
+            )
+            for movie in movies:
+                self.stdout.write(f"  [{movie.pk}] {movie.percorso}")
+
+        self.stdout.write(self.style.SUCCESS(f"Gruppi di duplicati: {len(groups)}."))
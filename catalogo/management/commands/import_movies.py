@@ -0,0 +1,83 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.importer import ImportFormatError, import_movies
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa i film da un file XLSX o CSV (serve almeno la colonna del "
+        "titolo), a blocchi e con ripresa automatica se l'import si interrompe. "
+        "I film nuovi vengono completati da TMDB e OMDb."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_path", help="Percorso del file XLSX o CSV")
+        parser.add_argument(
+            "--watched",
+            action="store_true",
+            help='Imposta "visto" a True per tutti i film importati',
+        )
+        parser.add_argument(
+            "--titles-only",
+            action="store_true",
+            help="Importa solo i dati del file, senza completarli da TMDB e OMDb",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ricomincia dalla prima riga ignorando l'import interrotto",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Numero di lookup TMDB in parallelo",
+        )
+
+    def handle(self, *args, **options):
+        path = options["file_path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"File non trovato: {path}")
+
+        started = time.monotonic()
+
+        def progress(stats):
+            if options["verbosity"] > 0:
+                self.stdout.write(
+                    f"... {stats['rows']} righe lette, {stats['created']} film "
+                    f"nuovi, {stats['updated']} aggiornati"
+                )
+
+        try:
+            stats = import_movies(
+                path,
+                watched=options["watched"],
+                enrich=not options["titles_only"],
+                restart=options["restart"],
+                workers=options["workers"],
+                progress=progress,
+            )
+        except ImportFormatError as exc:
+            raise CommandError(str(exc)) from exc
+
+        if stats["resumed_from"]:
+            self.stdout.write(f"Import ripreso dopo la riga {stats['resumed_from']}.")
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Import completato in {elapsed:.1f}s: {stats['rows']} righe, "
+                f"{stats['created']} film nuovi ({stats['enriched']} completati "
+                f"da TMDB), {stats['updated']} aggiornati, "
+                f"{stats['duplicates']} doppioni nel file, "
+                f"{stats['skipped']} saltati, "
+                f"{stats['ratings']} voti della critica."
+            )
+        )
+        for number, reason in stats["skipped_examples"]:
+            self.stdout.write(self.style.WARNING(f"Riga {number}: {reason}"))
+        hidden = stats["skipped"] - len(stats["skipped_examples"])
+        if hidden:
+            self.stdout.write(self.style.WARNING(f"... e altre {hidden} righe saltate"))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.tmdb_index import get_title_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa i file di export giornalieri di TMDB (movie_ids_*.json.gz) "
+        "nell'indice locale titolo -> id, usato per saltare la ricerca online."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="+",
+            help="File di export (gzip o JSON, una riga per film)",
+        )
+        parser.add_argument(
+            "--append",
+            action="store_true",
+            help="Aggiunge all'indice invece di sostituirlo",
+        )
+
+    def handle(self, *args, **options):
+        index = get_title_index(create=True)
+        if index is None:
+            raise CommandError(
+                "L'indice locale di TMDB è disattivato (TMDB_INDEX_ENABLED)."
+            )
+
+        started = time.monotonic()
+
+        def progress(stats):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"... {stats['imported']} titoli importati")
+
+        try:
+            stats = index.ingest(
+                options["paths"], replace=not options["append"], progress=progress
+            )
+        except OSError as exc:
+            raise CommandError(f"Impossibile leggere il file: {exc}")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Importazione completata in {elapsed:.1f}s: {stats['read']} righe, "
+                f"{stats['imported']} titoli importati, {stats['skipped']} scartati."
+            )
+        )
+        self.stdout.write(f"Titoli nell'indice: {index.size()} ({index.path})")
@@ -0,0 +1,79 @@
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from catalogo.omdb import daily_limit, quota_remaining
+from catalogo.omdb_scheduler import drain_ratings_queue, ratings_queue
+
+
+def _seconds_to_midnight() -> float:
+    now = timezone.localtime()
+    midnight = datetime.combine(
+        now.date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo
+    )
+    return (midnight - now).total_seconds()
+
+
+class Command(BaseCommand):
+    help = (
+        "Chiede a OMDb i voti della critica dei film in coda (prima i mai "
+        "controllati, poi i più vecchi) senza superare il limite giornaliero."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Numero massimo di film da controllare",
+        )
+        parser.add_argument(
+            "--wait",
+            action="store_true",
+            help="Se il budget di oggi finisce, aspetta la mezzanotte e continua "
+            "finché la coda non è vuota",
+        )
+        parser.add_argument(
+            "--status",
+            action="store_true",
+            help="Mostra solo coda e budget residuo",
+        )
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            self.stdout.write(
+                f"Film in coda: {ratings_queue().count()} - richieste OMDb "
+                f"disponibili oggi: {quota_remaining()}/{daily_limit()}."
+            )
+            return
+
+        if not getattr(settings, "OMDB_API_KEY", None):
+            raise CommandError("Chiave API di OMDb non configurata (OMDB_API_KEY).")
+
+        while True:
+            stats = drain_ratings_queue(limit=options["limit"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Controllati {stats['checked']} film: {stats['updated']} voti, "
+                    f"{stats['not_found']} non trovati, {stats['errors']} errori. "
+                    f"Richieste rimaste oggi: {stats['quota_left']}."
+                )
+            )
+            if stats["offline"]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        "OMDb non risponde: i film rimasti restano in coda."
+                    )
+                )
+            if not (options["wait"] and stats["exhausted"]):
+                break
+            wait = _seconds_to_midnight() + 60
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Budget giornaliero esaurito: riprendo tra {wait / 3600:.1f} ore."
+                )
+            )
+            time.sleep(wait)
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalogo.probe import probe_library
+
+
+class Command(BaseCommand):
+    help = (
+        "Legge codec, risoluzione, durata e tracce audio dagli header dei file "
+        "MKV/MP4/MOV a catalogo (senza ffprobe)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rilegge tutti i file, anche quelli già analizzati, e sovrascrive la codifica",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Numero di thread per la lettura dei file",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(stats):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"... {stats['checked']} file analizzati")
+
+        stats = probe_library(
+            force=options["all"], workers=options["workers"], progress=progress
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Analisi completata in {elapsed:.1f}s: {stats['checked']} file, "
+                f"{stats['updated']} aggiornati, {stats['failed']} non leggibili, "
+                f"{stats['unchanged']} saltati (illeggibili e non modificati)."
+            )
+        )
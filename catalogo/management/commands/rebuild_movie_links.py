@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalogo.taxonomy import prune_unused, sync_all_links
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricalcola generi e registi normalizzati di tutti i film dai campi "
+        "genere e regista ed elimina quelli non più usati."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-unused",
+            action="store_true",
+            help="Non eliminare generi e persone senza film.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(stats):
+            self.stdout.write(f"  {stats['movies']} film...")
+
+        stats = sync_all_links(progress=progress if options["verbosity"] > 1 else None)
+        pruned = 0 if options["keep_unused"] else prune_unused()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Legami ricalcolati in {elapsed:.1f}s: {stats['movies']} film, "
+                f"{stats['added']} aggiunti, {stats['removed']} tolti, "
+                f"{stats['moved']} riordinati, {pruned} nomi non usati eliminati."
+            )
+        )
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricostruisce da capo l'indice full-text (FTS5) usato dalla ricerca "
+        "libera su titolo, regista, genere, trama e percorso."
+    )
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError(
+                "Indice full-text non disponibile: serve SQLite con FTS5 "
+                "e la migrazione 0019 applicata."
+            )
+        started = time.monotonic()
+        count = rebuild_index()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Indice ricostruito in {elapsed:.1f}s: {count} film.")
+        )
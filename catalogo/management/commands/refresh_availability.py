@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalogo.availability import refresh_availability, register_volumes
+from catalogo.models import Volume
+
+
+class Command(BaseCommand):
+    help = (
+        "Controlla quali dischi (volumi) sono collegati e aggiorna in blocco "
+        "la disponibilità dei film. Con --every resta in esecuzione e ripete "
+        "il controllo periodicamente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--add",
+            nargs="+",
+            metavar="CARTELLA",
+            help="Registra nuove cartelle radice come volumi prima del controllo",
+        )
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=0,
+            help="Ripeti il controllo ogni N secondi (0 = una volta sola)",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=None,
+            help="Secondi concessi a ogni volume per rispondere",
+        )
+
+    def handle(self, *args, **options):
+        if options["add"]:
+            register_volumes(options["add"])
+
+        while True:
+            stats = refresh_availability(timeout=options["timeout"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Volumi: {stats['volumes']} ({stats['online']} collegati, "
+                    f"{stats['offline']} scollegati) - "
+                    f"film non disponibili: {stats['unavailable']}."
+                )
+            )
+            if options["verbosity"] > 1:
+                for volume in Volume.objects.order_by("path"):
+                    state = "online" if volume.online else "OFFLINE"
+                    self.stdout.write(f"  {state:<8} {volume.path}")
+
+            if options["every"] <= 0:
+                break
+            time.sleep(options["every"])
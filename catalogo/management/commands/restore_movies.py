@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.backup import RestoreError, restore_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Ripristina i film da un file NDJSON creato con export_movies. I film "
+        "già a catalogo (stesso percorso o imdb_id, o per quelli senza percorso "
+        "stesso titolo e anno) vengono aggiornati."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "file_path", help='File NDJSON da ripristinare ("-" = standard input)'
+        )
+
+    def handle(self, *args, **options):
+        path = options["file_path"]
+        started = time.monotonic()
+
+        def progress(stats):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"... {stats['rows']} righe ripristinate")
+
+        try:
+            if path == "-":
+                stats = restore_ndjson(sys.stdin, progress=progress)
+            else:
+                with open(path, encoding="utf-8") as f:
+                    stats = restore_ndjson(f, progress=progress)
+        except OSError as exc:
+            raise CommandError(f"File non leggibile: {exc}") from exc
+        except RestoreError as exc:
+            raise CommandError(
+                f"{exc} (i blocchi precedenti sono già stati scritti)"
+            ) from exc
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ripristino completato in {elapsed:.1f}s: {stats['rows']} film, "
+                f"{stats['created']} nuovi, {stats['updated']} aggiornati."
+            )
+        )
@@ -0,0 +1,98 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalogo.probe import probe_library
+from catalogo.scanner import scan_library
+
+
+class Command(BaseCommand):
+    help = (
+        "Scansiona una o più cartelle (anche di rete) in parallelo e aggiunge "
+        "i file video al catalogo. Di default la scansione è incrementale."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("roots", nargs="+", help="Cartelle radice da scansionare")
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rilegge tutte le cartelle ignorando il manifest della scansione precedente",
+        )
+        parser.add_argument(
+            "--ignore",
+            action="append",
+            default=None,
+            metavar="PATTERN",
+            help='Pattern da ignorare (ripetibile, es. --ignore "sample/"). '
+            "Sostituisce settings.SCAN_IGNORE_PATTERNS",
+        )
+        parser.add_argument(
+            "--no-fingerprint",
+            action="store_true",
+            help="Non calcola l'impronta dei file (i film spostati non vengono ricollegati)",
+        )
+        parser.add_argument(
+            "--probe",
+            action="store_true",
+            help="Al termine legge codec, risoluzione e durata dei file non ancora analizzati",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Numero di thread per la lettura delle cartelle",
+        )
+
+    def handle(self, *args, **options):
+        roots = options["roots"]
+        for root in roots:
+            if not os.path.isdir(root):
+                raise CommandError(
+                    f"La cartella '{root}' non esiste o non è accessibile."
+                )
+
+        started = time.monotonic()
+        last_report = [started]
+
+        def progress(stats):
+            now = time.monotonic()
+            if now - last_report[0] >= 5:
+                last_report[0] = now
+                self.stdout.write(f"... {stats['total']} file video trovati finora")
+
+        stats = scan_library(
+            roots,
+            incremental=not options["full"],
+            ignore_patterns=options["ignore"],
+            workers=options["workers"],
+            progress=progress if options["verbosity"] > 0 else None,
+            fingerprint=False if options["no_fingerprint"] else None,
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Scansione completata in {elapsed:.1f}s: {stats['total']} file video, "
+                f"{stats['new']} nuovi, {stats['moved']} spostati, "
+                f"{stats['updated']} aggiornati, "
+                f"{stats['removed']} non più presenti, "
+                f"{stats['fingerprinted']} impronte calcolate per film già a catalogo, "
+                f"{stats['skipped_dirs']} cartelle invariate "
+                f"({stats['rows_per_sec']} righe/s in scrittura)."
+            )
+        )
+        if stats["errors"]:
+            self.stdout.write(
+                self.style.WARNING(f"{stats['errors']} cartelle non accessibili.")
+            )
+
+        if options["probe"]:
+            probe_stats = probe_library(workers=options["workers"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Analisi header: {probe_stats['updated']} file aggiornati, "
+                    f"{probe_stats['failed']} non leggibili."
+                )
+            )
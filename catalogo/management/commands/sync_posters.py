@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalogo import posters
+
+
+class Command(BaseCommand):
+    help = (
+        "Scarica le locandine dei film e ne crea le copie locali in WebP "
+        "(92, 185 e 342 px), lo sfondo del banner e il segnaposto, con "
+        "download in parallelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Numero di download in parallelo",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help=(
+                "Ricrea copie WebP, sfondi e segnaposto mancanti delle "
+                "locandine già scaricate"
+            ),
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Elimina le locandine locali non più usate da nessun film",
+        )
+
+    def handle(self, *args, **options):
+        if posters.Image is None:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Pillow non è installato: si salvano solo gli originali, "
+                    "senza copie WebP ridimensionate, sfondi e segnaposto."
+                )
+            )
+
+        started = time.monotonic()
+
+        def progress(stats):
+            if options["verbosity"] > 1:
+                self.stdout.write(
+                    f"... {stats['checked']} film controllati, "
+                    f"{stats['downloaded']} locandine scaricate"
+                )
+
+        stats = posters.sync_posters(workers=options["workers"], progress=progress)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sincronizzazione completata in {elapsed:.1f}s: "
+                f"{stats['checked']} film controllati, {stats['downloaded']} "
+                f"locandine scaricate ({stats['stored']} nuove), {stats['reused']} "
+                f"già presenti, {stats['errors']} errori, {stats['updated']} film "
+                f"aggiornati."
+            )
+        )
+
+        if options["rebuild"]:
+            rebuilt = posters.rebuild_variants()
+            self.stdout.write(f"Copie ricreate per {rebuilt} locandine.")
+
+        if options["prune"]:
+            removed = posters.prune_posters()
+            self.stdout.write(f"Eliminate {removed} locandine non più usate.")
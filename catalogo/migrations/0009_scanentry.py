@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0008_movie_note_movie_stato'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('parent', models.CharField(blank=True, db_index=True, max_length=500)),
+                ('is_dir', models.BooleanField(default=False)),
+                ('mtime_ns', models.BigIntegerField(default=0)),
+                ('size', models.BigIntegerField(default=0)),
+                ('inode', models.BigIntegerField(default=0)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0009_scanentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="audio",
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="durata",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="Durata (min)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="risoluzione",
+            field=models.CharField(blank=True, max_length=20),
+        ),
+    ]
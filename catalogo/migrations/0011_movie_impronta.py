@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0010_movie_probe_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="impronta",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0011_movie_impronta"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Volume",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("path", models.CharField(max_length=500, unique=True)),
+                ("online", models.BooleanField(default=True)),
+                ("checked_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="disponibile",
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0012_volume_movie_disponibile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EnrichmentState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_attempt", models.DateTimeField()),
+                (
+                    "outcome",
+                    models.CharField(
+                        choices=[
+                            ("matched", "Trovato"),
+                            ("miss", "Non trovato"),
+                            ("error", "Errore"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("source", models.CharField(blank=True, max_length=20)),
+                ("misses", models.PositiveIntegerField(default=0)),
+                (
+                    "next_attempt",
+                    models.DateTimeField(blank=True, db_index=True, null=True),
+                ),
+                (
+                    "movie",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="enrichment",
+                        to="catalogo.movie",
+                    ),
+                ),
+            ],
+        ),
+    ]
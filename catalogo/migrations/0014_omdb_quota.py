@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-16 20:59
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_existing_ratings(apps, schema_editor):
+    # i voti già presenti contano come appena letti: non consumano la quota
+    Movie = apps.get_model("catalogo", "Movie")
+    Movie.objects.filter(critic_rating__isnull=False).update(
+        critic_checked_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0013_enrichmentstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="critic_checked_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="ApiQuota",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("service", models.CharField(max_length=20)),
+                ("day", models.DateField()),
+                ("used", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("service", "day")},
+            },
+        ),
+        migrations.RunPython(mark_existing_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-16 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0014_omdb_quota"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="locandina_hash",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="locandina_origine",
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
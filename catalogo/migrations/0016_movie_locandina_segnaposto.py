@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-16 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0015_movie_locandina_locale"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="locandina_colore",
+            field=models.CharField(blank=True, max_length=7),
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="locandina_lqip",
+            field=models.TextField(blank=True),
+        ),
+    ]
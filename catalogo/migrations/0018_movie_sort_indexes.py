@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0017_importcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(fields=["titolo", "id"], name="movie_titolo_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(fields=["anno", "id"], name="movie_anno_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(fields=["voto", "id"], name="movie_voto_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(
+                fields=["ultima_visione", "id"], name="movie_ultima_visione_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Indice full-text FTS5 sui film (vedi search.py). Solo su SQLite: sugli altri
+# DB la ricerca ripiega su icontains.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import catalogo.models
+
+FTS_COLUMNS = "titolo, regista, genere, trama, percorso"
+NEW_VALUES = "new.id, new.titolo, new.regista, new.genere, new.trama, new.percorso"
+OLD_VALUES = "old.id, old.titolo, old.regista, old.genere, old.trama, old.percorso"
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE catalogo_movie_fts USING fts5(
+        {FTS_COLUMNS},
+        content='catalogo_movie',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER catalogo_movie_fts_ai AFTER INSERT ON catalogo_movie BEGIN
+        INSERT INTO catalogo_movie_fts(rowid, {FTS_COLUMNS}) VALUES ({NEW_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER catalogo_movie_fts_ad AFTER DELETE ON catalogo_movie BEGIN
+        INSERT INTO catalogo_movie_fts(catalogo_movie_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', {OLD_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER catalogo_movie_fts_au
+    AFTER UPDATE OF {FTS_COLUMNS} ON catalogo_movie BEGIN
+        INSERT INTO catalogo_movie_fts(catalogo_movie_fts, rowid, {FTS_COLUMNS})
+        VALUES ('delete', {OLD_VALUES});
+        INSERT INTO catalogo_movie_fts(rowid, {FTS_COLUMNS}) VALUES ({NEW_VALUES});
+    END
+    """,
+    # pesi bm25 per colonna, usati dalla colonna nascosta rank
+    "INSERT INTO catalogo_movie_fts(catalogo_movie_fts, rank) "
+    "VALUES ('rank', 'bm25(10.0, 5.0, 3.0, 1.0, 0.5)')",
+    "INSERT INTO catalogo_movie_fts(catalogo_movie_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS catalogo_movie_fts_au",
+    "DROP TRIGGER IF EXISTS catalogo_movie_fts_ad",
+    "DROP TRIGGER IF EXISTS catalogo_movie_fts_ai",
+    "DROP TABLE IF EXISTS catalogo_movie_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0018_movie_sort_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+        migrations.CreateModel(
+            name="MovieSearchEntry",
+            fields=[
+                (
+                    "movie",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="ricerca",
+                        serialize=False,
+                        to="catalogo.movie",
+                    ),
+                ),
+                (
+                    "documento",
+                    catalogo.models.SearchDocumentField(db_column="catalogo_movie_fts"),
+                ),
+                ("rank", models.FloatField(db_column="rank")),
+            ],
+            options={
+                "db_table": "catalogo_movie_fts",
+                "managed": False,
+            },
+        ),
+    ]
@@ -0,0 +1,232 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:35
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia congelata della logica di taxonomy.py al momento della migrazione:
+# le migrazioni non importano il codice dell'app, che può cambiare.
+CHUNK_SIZE = 500
+NAME_MAX_LENGTH = 100
+NAME_SPLIT_RE = re.compile(r"\s*[,;/|]\s*")
+
+
+def _key(name):
+    return " ".join(name.split()).casefold()[:NAME_MAX_LENGTH]
+
+
+def _split(text):
+    names = {}
+    for name in NAME_SPLIT_RE.split(text or ""):
+        name = " ".join(name.split())[:NAME_MAX_LENGTH]
+        if name:
+            names.setdefault(_key(name), name)
+    return list(names.values())
+
+
+def backfill_links(apps, schema_editor):
+    # generi e registi dai campi di testo dei film già a catalogo
+    Movie = apps.get_model("catalogo", "Movie")
+    relations = [
+        (
+            "genere",
+            apps.get_model("catalogo", "Genre"),
+            apps.get_model("catalogo", "MovieGenre"),
+            "genre_id",
+        ),
+        (
+            "regista",
+            apps.get_model("catalogo", "Person"),
+            apps.get_model("catalogo", "MovieDirector"),
+            "person_id",
+        ),
+    ]
+    for text_field, entity, link, fk in relations:
+        ids = {}
+        last_pk = 0
+        while True:
+            rows = list(
+                Movie.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", text_field)[:CHUNK_SIZE]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            names = {pk: _split(text) for pk, text in rows}
+            missing = {}
+            for movie_names in names.values():
+                for name in movie_names:
+                    if _key(name) not in ids:
+                        missing.setdefault(_key(name), name)
+            entity.objects.bulk_create(
+                [entity(nome=name, chiave=key) for key, name in missing.items()]
+            )
+            ids.update(
+                entity.objects.filter(chiave__in=list(missing)).values_list(
+                    "chiave", "pk"
+                )
+            )
+            link.objects.bulk_create(
+                [
+                    link(movie_id=pk, posizione=position, **{fk: ids[_key(name)]})
+                    for pk, movie_names in names.items()
+                    for position, name in enumerate(movie_names)
+                ]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0019_movie_fts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Genre",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nome", models.CharField(max_length=100)),
+                ("chiave", models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                "ordering": ["nome"],
+            },
+        ),
+        migrations.CreateModel(
+            name="Person",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nome", models.CharField(max_length=100)),
+                ("chiave", models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                "ordering": ["nome"],
+            },
+        ),
+        migrations.CreateModel(
+            name="MovieGenre",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("posizione", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "genre",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movie_links",
+                        to="catalogo.genre",
+                    ),
+                ),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="genre_links",
+                        to="catalogo.movie",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="generi",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="movies",
+                through="catalogo.MovieGenre",
+                to="catalogo.genre",
+            ),
+        ),
+        migrations.CreateModel(
+            name="MovieDirector",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("posizione", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="director_links",
+                        to="catalogo.movie",
+                    ),
+                ),
+                (
+                    "person",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="director_links",
+                        to="catalogo.person",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="registi",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="diretti",
+                through="catalogo.MovieDirector",
+                to="catalogo.person",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="moviegenre",
+            index=models.Index(
+                fields=["genre", "posizione", "movie"], name="moviegenre_genre_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="moviegenre",
+            constraint=models.UniqueConstraint(
+                fields=("movie", "genre"), name="unique_movie_genre"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="moviedirector",
+            index=models.Index(
+                fields=["person", "movie"], name="moviedirector_person_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="moviedirector",
+            constraint=models.UniqueConstraint(
+                fields=("movie", "person"), name="unique_movie_director"
+            ),
+        ),
+        migrations.RunPython(backfill_links, migrations.RunPython.noop),
+    ]
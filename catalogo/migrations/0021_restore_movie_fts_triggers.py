@@ -0,0 +1,37 @@
+# Su SQLite la 0020 ricrea la tabella catalogo_movie (AddField dei
+# ManyToMany generi/registi) e con lei spariscono i trigger che tengono
+# aggiornato l'indice full-text della 0019: qui si ricreano e si ricostruisce
+# l'indice.
+
+from importlib import import_module
+
+from django.db import migrations
+
+fts = import_module("catalogo.migrations.0019_movie_fts")
+
+# i tre CREATE TRIGGER della 0019
+TRIGGER_SQL = [sql for sql in fts.CREATE_SQL if "CREATE TRIGGER" in sql]
+
+
+def restore_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in fts.DROP_SQL:
+        if "DROP TRIGGER" in sql:
+            schema_editor.execute(sql)
+    for sql in TRIGGER_SQL:
+        schema_editor.execute(sql)
+    schema_editor.execute(
+        "INSERT INTO catalogo_movie_fts(catalogo_movie_fts) VALUES ('rebuild')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0020_movie_genres_directors"),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:02
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# su SQLite AddField (e RemoveField all'indietro) ricrea catalogo_movie e si
+# porta via i trigger FTS5: si ricreano dopo, in entrambe le direzioni
+fts_triggers = import_module("catalogo.migrations.0021_restore_movie_fts_triggers")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogo", "0021_restore_movie_fts_triggers"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, fts_triggers.restore_triggers),
+        migrations.AddField(
+            model_name="movie",
+            name="probe_firma",
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.RunPython(fts_triggers.restore_triggers, migrations.RunPython.noop),
+    ]
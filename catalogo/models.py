@@ -4,6 +4,38 @@ from django.db import models
 
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.urls import reverse
+
+from .pagecache import bump_catalog_version, changes_pages
+
+# larghezze (px) delle copie locali delle locandine (vedi posters.py)
+POSTER_SIZES = (92, 185, 342)
+
+
+class MovieQuerySet(models.QuerySet):
+    """
+    Le scritture in blocco non inviano segnali: cambiano comunque la
+    versione del catalogo (vedi pagecache.py), tranne quelle dei soli campi
+    di servizio. bulk_update passa da update().
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows and changes_pages(kwargs):
+            bump_catalog_version()
+        return rows
+
+    def delete(self):
+        result = super().delete()
+        if result[0]:
+            bump_catalog_version()
+        return result
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            bump_catalog_version()
+        return created
 
 
 class Movie(models.Model):
@@ -21,11 +53,29 @@ class Movie(models.Model):
     estensione = models.CharField(max_length=10, blank=True)  # es. .mkv, .mp4
     percorso = models.CharField(max_length=500)  # path completo sul disco
 
+    # Dati tecnici letti dall'header del file (vedi probe.py)
+    risoluzione = models.CharField(max_length=20, blank=True)  # es. 1920x1080
+    durata = models.IntegerField(null=True, blank=True, verbose_name="Durata (min)")
+    audio = models.CharField(max_length=200, blank=True)  # es. ita AC3 5.1, eng DTS 5.1
+    # "dimensione:mtime" del file all'ultima lettura dell'header: se la durata
+    # non si è potuta leggere, non si riprova finché il file non cambia
+    probe_firma = models.CharField(max_length=40, blank=True)
+    # dimensione + hash di inizio/metà/fine file (vedi fingerprint.py)
+    impronta = models.CharField(max_length=64, blank=True, db_index=True)
+    # False se il disco che contiene il file non è collegato (vedi availability.py)
+    disponibile = models.BooleanField(default=True, db_index=True)
+
     locandina_url = models.URLField(
         max_length=500,
         blank=True,
         help_text="URL dell'immagine della locandina (opzionale)",
     )
+    # copia locale della locandina: hash del contenuto e URL da cui è stata scaricata
+    locandina_hash = models.CharField(max_length=64, blank=True)
+    locandina_origine = models.URLField(max_length=500, blank=True)
+    # segnaposto della copia locale: immagine minuscola in data URI e colore dominante
+    locandina_lqip = models.TextField(blank=True)
+    locandina_colore = models.CharField(max_length=7, blank=True)  # es. #1a2b3c
 
     voto = models.IntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(10)], null=True, blank=True
@@ -45,6 +95,8 @@ class Movie(models.Model):
     )
     critic_source = models.CharField(max_length=50, blank=True)  # es. Metascore, Rotten
     critic_votes = models.IntegerField(null=True, blank=True)  # se disponibile
+    # ultima richiesta a OMDb, anche senza risultato (vedi omdb.py)
+    critic_checked_at = models.DateTimeField(null=True, blank=True, db_index=True)
     imdb_id = models.CharField(max_length=20, blank=True)  # per cache
 
     # Extra
@@ -68,5 +120,277 @@ class Movie(models.Model):
     )
     note = models.TextField(blank=True)
 
+    # generi e registi normalizzati, ricavati da genere e regista (vedi
+    # taxonomy.py): i filtri passano da qui invece che da un LIKE sul testo
+    generi = models.ManyToManyField(
+        "Genre", through="MovieGenre", related_name="movies", blank=True
+    )
+    registi = models.ManyToManyField(
+        "Person", through="MovieDirector", related_name="diretti", blank=True
+    )
+
+    objects = MovieQuerySet.as_manager()
+
+    class Meta:
+        # un indice per ogni ordinamento della lista, con la pk come spareggio
+        # (navigazione a chiave, vedi keyset.py)
+        indexes = [
+            models.Index(fields=["titolo", "id"], name="movie_titolo_idx"),
+            models.Index(fields=["anno", "id"], name="movie_anno_idx"),
+            models.Index(fields=["voto", "id"], name="movie_voto_idx"),
+            models.Index(
+                fields=["ultima_visione", "id"], name="movie_ultima_visione_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.titolo} ({self.anno})"
+
+    @property
+    def locandina_locale(self) -> bool:
+        """True se la copia locale corrisponde alla locandina attuale."""
+        return (
+            bool(self.locandina_hash) and self.locandina_origine == self.locandina_url
+        )
+
+    def poster_url(self, size: int) -> str:
+        """
+        URL della locandina larga size px: la copia locale se c'è, altrimenti
+        la misura corrispondente su TMDB (invece della w500 salvata).
+        """
+        if self.locandina_locale:
+            return reverse("poster_image", args=[self.locandina_hash, size])
+        if "/t/p/w500/" in self.locandina_url:
+            return self.locandina_url.replace("/t/p/w500/", f"/t/p/w{size}/")
+        return self.locandina_url
+
+    @property
+    def locandina_piccola(self) -> str:
+        return self.poster_url(185)
+
+    @property
+    def locandina_grande(self) -> str:
+        return self.poster_url(342)
+
+    @property
+    def locandina_sfondo(self) -> str:
+        """Sfondo già sfocato per il banner ("" se non è stato calcolato)."""
+        if self.locandina_locale and self.locandina_lqip:
+            return reverse("poster_backdrop", args=[self.locandina_hash])
+        return ""
+
+    @property
+    def stile_segnaposto(self) -> str:
+        """CSS del segnaposto da mostrare finché la locandina non è caricata."""
+        if not self.locandina_locale or not self.locandina_colore:
+            return ""
+        return (
+            f"background: {self.locandina_colore} url({self.locandina_lqip}) "
+            "center / cover no-repeat;"
+        )
+
+    @property
+    def locandina_srcset(self) -> str:
+        if not self.locandina_locale:
+            return ""
+        return ", ".join(f"{self.poster_url(s)} {s}w" for s in POSTER_SIZES)
+
+
+class ScanEntry(models.Model):
+    """
+    Manifest della scansione incrementale: stato (mtime, dimensione, inode)
+    di ogni cartella e file video visto dall'ultima scansione.
+    """
+
+    path = models.CharField(max_length=500, unique=True)
+    parent = models.CharField(max_length=500, blank=True, db_index=True)
+    is_dir = models.BooleanField(default=False)
+    mtime_ns = models.BigIntegerField(default=0)
+    size = models.BigIntegerField(default=0)
+    inode = models.BigIntegerField(default=0)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.path
+
+
+class Volume(models.Model):
+    """
+    Cartella radice (disco, chiavetta USB, share di rete) da cui arrivano i film.
+    Lo stato online viene aggiornato in blocco da availability.py.
+    """
+
+    path = models.CharField(max_length=500, unique=True)
+    online = models.BooleanField(default=True)
+    checked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.path
+
+
+class EnrichmentState(models.Model):
+    """
+    Esito dell'ultimo tentativo di arricchimento metadati di un film e
+    prossimo tentativo previsto (backoff esponenziale, vedi enrichment.py).
+    """
+
+    class Outcome(models.TextChoices):
+        MATCHED = "matched", "Trovato"
+        MISS = "miss", "Non trovato"
+        ERROR = "error", "Errore"
+
+    movie = models.OneToOneField(
+        Movie, on_delete=models.CASCADE, related_name="enrichment"
+    )
+    last_attempt = models.DateTimeField()
+    outcome = models.CharField(max_length=10, choices=Outcome.choices)
+    source = models.CharField(max_length=20, blank=True)  # es. tmdb, tmdb+omdb
+    misses = models.PositiveIntegerField(default=0)  # mancati consecutivi
+    # None = nessun nuovo tentativo (trovato, oppure non trovato troppe volte)
+    next_attempt = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.movie} - {self.get_outcome_display()}"
+
+
+class ApiQuota(models.Model):
+    """Richieste fatte in un giorno a un servizio con limite giornaliero (es. OMDb)."""
+
+    service = models.CharField(max_length=20)
+    day = models.DateField()
+    used = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("service", "day")
+
+    def __str__(self):
+        return f"{self.service} {self.day}: {self.used}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Avanzamento di un import da foglio di calcolo (vedi importer.py): righe
+    già scritte sul DB, per riprendere un import interrotto da lì.
+    """
+
+    # impronta del file (vedi fingerprint.py): lo stesso file anche se spostato
+    source = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=500)
+    rows_done = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.path}: {self.rows_done} righe"
+
+
+class Genre(models.Model):
+    """Genere, una riga per nome (vedi taxonomy.py)."""
+
+    nome = models.CharField(max_length=100)
+    # nome normalizzato (minuscolo, spazi singoli): "Drammatico" e
+    # "drammatico " sono lo stesso genere
+    chiave = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ["nome"]
+
+    def __str__(self):
+        return self.nome
+
+
+class Person(models.Model):
+    """Persona (per ora solo registi), una riga per nome."""
+
+    nome = models.CharField(max_length=100)
+    chiave = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ["nome"]
+
+    def __str__(self):
+        return self.nome
+
+
+class MovieGenre(models.Model):
+    """Legame film-genere; posizione 0 è il genere principale."""
+
+    movie = models.ForeignKey(
+        Movie, on_delete=models.CASCADE, related_name="genre_links"
+    )
+    genre = models.ForeignKey(
+        Genre, on_delete=models.CASCADE, related_name="movie_links"
+    )
+    posizione = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["movie", "genre"], name="unique_movie_genre"
+            )
+        ]
+        # film di un genere (filtri), partendo dal genere
+        indexes = [
+            models.Index(
+                fields=["genre", "posizione", "movie"], name="moviegenre_genre_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} - {self.genre_id}"
+
+
+class MovieDirector(models.Model):
+    """Legame film-regista, nell'ordine del campo regista."""
+
+    movie = models.ForeignKey(
+        Movie, on_delete=models.CASCADE, related_name="director_links"
+    )
+    person = models.ForeignKey(
+        Person, on_delete=models.CASCADE, related_name="director_links"
+    )
+    posizione = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["movie", "person"], name="unique_movie_director"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["person", "movie"], name="moviedirector_person_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} - {self.person_id}"
+
+
+class SearchDocumentField(models.TextField):
+    """
+    Colonna nascosta di FTS5 con lo stesso nome della tabella: è quella su
+    cui si applica MATCH per cercare in tutte le colonne (vedi search.py).
+    """
+
+
+class MovieSearchEntry(models.Model):
+    """
+    Riga dell'indice full-text catalogo_movie_fts (rowid = pk del film).
+
+    La tabella virtuale e i trigger che la tengono allineata sono creati
+    dalla migrazione 0019, solo su SQLite: il model serve a fare la JOIN
+    con Movie e a leggere il punteggio bm25 (colonna nascosta rank).
+    """
+
+    movie = models.OneToOneField(
+        Movie,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="ricerca",
+    )
+    documento = SearchDocumentField(db_column="catalogo_movie_fts")
+    rank = models.FloatField(db_column="rank")
+
+    class Meta:
+        managed = False
+        db_table = "catalogo_movie_fts"
@@ -1,28 +1,99 @@
 import requests
 from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 
+from .apicache import cached_fetch
+from .models import ApiQuota
+from .ratelimit import get_limiter
 
-def fetch_omdb_ratings(imdb_id: str):
+OMDB_URL = "http://www.omdbapi.com/"
+
+# la chiave gratuita di OMDb permette 1000 richieste al giorno
+DEFAULT_OMDB_DAILY_LIMIT = 1000
+
+
+class QuotaExceeded(Exception):
+    """Le richieste giornaliere a OMDb sono finite: si riprende domani."""
+
+
+def daily_limit() -> int:
+    return getattr(settings, "OMDB_DAILY_LIMIT", DEFAULT_OMDB_DAILY_LIMIT)
+
+
+def quota_remaining() -> int:
+    """Richieste a OMDb ancora disponibili oggi."""
+    used = (
+        ApiQuota.objects.filter(service="omdb", day=timezone.localdate())
+        .values_list("used", flat=True)
+        .first()
+    )
+    return max(0, daily_limit() - (used or 0))
+
+
+def _reserve_call():
+    """Conta una richiesta sul budget di oggi (salvato sul DB) o alza QuotaExceeded."""
+    today = timezone.localdate()
+    ApiQuota.objects.get_or_create(service="omdb", day=today)
+    reserved = ApiQuota.objects.filter(
+        service="omdb", day=today, used__lt=daily_limit()
+    ).update(used=F("used") + 1)
+    if not reserved:
+        raise QuotaExceeded()
+
+
+def _refund_call():
+    """Restituisce una richiesta riservata che non è arrivata a OMDb."""
+    ApiQuota.objects.filter(
+        service="omdb", day=timezone.localdate(), used__gt=0
+    ).update(used=F("used") - 1)
+
+
+def _mark_exhausted():
+    # OMDb ha già chiuso la giornata (es. richieste fatte da un'altra installazione)
+    ApiQuota.objects.filter(service="omdb", day=timezone.localdate()).update(
+        used=daily_limit()
+    )
+
+
+def fetch_omdb_ratings(imdb_id: str, raise_errors: bool = False):
     """
     Recupera i rating della critica da OMDb usando l'imdb_id.
     Restituisce un dizionario con critic_rating (scala 0-10),
     critic_source e critic_votes (se disponibile), altrimenti None.
+
+    Ogni richiesta di rete consuma il budget giornaliero (le risposte in cache
+    no). Con raise_errors=True la quota esaurita alza QuotaExceeded e gli
+    errori di rete rilanciano l'eccezione, per distinguerli da "non trovato".
     """
     api_key = getattr(settings, "OMDB_API_KEY", None)
     if not api_key or not imdb_id:
         return None
 
-    try:
-        resp = requests.get(
-            "http://www.omdbapi.com/",
-            params={"apikey": api_key, "i": imdb_id},
-            timeout=5,
-        )
+    params = {"apikey": api_key, "i": imdb_id}
+
+    def fetch():
+        _reserve_call()
+        get_limiter("omdb").acquire()
+        try:
+            resp = requests.get(OMDB_URL, params=params, timeout=5)
+        except requests.RequestException:
+            # timeout o connessione fallita: nessuna risposta, niente consumo
+            _refund_call()
+            raise
+        if resp.status_code == 401 and "limit" in resp.text.lower():
+            _mark_exhausted()
+            raise QuotaExceeded()
         resp.raise_for_status()
+        return resp.json()
+
+    try:
+        data = cached_fetch("omdb", params, fetch)
     except Exception:
+        if raise_errors:
+            raise
         return None
 
-    data = resp.json()
     if data.get("Response") != "True":
         return None
 
@@ -36,4 +107,3 @@ def fetch_omdb_ratings(imdb_id: str):
         "critic_source": "Metascore" if critic_rating is not None else None,
         "critic_votes": None,  # OMDb non fornisce un conteggio per la critica
     }
-
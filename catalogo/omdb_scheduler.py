@@ -0,0 +1,190 @@
+"""
+Coda delle richieste dei voti della critica a OMDb.
+
+La chiave gratuita di OMDb permette settings.OMDB_DAILY_LIMIT richieste al
+giorno: invece di chiamare OMDb per ogni film durante l'arricchimento, i film
+con imdb_id finiscono in coda e la coda viene svuotata finché c'è budget,
+prima i film mai controllati e poi quelli con il voto più vecchio di
+settings.OMDB_REFRESH_DAYS. I film con un voto recente non costano nulla.
+
+Quando il budget finisce la coda resta lì: drain_in_background (chiamato
+dalle view) o il comando omdb_ratings la riprendono il giorno dopo.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Movie
+from .omdb import QuotaExceeded, fetch_omdb_ratings, quota_remaining
+from .tmdb import apply_tmdb_data
+
+DEFAULT_OMDB_REFRESH_DAYS = 90
+DEFAULT_DRAIN_INTERVAL = 15 * 60  # secondi tra due svuotamenti automatici
+DRAIN_BATCH_SIZE = 50
+DRAIN_WORKERS = 4
+
+_drain_lock = threading.Lock()
+_last_drain = 0.0
+
+
+def _stale_cutoff(now=None):
+    days = getattr(settings, "OMDB_REFRESH_DAYS", DEFAULT_OMDB_REFRESH_DAYS)
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def critic_rating_is_fresh(movie: Movie) -> bool:
+    """True se OMDb è stato interrogato per il film da meno di OMDB_REFRESH_DAYS."""
+    return bool(movie.critic_checked_at and movie.critic_checked_at >= _stale_cutoff())
+
+
+def ratings_queue(now=None):
+    """Film da chiedere a OMDb, in ordine di priorità: mai controllati, poi i più vecchi."""
+    return (
+        Movie.objects.exclude(imdb_id="")
+        .filter(
+            Q(critic_checked_at__isnull=True)
+            | Q(critic_checked_at__lt=_stale_cutoff(now))
+        )
+        .order_by(F("critic_checked_at").asc(nulls_first=True), "pk")
+    )
+
+
+def drain_ratings_queue(limit: int = None, progress=None) -> dict:
+    """
+    Chiede a OMDb i voti dei film in coda finché c'è budget (al massimo
+    limit film). Una sola richiesta per imdb_id anche se più film lo hanno.
+    Se in un blocco falliscono tutte le richieste (rete giù) si smette:
+    le richieste fallite non consumano il budget, che quindi non finirebbe
+    mai, e si riprova al prossimo svuotamento.
+
+    Ritorna un dizionario con i contatori:
+      checked, updated, not_found, errors, quota_left, exhausted, offline
+    """
+    stats = {
+        "checked": 0,
+        "updated": 0,
+        "not_found": 0,
+        "errors": 0,
+        "quota_left": quota_remaining(),
+        "exhausted": False,
+        "offline": False,
+    }
+    if not getattr(settings, "OMDB_API_KEY", None):
+        return stats
+
+    failed = set()  # errori di rete: restano in coda per la prossima volta
+
+    def lookup(imdb_id):
+        try:
+            return fetch_omdb_ratings(imdb_id, raise_errors=True), None
+        except (requests.RequestException, QuotaExceeded) as exc:
+            return None, exc
+
+    with ThreadPoolExecutor(max_workers=DRAIN_WORKERS) as pool:
+        while True:
+            budget = quota_remaining()
+            if budget <= 0:
+                stats["exhausted"] = True
+                break
+            size = min(DRAIN_BATCH_SIZE, budget)
+            if limit is not None:
+                size = min(size, limit - stats["checked"])
+                if size <= 0:
+                    break
+            # size imdb_id diversi, presi con tutti i film che li condividono
+            queue = ratings_queue().exclude(pk__in=failed)
+            wanted = []
+            for imdb_id in queue.values_list("imdb_id", flat=True)[: size * 4]:
+                if imdb_id not in wanted:
+                    wanted.append(imdb_id)
+                    if len(wanted) >= size:
+                        break
+            batch = list(queue.filter(imdb_id__in=wanted))
+            if not batch:
+                break
+
+            by_imdb = defaultdict(list)
+            for movie in batch:
+                by_imdb[movie.imdb_id].append(movie)
+            imdb_ids = list(by_imdb)
+
+            now = timezone.now()
+            to_update = []
+            # senza risultato cambia solo la data del controllo, che non
+            # compare in nessuna pagina: non invalida la cache (pagecache.py)
+            checked_only = []
+            failures = 0
+            for imdb_id, (ratings, error) in zip(imdb_ids, pool.map(lookup, imdb_ids)):
+                movies = by_imdb[imdb_id]
+                if isinstance(error, QuotaExceeded):
+                    stats["exhausted"] = True
+                    continue
+                if error is not None:
+                    stats["errors"] += len(movies)
+                    failed.update(m.pk for m in movies)
+                    failures += 1
+                    continue
+                for movie in movies:
+                    stats["checked"] += 1
+                    movie.critic_checked_at = now
+                    if ratings:
+                        apply_tmdb_data(movie, ratings, overwrite=True)
+                        stats["updated"] += 1
+                        to_update.append(movie)
+                    else:
+                        stats["not_found"] += 1
+                        checked_only.append(movie)
+
+            Movie.objects.bulk_update(
+                to_update,
+                ["critic_rating", "critic_source", "critic_votes", "critic_checked_at"],
+            )
+            Movie.objects.bulk_update(checked_only, ["critic_checked_at"])
+            if progress:
+                progress(stats)
+            if failures == len(imdb_ids):
+                stats["offline"] = True
+            if stats["exhausted"] or stats["offline"]:
+                break
+
+    stats["quota_left"] = quota_remaining()
+    return stats
+
+
+def _drain_worker():
+    try:
+        close_old_connections()
+        drain_ratings_queue()
+    finally:
+        connection.close()
+        _drain_lock.release()
+
+
+def drain_in_background(force: bool = False) -> bool:
+    """
+    Avvia lo svuotamento della coda in un thread in background, al massimo
+    ogni settings.OMDB_DRAIN_INTERVAL secondi (o subito con force=True).
+    Così la coda riparte da sola quando il budget si rinnova il giorno dopo.
+    Ritorna True se lo svuotamento è stato avviato.
+    """
+    global _last_drain
+
+    interval = getattr(settings, "OMDB_DRAIN_INTERVAL", DEFAULT_DRAIN_INTERVAL)
+    if not force and _last_drain and time.monotonic() - _last_drain < interval:
+        return False
+    if not getattr(settings, "OMDB_API_KEY", None):
+        return False
+    if not _drain_lock.acquire(blocking=False):
+        return False  # già in corso
+    _last_drain = time.monotonic()
+    threading.Thread(target=_drain_worker, daemon=True).start()
+    return True
@@ -0,0 +1,202 @@
+"""
+Cache delle pagine del catalogo legata a una versione.
+
+Il catalogo cambia poche volte al giorno, ma ogni visita alla lista, alla
+home o al dettaglio rifaceva tutte le query e il rendering di base.html.
+Qui si tiene nella cache di Django un numero di versione del catalogo
+(l'istante in ns dell'ultima modifica): ogni scrittura su Movie lo cambia e
+le pagine renderizzate si salvano sotto una chiave che contiene la
+versione, quindi alla modifica successiva le copie vecchie non vengono più
+lette (e scadono da sole dopo PAGE_CACHE_TTL).
+
+La versione cambia con:
+  - save() / delete() di un film (segnali, vedi apps.py);
+  - update(), delete(), bulk_create() e bulk_update() sui film, che non
+    inviano segnali (MovieQuerySet in models.py): scansione, import,
+    arricchimento, disponibilità dei dischi, locandine, ...;
+  - i legami a generi e registi (taxonomy.sync_links).
+Le scritture che toccano solo campi di servizio, che nessuna pagina in cache
+mostra (SERVICE_FIELDS: impronte, data dell'ultimo controllo OMDb, ...), non
+la cambiano: i passaggi di manutenzione non svuotano la cache.
+Dentro una transazione il cambio avviene al commit, così nessuna richiesta
+può salvare sotto la versione nuova una pagina letta prima del commit.
+
+La chiave di una pagina contiene anche il percorso, la querystring
+normalizzata (parametri ordinati, vuoti esclusi), l'utente e il cookie
+CSRF: le pagine contengono form con il token CSRF, che vale solo per quel
+cookie. Senza cookie CSRF o con messaggi in sospeso la pagina non passa
+dalla cache.
+
+Con conditional=True la risposta ha ETag e Last-Modified e una richiesta
+condizionale con la stessa versione riceve 304 senza eseguire la view.
+Le parti che devono cambiare a ogni richiesta (il banner casuale) restano
+fuori dalla copia in cache: nella pagina c'è un segnaposto (HOLE) che viene
+riempito a ogni risposta.
+
+La cache di default (LocMemCache) è del singolo processo: con più processi
+serve una cache condivisa in settings.CACHES, altrimenti un processo non
+vede le modifiche fatte da un altro.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+VERSION_KEY = "catalogo:version"
+DEFAULT_PAGE_CACHE_TTL = 24 * 3600  # secondi
+
+# segnaposto delle parti riempite a ogni richiesta (vedi cached_page)
+HOLE = "<!--buco-pagina-->"
+
+# campi di Movie che nessuna pagina in cache mostra
+SERVICE_FIELDS = frozenset(
+    {"impronta", "critic_checked_at", "locandina_origine", "probe_firma"}
+)
+
+
+def catalog_version() -> int:
+    """Versione attuale del catalogo (inizializzata adesso se manca)."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _bump():
+    previous = cache.get(VERSION_KEY) or 0
+    cache.set(VERSION_KEY, max(time.time_ns(), previous + 1), None)
+
+
+def changes_pages(fields) -> bool:
+    """True se scrivere questi campi di Movie può cambiare una pagina."""
+    return not set(fields) <= SERVICE_FIELDS
+
+
+def bump_catalog_version(update_fields=None, **kwargs):
+    """
+    Cambia la versione del catalogo al commit della transazione in corso
+    (subito se non ce n'è una). Fa anche da ricevitore dei segnali di Movie:
+    un save(update_fields=...) con soli campi di servizio non la cambia.
+    """
+    if update_fields is not None and not changes_pages(update_fields):
+        return
+    transaction.on_commit(_bump)
+
+
+def version_time(version: int) -> float:
+    """Istante (epoch in secondi) della modifica che ha prodotto la versione."""
+    return version / 1e9
+
+
+def normalized_query(query) -> str:
+    """Querystring (QueryDict) con i parametri in ordine e senza i valori vuoti."""
+    items = sorted(
+        (key, value) for key, values in query.lists() for value in values if value != ""
+    )
+    return "&".join(f"{key}={value}" for key, value in items)
+
+
+def page_key(request, name: str, version: int = None) -> str:
+    """Chiave di cache della pagina per questa richiesta e versione."""
+    if version is None:
+        version = catalog_version()
+    user = request.user.pk if request.user.is_authenticated else ""
+    raw = "\n".join(
+        [
+            name,
+            request.path,
+            normalized_query(request.GET),
+            str(user),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        ]
+    )
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"catalogo:page:{version}:{digest}"
+
+
+def _cacheable(request) -> bool:
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if not request.COOKIES.get(settings.CSRF_COOKIE_NAME):
+        # il token CSRF nella pagina verrebbe da un cookie appena creato
+        return False
+    # i messaggi vanno mostrati (e consumati) da una pagina nuova
+    return not len(messages.get_messages(request))
+
+
+def _fill(response, fill, request):
+    if fill is None or response.streaming:
+        return response
+    if HOLE.encode() in response.content:
+        response.content = response.content.replace(
+            HOLE.encode(), fill(request).encode(), 1
+        )
+    return response
+
+
+def cached_page(conditional: bool = False, fill=None):
+    """
+    Decoratore delle view GET da mettere in cache per versione del catalogo.
+
+    conditional: risposte con ETag / Last-Modified e 304 alle richieste
+    condizionali (solo per pagine uguali a ogni richiesta).
+    fill: funzione(request) -> HTML da mettere al posto di HOLE a ogni
+    risposta, anche quella letta dalla cache.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request):
+                return _fill(view(request, *args, **kwargs), fill, request)
+
+            version = catalog_version()
+            key = page_key(request, view.__name__, version)
+            etag = last_modified = None
+            if conditional:
+                etag = quote_etag(key.rsplit(":", 1)[1] + f"-{version}")
+                last_modified = int(version_time(version))
+                not_modified = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified
+                )
+                if not_modified is not None:
+                    return not_modified
+
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                if (
+                    response.status_code != 200
+                    or response.streaming
+                    or response.cookies
+                ):
+                    return _fill(response, fill, request)
+                cache.set(
+                    key,
+                    (response.content, response["Content-Type"]),
+                    getattr(settings, "PAGE_CACHE_TTL", DEFAULT_PAGE_CACHE_TTL),
+                )
+
+            if conditional:
+                response["ETag"] = etag
+                response["Last-Modified"] = http_date(last_modified)
+                # il browser tiene la pagina ma la riconvalida a ogni visita
+                patch_cache_control(response, private=True, no_cache=True)
+            return _fill(response, fill, request)
+
+        return wrapper
+
+    return decorator
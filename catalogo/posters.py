@@ -0,0 +1,369 @@
+"""
+Copie locali delle locandine, in più misure.
+
+Ogni locandina viene scaricata una volta sola e salvata in base all'hash
+(sha256) del contenuto: settings.POSTER_ROOT/ab/abcdef.../original più le
+copie WebP larghe 92, 185 e 342 px (POSTER_SIZES). Due film con la stessa
+immagine, anche da URL diversi, condividono gli stessi file. Siccome il
+contenuto di un URL locale non cambia mai, la view poster_image lo serve con
+cache "immutable": il browser non lo richiede più.
+
+Insieme alle misure si calcolano una volta per tutte lo sfondo del banner
+(piccolo e già sfocato, così il browser non applica filtri) e, salvati anche
+sul film, un segnaposto minuscolo in data URI (LQIP) e il colore dominante:
+card e banner li dipingono subito, prima che arrivi l'immagine vera.
+
+Il ridimensionamento usa Pillow, che è opzionale: senza Pillow si salva solo
+l'originale e la view serve quello per tutte le misure (si risparmia comunque
+il download da TMDB e le card funzionano anche offline), senza sfondo né
+segnaposto.
+
+Il download gira in un pool di thread (comando sync_posters); sul film si
+salvano l'hash (locandina_hash) e l'URL da cui è stato scaricato
+(locandina_origine): se locandina_url cambia, la copia non vale più finché
+non viene riscaricata e nel frattempo si usa l'URL remoto.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db.models import F
+
+from .models import POSTER_SIZES, Movie
+
+try:
+    from PIL import Image, ImageFilter
+except ImportError:  # senza Pillow si salvano solo gli originali
+    Image = ImageFilter = None
+
+logger = logging.getLogger(__name__)
+_pillow_warned = False
+
+DEFAULT_POSTER_WORKERS = 8
+DEFAULT_WEBP_QUALITY = 80
+POSTER_BATCH_SIZE = 200
+DOWNLOAD_TIMEOUT = 15  # secondi
+MAX_POSTER_BYTES = 10 * 1024 * 1024
+
+ORIGINAL_NAME = "original"
+BACKDROP_NAME = "sfondo.webp"
+META_NAME = "meta.json"
+
+# sfondo del banner: piccolo e già sfocato, il browser lo allarga senza filtri
+BACKDROP_WIDTH = 192
+BACKDROP_BLUR = 2
+# segnaposto inline (LQIP) mostrato finché la locandina non è caricata
+LQIP_WIDTH = 16
+LQIP_QUALITY = 30
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def poster_root() -> Path:
+    return Path(getattr(settings, "POSTER_ROOT", settings.BASE_DIR / "locandine"))
+
+
+def poster_dir(digest: str) -> Path:
+    return poster_root() / digest[:2] / digest
+
+
+def poster_file(digest: str, size: int) -> Optional[Path]:
+    """
+    File da servire per la locandina e la misura richieste: la copia WebP o,
+    se manca (niente Pillow), l'originale. None se non c'è niente.
+    """
+    if not _DIGEST_RE.match(digest) or size not in POSTER_SIZES:
+        return None
+    directory = poster_dir(digest)
+    for path in (directory / f"{size}.webp", directory / ORIGINAL_NAME):
+        if path.is_file():
+            return path
+    return None
+
+
+def backdrop_file(digest: str) -> Optional[Path]:
+    """Sfondo sfocato del banner, se è stato creato (serve Pillow)."""
+    if not _DIGEST_RE.match(digest):
+        return None
+    path = poster_dir(digest) / BACKDROP_NAME
+    return path if path.is_file() else None
+
+
+def poster_meta(digest: str) -> dict:
+    """Segnaposto e colore dominante della locandina: {"lqip": ..., "colore": ...}."""
+    try:
+        return json.loads((poster_dir(digest) / META_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _resized(image, width: int):
+    # mai ingrandire: se l'originale è più stretto resta com'è
+    width = min(width, image.width)
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _dominant_color(image) -> str:
+    """Colore più frequente dopo aver ridotto l'immagine a pochi colori."""
+    small = _resized(image, 64).quantize(colors=5)
+    _count, index = max(small.getcolors())
+    r, g, b = small.getpalette()[index * 3 : index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _write_variants(data: bytes, directory: Path):
+    global _pillow_warned
+    if Image is None:
+        if not _pillow_warned:
+            _pillow_warned = True
+            logger.warning(
+                "Pillow non è installato: le locandine si salvano senza copie "
+                "WebP, sfondi e segnaposto (pip install -r requirements.txt, "
+                "poi sync_posters --rebuild)."
+            )
+        return
+    quality = getattr(settings, "POSTER_WEBP_QUALITY", DEFAULT_WEBP_QUALITY)
+    with Image.open(BytesIO(data)) as image:
+        image = image.convert("RGB")
+        for size in POSTER_SIZES:
+            _resized(image, size).save(
+                directory / f"{size}.webp", "WEBP", quality=quality, method=4
+            )
+
+        backdrop = _resized(image, BACKDROP_WIDTH).filter(
+            ImageFilter.GaussianBlur(BACKDROP_BLUR)
+        )
+        backdrop.save(directory / BACKDROP_NAME, "WEBP", quality=quality, method=4)
+
+        buffer = BytesIO()
+        _resized(image, LQIP_WIDTH).save(buffer, "WEBP", quality=LQIP_QUALITY)
+        meta = {
+            "lqip": "data:image/webp;base64,"
+            + base64.b64encode(buffer.getvalue()).decode("ascii"),
+            "colore": _dominant_color(image),
+        }
+    (directory / META_NAME).write_text(json.dumps(meta))
+
+
+def store_poster(data: bytes) -> tuple:
+    """
+    Salva l'immagine (se non c'è già) e ritorna (hash, nuova). Le misure
+    vengono scritte in una cartella temporanea e spostate al loro posto
+    tutte insieme, così un'interruzione non lascia copie a metà.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    directory = poster_dir(digest)
+    if (directory / ORIGINAL_NAME).is_file():
+        return digest, False
+
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=directory.parent, prefix=".tmp-"))
+    try:
+        (tmp / ORIGINAL_NAME).write_bytes(data)
+        _write_variants(data, tmp)
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            # un altro thread ha salvato la stessa immagine nel frattempo
+            if not (directory / ORIGINAL_NAME).is_file():
+                raise
+            return digest, False
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return digest, True
+
+
+def _download(session: requests.Session, url: str) -> bytes:
+    response = session.get(url, timeout=DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+    data = response.content
+    if not data or len(data) > MAX_POSTER_BYTES:
+        raise ValueError(f"locandina non valida: {url}")
+    return data
+
+
+PLACEHOLDER_FIELDS = [
+    "locandina_hash",
+    "locandina_origine",
+    "locandina_lqip",
+    "locandina_colore",
+]
+
+
+def posters_to_sync():
+    """Film con locandina remota non ancora scaricata (o cambiata da allora)."""
+    return Movie.objects.exclude(locandina_url="").exclude(
+        locandina_origine=F("locandina_url")
+    )
+
+
+def sync_posters(queryset=None, workers: int = None, progress=None) -> dict:
+    """
+    Scarica le locandine dei film (di default quelli di posters_to_sync) e
+    crea le copie locali. Ogni URL si scarica una volta sola, anche se lo
+    usano più film o se è già stato scaricato per un altro film.
+
+    Ritorna un dizionario con i contatori:
+      checked, downloaded, reused, stored, errors, updated
+    """
+    qs = queryset if queryset is not None else posters_to_sync()
+    if not workers:
+        workers = getattr(settings, "POSTER_WORKERS", DEFAULT_POSTER_WORKERS)
+
+    stats = {
+        "checked": 0,
+        "downloaded": 0,
+        "reused": 0,
+        "stored": 0,
+        "errors": 0,
+        "updated": 0,
+    }
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    def fetch(url):
+        try:
+            return store_poster(_download(session, url)), None
+        except Exception as exc:
+            return None, exc
+
+    movies = qs.exclude(locandina_url="").order_by("pk")
+    last_pk = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(movies.filter(pk__gt=last_pk)[:POSTER_BATCH_SIZE])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            stats["checked"] += len(batch)
+
+            urls = {m.locandina_url for m in batch}
+            # URL già scaricati per altri film: basta copiare l'hash
+            known = dict(
+                Movie.objects.filter(locandina_origine__in=urls)
+                .exclude(locandina_hash="")
+                .values_list("locandina_origine", "locandina_hash")
+            )
+            known = {
+                url: digest
+                for url, digest in known.items()
+                if poster_file(digest, POSTER_SIZES[0])
+            }
+            stats["reused"] += len(known)
+
+            missing = sorted(urls - set(known))
+            for url, (result, error) in zip(missing, pool.map(fetch, missing)):
+                if error is not None:
+                    stats["errors"] += 1
+                    continue
+                digest, new = result
+                stats["downloaded"] += 1
+                stats["stored"] += int(new)
+                known[url] = digest
+
+            metas = {digest: poster_meta(digest) for digest in set(known.values())}
+            to_update = []
+            for movie in batch:
+                digest = known.get(movie.locandina_url)
+                if digest is None:
+                    continue  # errore: si riprova alla prossima sincronizzazione
+                movie.locandina_hash = digest
+                movie.locandina_origine = movie.locandina_url
+                movie.locandina_lqip = metas[digest].get("lqip", "")
+                movie.locandina_colore = metas[digest].get("colore", "")
+                to_update.append(movie)
+            Movie.objects.bulk_update(to_update, PLACEHOLDER_FIELDS)
+            stats["updated"] += len(to_update)
+            if progress:
+                progress(stats)
+
+    session.close()
+    return stats
+
+
+def rebuild_variants() -> int:
+    """
+    Crea le copie WebP, lo sfondo e il segnaposto mancanti delle locandine
+    già salvate (es. dopo aver installato Pillow) e li copia sui film.
+    Ritorna il numero di locandine elaborate.
+    """
+    root = poster_root()
+    if Image is None or not root.is_dir():
+        return 0
+    rebuilt = 0
+    for original in root.glob(f"??/*/{ORIGINAL_NAME}"):
+        directory = original.parent
+        names = [f"{size}.webp" for size in POSTER_SIZES] + [BACKDROP_NAME, META_NAME]
+        if all((directory / name).is_file() for name in names):
+            continue
+        try:
+            _write_variants(original.read_bytes(), directory)
+        except (OSError, ValueError):
+            continue
+        rebuilt += 1
+    fill_placeholders()
+    return rebuilt
+
+
+def fill_placeholders() -> int:
+    """
+    Copia segnaposto e colore dominante sui film che hanno la copia locale
+    ma non ancora questi dati. Ritorna il numero di film aggiornati.
+    """
+    movies = list(
+        Movie.objects.exclude(locandina_hash="").filter(
+            locandina_colore="", locandina_origine=F("locandina_url")
+        )
+    )
+    metas = {}
+    to_update = []
+    for movie in movies:
+        if movie.locandina_hash not in metas:
+            metas[movie.locandina_hash] = poster_meta(movie.locandina_hash)
+        meta = metas[movie.locandina_hash]
+        if meta:
+            movie.locandina_lqip = meta.get("lqip", "")
+            movie.locandina_colore = meta.get("colore", "")
+            to_update.append(movie)
+    Movie.objects.bulk_update(
+        to_update, ["locandina_lqip", "locandina_colore"], batch_size=POSTER_BATCH_SIZE
+    )
+    return len(to_update)
+
+
+def prune_posters() -> int:
+    """Elimina le locandine locali non più usate da nessun film."""
+    root = poster_root()
+    if not root.is_dir():
+        return 0
+    used = set(
+        Movie.objects.exclude(locandina_hash="").values_list(
+            "locandina_hash", flat=True
+        )
+    )
+    removed = 0
+    for prefix in root.iterdir():
+        if not prefix.is_dir():
+            continue
+        for directory in prefix.iterdir():
+            if directory.name not in used:
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+    return removed
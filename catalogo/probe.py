@@ -0,0 +1,589 @@
+"""
+Lettura dei metadati tecnici (codec, risoluzione, durata, tracce audio)
+direttamente dall'intestazione dei file MKV (EBML) e MP4/MOV (atom).
+
+Non serve ffprobe: si leggono solo gli header degli elementi che interessano
+(letture mirate con seek), saltando i dati video. Su un disco di rete ogni
+file costa qualche KB invece dell'intero contenuto.
+"""
+
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+
+from .models import Movie
+
+PROBE_EXTENSIONS = [".mkv", ".mp4", ".m4v", ".mov"]
+
+DEFAULT_PROBE_WORKERS = 8
+PROBE_BATCH_SIZE = 200
+
+# Limite di sicurezza per gli elementi letti interi (Info, Tracks, tkhd, ...)
+MAX_ELEMENT_READ = 1024 * 1024
+
+# --- Matroska --------------------------------------------------------------
+
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+SEEKHEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ELEMENT_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+INFO_ID = 0x1549A966
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+TRACK_TYPE_ID = 0x83
+CODEC_ID_ID = 0x86
+CODEC_PRIVATE_ID = 0x63A2
+LANGUAGE_ID = 0x22B59C
+LANGUAGE_IETF_ID = 0x22B59D
+VIDEO_ID = 0xE0
+PIXEL_WIDTH_ID = 0xB0
+PIXEL_HEIGHT_ID = 0xBA
+AUDIO_ID = 0xE1
+CHANNELS_ID = 0x9F
+CLUSTER_ID = 0x1F43B675
+
+MKV_VIDEO_CODECS = {
+    "V_MPEG4/ISO/AVC": "H.264",
+    "V_MPEGH/ISO/HEVC": "HEVC",
+    "V_AV1": "AV1",
+    "V_VP9": "VP9",
+    "V_VP8": "VP8",
+    "V_MPEG4/ISO/ASP": "MPEG-4",
+    "V_MPEG4/ISO/SP": "MPEG-4",
+    "V_MPEG4/ISO/AP": "MPEG-4",
+    "V_MPEG2": "MPEG-2",
+    "V_MPEG1": "MPEG-1",
+    "V_THEORA": "Theora",
+}
+
+MKV_AUDIO_CODECS = [
+    # confronto per prefisso: A_AAC/MPEG4/LC ecc.
+    ("A_AAC", "AAC"),
+    ("A_EAC3", "EAC3"),
+    ("A_AC3", "AC3"),
+    ("A_DTS", "DTS"),
+    ("A_TRUEHD", "TrueHD"),
+    ("A_FLAC", "FLAC"),
+    ("A_OPUS", "Opus"),
+    ("A_VORBIS", "Vorbis"),
+    ("A_MPEG/L3", "MP3"),
+    ("A_MPEG/L2", "MP2"),
+    ("A_PCM", "PCM"),
+]
+
+# FourCC dei file AVI rimuxati in MKV (V_MS/VFW/FOURCC)
+FOURCC_CODECS = {
+    "XVID": "MPEG-4",
+    "DIVX": "MPEG-4",
+    "DX50": "MPEG-4",
+    "FMP4": "MPEG-4",
+    "H264": "H.264",
+    "AVC1": "H.264",
+    "X264": "H.264",
+    "HEVC": "HEVC",
+    "WMV3": "VC-1",
+    "WVC1": "VC-1",
+}
+
+# --- MP4 / MOV -------------------------------------------------------------
+
+MP4_VIDEO_CODECS = {
+    b"avc1": "H.264",
+    b"avc3": "H.264",
+    b"hvc1": "HEVC",
+    b"hev1": "HEVC",
+    b"av01": "AV1",
+    b"vp09": "VP9",
+    b"mp4v": "MPEG-4",
+    b"apch": "ProRes",
+    b"apcn": "ProRes",
+    b"apcs": "ProRes",
+    b"apco": "ProRes",
+    b"ap4h": "ProRes",
+    b"jpeg": "MJPEG",
+}
+
+MP4_AUDIO_CODECS = {
+    b"mp4a": "AAC",
+    b"ac-3": "AC3",
+    b"ec-3": "EAC3",
+    b"dtsc": "DTS",
+    b"dtsh": "DTS",
+    b"dtsl": "DTS",
+    b"Opus": "Opus",
+    b"fLaC": "FLAC",
+    b".mp3": "MP3",
+    b"alac": "ALAC",
+    b"lpcm": "PCM",
+    b"sowt": "PCM",
+    b"twos": "PCM",
+}
+
+CHANNEL_LAYOUTS = {1: "1.0", 2: "2.0", 6: "5.1", 7: "6.1", 8: "7.1"}
+
+
+def _read_at(f, pos: int, size: int) -> bytes:
+    f.seek(pos)
+    return f.read(size)
+
+
+def _read_vint(data: bytes, pos: int, keep_marker: bool = False):
+    """
+    Legge un intero a lunghezza variabile EBML.
+    Ritorna (valore, lunghezza); valore None = dimensione "sconosciuta".
+    """
+    first = data[pos]
+    if first == 0:
+        raise ValueError("vint EBML non valido")
+    length = 1
+    mask = 0x80
+    while not first & mask:
+        mask >>= 1
+        length += 1
+    if pos + length > len(data):
+        raise ValueError("vint EBML troncato")
+
+    value = first if keep_marker else first & (mask - 1)
+    for b in data[pos + 1 : pos + length]:
+        value = (value << 8) | b
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+def _read_element_header(data: bytes, pos: int):
+    """Ritorna (id, dimensione, lunghezza header) dell'elemento in pos."""
+    element_id, id_len = _read_vint(data, pos, keep_marker=True)
+    size, size_len = _read_vint(data, pos + id_len)
+    return element_id, size, id_len + size_len
+
+
+def _iter_elements(data: bytes, start: int = 0, end: Optional[int] = None):
+    """Itera gli elementi figli contenuti in data[start:end]: (id, inizio dati, dimensione)."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos < end:
+        element_id, size, header_len = _read_element_header(data, pos)
+        data_start = pos + header_len
+        if size is None:
+            size = end - data_start
+        yield element_id, data_start, size
+        pos = data_start + size
+
+
+def _uint(data: bytes) -> int:
+    return int.from_bytes(data, "big") if data else 0
+
+
+def _ebml_string(data: bytes) -> str:
+    return data.split(b"\x00", 1)[0].decode("utf-8", "replace")
+
+
+def _parse_mkv_info(data: bytes, result: dict):
+    scale = 1000000
+    duration = None
+    for element_id, start, size in _iter_elements(data):
+        value = data[start : start + size]
+        if element_id == TIMECODE_SCALE_ID:
+            scale = _uint(value) or scale
+        elif element_id == DURATION_ID and size in (4, 8):
+            duration = struct.unpack(">f" if size == 4 else ">d", value)[0]
+    if duration:
+        result["duration"] = duration * scale / 1e9
+
+
+def _parse_mkv_tracks(data: bytes, result: dict):
+    for element_id, start, size in _iter_elements(data):
+        if element_id != TRACK_ENTRY_ID:
+            continue
+
+        track = {"type": None, "codec": "", "language": "eng", "private": b""}
+        for child_id, child_start, child_size in _iter_elements(
+            data, start, start + size
+        ):
+            value = data[child_start : child_start + child_size]
+            if child_id == TRACK_TYPE_ID:
+                track["type"] = _uint(value)
+            elif child_id == CODEC_ID_ID:
+                track["codec"] = _ebml_string(value)
+            elif child_id == CODEC_PRIVATE_ID:
+                track["private"] = value
+            elif child_id == LANGUAGE_ID:
+                track["language"] = _ebml_string(value)
+            elif child_id == LANGUAGE_IETF_ID and track["language"] == "eng":
+                track["language"] = _ebml_string(value).split("-")[0]
+            elif child_id in (VIDEO_ID, AUDIO_ID):
+                for sub_id, sub_start, sub_size in _iter_elements(
+                    data, child_start, child_start + child_size
+                ):
+                    sub_value = data[sub_start : sub_start + sub_size]
+                    if sub_id == PIXEL_WIDTH_ID:
+                        track["width"] = _uint(sub_value)
+                    elif sub_id == PIXEL_HEIGHT_ID:
+                        track["height"] = _uint(sub_value)
+                    elif sub_id == CHANNELS_ID:
+                        track["channels"] = _uint(sub_value)
+
+        if track["type"] == 1 and not result.get("codec"):
+            codec = MKV_VIDEO_CODECS.get(track["codec"])
+            if codec is None and track["codec"] == "V_MS/VFW/FOURCC":
+                # BITMAPINFOHEADER: biCompression all'offset 16
+                fourcc = track["private"][16:20].decode("ascii", "replace").upper()
+                codec = FOURCC_CODECS.get(fourcc, fourcc)
+            result["codec"] = codec or track["codec"].replace("V_", "", 1)
+            result["width"] = track.get("width")
+            result["height"] = track.get("height")
+        elif track["type"] == 2:
+            codec = next(
+                (
+                    name
+                    for prefix, name in MKV_AUDIO_CODECS
+                    if track["codec"].startswith(prefix)
+                ),
+                track["codec"].replace("A_", "", 1),
+            )
+            result["audio"].append(
+                {
+                    "codec": codec,
+                    "language": track["language"],
+                    "channels": track.get("channels"),
+                }
+            )
+
+
+def _probe_mkv(f, file_size: int, result: dict):
+    head = _read_at(f, 0, 64)
+    element_id, size, header_len = _read_element_header(head, 0)
+    if element_id != EBML_ID or size is None:
+        raise ValueError("header EBML mancante")
+
+    pos = header_len + size
+    head = _read_at(f, pos, 12)
+    element_id, _size, header_len = _read_element_header(head, 0)
+    if element_id != SEGMENT_ID:
+        raise ValueError("segmento Matroska mancante")
+    segment_start = pos + header_len
+
+    wanted = {INFO_ID: _parse_mkv_info, TRACKS_ID: _parse_mkv_tracks}
+    seek_positions = {}
+    found = set()
+
+    pos = segment_start
+    while pos < file_size and found != wanted.keys():
+        head = _read_at(f, pos, 12)
+        if len(head) < 2:
+            break
+        element_id, size, header_len = _read_element_header(head, 0)
+        if element_id == CLUSTER_ID or size is None:
+            # inizio dei dati video: quello che manca lo cerchiamo con la SeekHead
+            break
+        data_start = pos + header_len
+        if element_id in wanted or element_id == SEEKHEAD_ID:
+            data = _read_at(f, data_start, min(size, MAX_ELEMENT_READ))
+            if element_id == SEEKHEAD_ID:
+                seek_positions.update(_parse_seekhead(data))
+            else:
+                wanted[element_id](data, result)
+                found.add(element_id)
+        pos = data_start + size
+
+    for element_id, parser in wanted.items():
+        if element_id in found or element_id not in seek_positions:
+            continue
+        pos = segment_start + seek_positions[element_id]
+        head = _read_at(f, pos, 12)
+        found_id, size, header_len = _read_element_header(head, 0)
+        if found_id == element_id and size is not None:
+            parser(_read_at(f, pos + header_len, min(size, MAX_ELEMENT_READ)), result)
+
+
+def _parse_seekhead(data: bytes) -> dict:
+    positions = {}
+    for element_id, start, size in _iter_elements(data):
+        if element_id != SEEK_ID:
+            continue
+        seek_id = None
+        seek_pos = None
+        for child_id, child_start, child_size in _iter_elements(
+            data, start, start + size
+        ):
+            value = data[child_start : child_start + child_size]
+            if child_id == SEEK_ELEMENT_ID:
+                seek_id = _uint(value)
+            elif child_id == SEEK_POSITION_ID:
+                seek_pos = _uint(value)
+        if seek_id is not None and seek_pos is not None:
+            positions.setdefault(seek_id, seek_pos)
+    return positions
+
+
+def _iter_atoms(f, start: int, end: int):
+    """Itera gli atom MP4 tra start ed end: (tipo, inizio dati, fine)."""
+    pos = start
+    while pos + 8 <= end:
+        head = _read_at(f, pos, 16)
+        if len(head) < 8:
+            break
+        size, atom_type = struct.unpack(">I4s", head[:8])
+        header_len = 8
+        if size == 1 and len(head) >= 16:
+            size = struct.unpack(">Q", head[8:16])[0]
+            header_len = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_len:
+            break
+        yield atom_type, pos + header_len, min(pos + size, end)
+        pos += size
+
+
+def _find_atom(f, start: int, end: int, atom_type: bytes):
+    for found_type, data_start, data_end in _iter_atoms(f, start, end):
+        if found_type == atom_type:
+            return data_start, data_end
+    return None
+
+
+def _read_atom(f, bounds) -> bytes:
+    start, end = bounds
+    return _read_at(f, start, min(end - start, MAX_ELEMENT_READ))
+
+
+def _mp4_language(packed: int) -> str:
+    # ISO-639-2/T impacchettato in 3 x 5 bit (+0x60)
+    chars = [((packed >> shift) & 0x1F) + 0x60 for shift in (10, 5, 0)]
+    if not all(0x61 <= c <= 0x7A for c in chars):
+        return ""
+    return bytes(chars).decode("ascii")
+
+
+def _probe_mp4_track(f, start: int, end: int, result: dict):
+    width = height = None
+    tkhd = _find_atom(f, start, end, b"tkhd")
+    if tkhd:
+        data = _read_atom(f, tkhd)
+        offset = 88 if data[:1] == b"\x01" else 76
+        if len(data) >= offset + 8:
+            width = struct.unpack(">I", data[offset : offset + 4])[0] >> 16
+            height = struct.unpack(">I", data[offset + 4 : offset + 8])[0] >> 16
+
+    mdia = _find_atom(f, start, end, b"mdia")
+    if not mdia:
+        return
+
+    handler = None
+    language = ""
+    entry_type = None
+    entry = b""
+    for atom_type, data_start, data_end in _iter_atoms(f, *mdia):
+        if atom_type == b"hdlr":
+            handler = _read_at(f, data_start + 8, 4)
+        elif atom_type == b"mdhd":
+            data = _read_at(f, data_start, 36)
+            offset = 32 if data[:1] == b"\x01" else 20
+            if len(data) >= offset + 2:
+                language = _mp4_language(
+                    struct.unpack(">H", data[offset : offset + 2])[0]
+                )
+        elif atom_type == b"minf":
+            stbl = _find_atom(f, data_start, data_end, b"stbl")
+            stsd = _find_atom(f, *stbl, b"stsd") if stbl else None
+            if stsd:
+                # versione/flag (4) + numero voci (4), poi la prima voce
+                data = _read_at(f, stsd[0] + 8, 64)
+                if len(data) >= 8:
+                    entry_type = data[4:8]
+                    entry = data[8:]
+
+    if handler == b"vide" and not result.get("codec"):
+        result["codec"] = MP4_VIDEO_CODECS.get(
+            entry_type, (entry_type or b"").decode("ascii", "replace").strip()
+        )
+        if not width and len(entry) >= 28:
+            width, height = struct.unpack(">HH", entry[24:28])
+        result["width"] = width
+        result["height"] = height
+    elif handler == b"soun":
+        channels = struct.unpack(">H", entry[16:18])[0] if len(entry) >= 18 else None
+        result["audio"].append(
+            {
+                "codec": MP4_AUDIO_CODECS.get(
+                    entry_type, (entry_type or b"").decode("ascii", "replace").strip()
+                ),
+                "language": "" if language == "und" else language,
+                "channels": channels,
+            }
+        )
+
+
+def _probe_mp4(f, file_size: int, result: dict):
+    moov = _find_atom(f, 0, file_size, b"moov")
+    if not moov:
+        raise ValueError("atom moov mancante")
+
+    for atom_type, data_start, data_end in _iter_atoms(f, *moov):
+        if atom_type == b"mvhd":
+            data = _read_at(f, data_start, 32)
+            if data[:1] == b"\x01":
+                timescale, duration = struct.unpack(">IQ", data[20:32])
+            else:
+                timescale, duration = struct.unpack(">II", data[12:20])
+            if timescale:
+                result["duration"] = duration / timescale
+        elif atom_type == b"trak":
+            _probe_mp4_track(f, data_start, data_end, result)
+
+
+def probe_file(path: str) -> Optional[dict]:
+    """
+    Legge codec video, risoluzione, durata e tracce audio di un file MKV/MP4/MOV.
+
+    Ritorna un dizionario con codec, width, height, duration (secondi) e
+    audio (lista di {codec, language, channels}), oppure None se il file non
+    è leggibile o il formato non è riconosciuto.
+    """
+    result = {
+        "codec": None,
+        "width": None,
+        "height": None,
+        "duration": None,
+        "audio": [],
+    }
+    try:
+        file_size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            magic = f.read(8)
+            if magic[:4] == b"\x1a\x45\xdf\xa3":
+                _probe_mkv(f, file_size, result)
+            elif magic[4:8] in (b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip"):
+                _probe_mp4(f, file_size, result)
+            else:
+                return None
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+    return result
+
+
+def format_audio(tracks) -> str:
+    """Riassume le tracce audio, es. 'ita AC3 5.1, eng DTS 5.1'."""
+    parts = []
+    for track in tracks:
+        channels = track.get("channels")
+        layout = CHANNEL_LAYOUTS.get(channels, f"{channels}ch") if channels else ""
+        parts.append(
+            " ".join(p for p in (track.get("language"), track["codec"], layout) if p)
+        )
+    return ", ".join(parts)
+
+
+def probe_fields(info: dict) -> dict:
+    """Converte il risultato di probe_file nei campi del model Movie."""
+    fields = {}
+    if info.get("codec"):
+        fields["codifica"] = info["codec"][:50]
+    if info.get("width") and info.get("height"):
+        fields["risoluzione"] = f"{info['width']}x{info['height']}"
+    if info.get("duration"):
+        fields["durata"] = max(1, round(info["duration"] / 60))
+    if info.get("audio"):
+        fields["audio"] = format_audio(info["audio"])[:200]
+    return fields
+
+
+def file_signature(path: str) -> str:
+    """Firma "dimensione:mtime" del file, "" se non è raggiungibile."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ""
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def probe_library(
+    queryset=None, force: bool = False, workers: int = None, progress=None
+) -> dict:
+    """
+    Legge gli header dei file a catalogo con un pool di thread e salva
+    codifica, risoluzione, durata e audio.
+
+    Di default considera solo i film senza durata, saltando quelli il cui
+    file non è cambiato dall'ultima lettura (Movie.probe_firma): un header
+    illeggibile non si rilegge a ogni passata. Con force=True rilegge tutto e
+    sovrascrive anche la codifica già presente.
+    Ritorna un dizionario con i contatori: checked, updated, failed, unchanged.
+    """
+    if not workers:
+        workers = getattr(settings, "PROBE_WORKERS", DEFAULT_PROBE_WORKERS)
+
+    qs = queryset if queryset is not None else Movie.objects.all()
+    qs = qs.filter(estensione__in=PROBE_EXTENSIONS)
+    if not force:
+        qs = qs.filter(durata__isnull=True)
+
+    stats = {"checked": 0, "updated": 0, "failed": 0, "unchanged": 0}
+    update_fields = ["codifica", "risoluzione", "durata", "audio", "probe_firma"]
+    last_pk = 0
+
+    def probe(row):
+        _pk, percorso, _codifica, firma = row
+        signature = file_signature(percorso)
+        if not force and signature and signature == firma:
+            return signature, None, False
+        return signature, probe_file(percorso), True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # paginazione per pk: non teniamo aperto un cursore mentre scriviamo
+            batch = list(
+                qs.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "percorso", "codifica", "probe_firma")[
+                    :PROBE_BATCH_SIZE
+                ]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            to_update = []
+            failed = []
+            for row, (signature, info, probed) in zip(batch, pool.map(probe, batch)):
+                pk, _percorso, codifica, firma = row
+                if not probed:
+                    stats["unchanged"] += 1
+                    continue
+                stats["checked"] += 1
+                fields = probe_fields(info) if info else {}
+                if not fields:
+                    stats["failed"] += 1
+                    # file irraggiungibile (firma vuota): si riprova la volta dopo
+                    if signature and signature != firma:
+                        failed.append(Movie(pk=pk, probe_firma=signature))
+                    continue
+                if codifica and not force:
+                    fields["codifica"] = codifica
+                to_update.append(
+                    Movie(
+                        pk=pk,
+                        codifica=fields.get("codifica", ""),
+                        risoluzione=fields.get("risoluzione", ""),
+                        durata=fields.get("durata"),
+                        audio=fields.get("audio", ""),
+                        probe_firma=signature,
+                    )
+                )
+
+            Movie.objects.bulk_update(to_update, update_fields)
+            Movie.objects.bulk_update(failed, ["probe_firma"])
+            stats["updated"] += len(to_update)
+            if progress:
+                progress(stats)
+
+    return stats
@@ -0,0 +1,177 @@
+"""
+Righe ("rail") della home per genere, calcolate dal DB.
+
+Ogni film sta nella riga del suo genere principale (MovieGenre con
+posizione 0, vedi taxonomy.py), dal più recente. Le prime RAIL_SIZE card di
+tutte le righe arrivano da una sola query con ROW_NUMBER() partizionato per
+genere, che legge solo l'indice (genre, posizione, movie); i film delle
+card si caricano poi per pk e i totali per genere arrivano da una query
+raggruppata. Dei film si leggono solo i campi che servono alla card
+(RAIL_FIELDS), niente trama o recensione: la memoria della home non cresce
+con il catalogo.
+
+Ogni riga ha uno slug e un cursore (vedi keyset.py): la view
+movie_rail_more restituisce le card successive di una riga.
+"""
+
+from django.db.models import Count, Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+
+from .keyset import encode_cursor, keyset_page
+from .models import Genre, Movie, MovieGenre
+
+RAIL_SIZE = 24
+CONTINUE_SIZE = 12
+TOP_RATED_MIN_VOTE = 8
+NO_GENRE = "Senza genere"
+
+# campi letti per le card delle righe (vedi movie_by_genre.html)
+RAIL_FIELDS = (
+    "id",
+    "titolo",
+    "anno",
+    "voto",
+    "locandina_url",
+    "locandina_hash",
+    "locandina_origine",
+    "locandina_colore",
+    "locandina_lqip",
+)
+
+# righe speciali in cima alla home: slug -> (titolo, ordinamento, card)
+SPECIAL_RAILS = {
+    "top-rated": ("Film 4 stelle e oltre", "voto_desc", RAIL_SIZE),
+    "continua-a-guardare": ("Continua a guardare", "ultima_visione", CONTINUE_SIZE),
+}
+GENRE_SORT = "recenti"
+NO_GENRE_SLUG = "senza-genere"
+GENRE_SLUG_PREFIX = "genere-"
+
+
+def _cards():
+    return Movie.objects.only(*RAIL_FIELDS)
+
+
+def _without_genre():
+    return _cards().filter(
+        ~Exists(MovieGenre.objects.filter(movie=OuterRef("pk"), posizione=0))
+    )
+
+
+def rail_queryset(slug: str):
+    """(queryset, ordinamento) della riga con questo slug, None se non esiste."""
+    if slug == "top-rated":
+        return _cards().filter(voto__gte=TOP_RATED_MIN_VOTE), "voto_desc"
+    if slug == "continua-a-guardare":
+        return _cards().filter(ultima_visione__isnull=False), "ultima_visione"
+    if slug == NO_GENRE_SLUG:
+        return _without_genre(), GENRE_SORT
+    if slug.startswith(GENRE_SLUG_PREFIX):
+        try:
+            genre_id = int(slug[len(GENRE_SLUG_PREFIX) :])
+        except ValueError:
+            return None
+        qs = _cards().filter(genre_links__genre_id=genre_id, genre_links__posizione=0)
+        return qs, GENRE_SORT
+    return None
+
+
+def rail_page(slug: str, cursor: str = None, size: int = RAIL_SIZE):
+    """
+    Card della riga dopo il cursore: (film, cursore successivo o None).
+    None se la riga non esiste.
+    """
+    found = rail_queryset(slug)
+    if found is None:
+        return None
+    qs, sort = found
+    return keyset_page(qs, sort, cursor, size)
+
+
+def _genre_rails(size: int, totals: dict) -> list:
+    """Righe dei generi: le prime size card di ogni genere, scelte con una query."""
+    # il ranking legge solo l'indice dei legami; i film e i nomi dei generi
+    # si caricano dopo, per pk, solo per le card che servono
+    ranked = list(
+        MovieGenre.objects.filter(posizione=0)
+        .annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F("genre_id"),
+                order_by=F("movie_id").desc(),
+            )
+        )
+        # una card in più per sapere se la riga continua
+        .filter(rank__lte=size + 1)
+        .order_by("genre_id", "rank")
+        .values_list("genre_id", "movie_id")
+    )
+    movies = _cards().in_bulk([movie_id for _genre_id, movie_id in ranked])
+    names = dict(Genre.objects.filter(pk__in=totals).values_list("pk", "nome"))
+
+    rails = {}
+    for genre_id, movie_id in ranked:
+        rail = rails.setdefault(
+            genre_id,
+            {
+                "titolo": names.get(genre_id, ""),
+                "movies": [],
+                "special": False,
+                "slug": f"{GENRE_SLUG_PREFIX}{genre_id}",
+                "count": totals[genre_id],
+                "next_cursor": None,
+            },
+        )
+        if movie_id in movies:
+            rail["movies"].append(movies[movie_id])
+
+    for rail in rails.values():
+        if len(rail["movies"]) > size:
+            del rail["movies"][size:]
+            rail["next_cursor"] = encode_cursor(rail["movies"][-1], GENRE_SORT)
+    return list(rails.values())
+
+
+def home_rails(size: int = RAIL_SIZE) -> list:
+    """
+    Righe della home già pronte per il template: prima quelle speciali (se
+    non vuote), poi una per genere principale in ordine alfabetico, compresa
+    "Senza genere".
+    """
+    sections = []
+    for slug, (titolo, _sort, rail_size) in SPECIAL_RAILS.items():
+        movies, next_cursor = rail_page(slug, size=rail_size)
+        if movies:
+            sections.append(
+                {
+                    "titolo": titolo,
+                    "movies": movies,
+                    "special": True,
+                    "slug": slug,
+                    "count": None,
+                    "next_cursor": next_cursor,
+                }
+            )
+
+    # film per genere principale (ogni film ne ha al massimo uno)
+    totals = dict(
+        MovieGenre.objects.filter(posizione=0)
+        .values("genre_id")
+        .annotate(n=Count("id"))
+        .values_list("genre_id", "n")
+    )
+    genres = _genre_rails(size, totals)
+    movies, next_cursor = rail_page(NO_GENRE_SLUG, size=size)
+    if movies:
+        genres.append(
+            {
+                "titolo": NO_GENRE,
+                "movies": movies,
+                "special": False,
+                "slug": NO_GENRE_SLUG,
+                "count": Movie.objects.count() - sum(totals.values()),
+                "next_cursor": next_cursor,
+            }
+        )
+    genres.sort(key=lambda rail: rail["titolo"])
+    return sections + genres
@@ -0,0 +1,93 @@
+"""
+Scelta di un film a caso senza caricare il catalogo.
+
+Per ogni insieme (tutti i film, solo quelli con locandina) si tiene in
+memoria l'elenco delle pk, letto con una sola query values_list. Un film a
+caso costa quindi un random.choice sull'elenco più una lettura per pk.
+
+Ogni elenco è salvato con la versione del catalogo (pagecache.py) letta
+insieme alle pk e viene riletto appena la versione cambia: la versione
+cambia anche con bulk_create, bulk_update e update() (scansione, import,
+arricchimento), che non inviano segnali, e con una cache condivisa anche
+per le modifiche fatte da un altro processo. I segnali post_save /
+post_delete di Movie (vedi apps.py) svuotano gli elenchi subito, senza
+aspettare il commit. Per le modifiche fatte fuori da Django gli elenchi
+vengono comunque riletti dopo settings.RANDOM_POOL_TTL secondi. Una pk nel
+frattempo sparita o senza più locandina viene semplicemente scartata: si
+svuota l'elenco e si riprova.
+"""
+
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Movie
+from .pagecache import catalog_version
+
+DEFAULT_RANDOM_POOL_TTL = 600  # secondi
+
+_pool_lock = threading.Lock()
+_pools = {}  # nome -> (pk, versione del catalogo, istante della lettura)
+
+
+def _querysets():
+    return {
+        "all": Movie.objects.all(),
+        "poster": Movie.objects.exclude(locandina_url=""),
+    }
+
+
+def _pool(name: str) -> list:
+    ttl = getattr(settings, "RANDOM_POOL_TTL", DEFAULT_RANDOM_POOL_TTL)
+    # letta prima delle pk: una modifica durante la lettura fa rileggere
+    version = catalog_version()
+    with _pool_lock:
+        cached = _pools.get(name)
+        if (
+            cached is not None
+            and cached[1] == version
+            and time.monotonic() - cached[2] < ttl
+        ):
+            return cached[0]
+    pks = list(_querysets()[name].values_list("pk", flat=True))
+    with _pool_lock:
+        _pools[name] = (pks, version, time.monotonic())
+    return pks
+
+
+def invalidate_pools(**kwargs):
+    """Svuota gli elenchi (ricevitore dei segnali di Movie)."""
+    with _pool_lock:
+        _pools.clear()
+
+
+def _pick(name: str, exclude=None):
+    for _attempt in range(2):
+        pks = _pool(name)
+        if not pks:
+            return None
+        idx = random.randrange(len(pks))
+        if pks[idx] == exclude and len(pks) > 1:
+            # uno qualunque degli altri, con la stessa probabilità
+            idx = (idx + random.randrange(1, len(pks))) % len(pks)
+        pk = pks[idx]
+        movie = _querysets()[name].filter(pk=pk).first()
+        if movie is not None:
+            return movie
+        invalidate_pools()  # elenco non aggiornato: lo rileggiamo
+    return None
+
+
+def random_movie(exclude=None):
+    """Un film a caso (None se il catalogo è vuoto)."""
+    return _pick("all", exclude)
+
+
+def random_movie_with_poster(exclude=None):
+    """
+    Un film a caso tra quelli con locandina, diverso da exclude (pk) se
+    possibile. None se nessun film ha la locandina.
+    """
+    return _pick("poster", exclude)
@@ -0,0 +1,66 @@
+"""
+Limitatori di frequenza per le API esterne (TMDB, OMDb).
+
+Ogni servizio ha un "secchiello" di gettoni condiviso da tutti i thread del
+processo: ogni richiesta HTTP consuma un gettone e i gettoni si ricaricano
+a velocità costante. Così i lookup in parallelo non superano mai i limiti
+del servizio, qualunque sia il numero di thread.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+# richieste al secondo (TMDB tollera circa 50 req/s per IP, OMDb non dichiara
+# un limite al secondo ma conviene non martellarlo)
+DEFAULT_REQUESTS_PER_SECOND = {
+    "tmdb": 40,
+    "omdb": 5,
+}
+
+
+class TokenBucket:
+    """Secchiello di gettoni: rate richieste al secondo, raffiche fino a capacity."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """Aspetta finché non ci sono abbastanza gettoni e li consuma."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(service: str) -> TokenBucket:
+    """
+    Ritorna il limitatore condiviso del servizio ("tmdb", "omdb").
+    La frequenza si imposta con settings.<SERVIZIO>_REQUESTS_PER_SECOND.
+    """
+    with _limiters_lock:
+        if service not in _limiters:
+            rate = getattr(
+                settings,
+                f"{service.upper()}_REQUESTS_PER_SECOND",
+                DEFAULT_REQUESTS_PER_SECOND.get(service, 10),
+            )
+            _limiters[service] = TokenBucket(rate)
+        return _limiters[service]
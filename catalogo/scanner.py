@@ -0,0 +1,584 @@
+"""
+Scansione (incrementale) delle cartelle con i file video.
+
+Lo stato di ogni cartella e file già visto viene salvato nel model ScanEntry
+(mtime, dimensione, inode). Alla scansione successiva le cartelle con mtime e
+inode invariati non vengono rilette: il loro contenuto diretto è lo stesso
+dell'ultima volta, quindi si riusa l'elenco salvato e si scende solo nelle
+sottocartelle. Nelle cartelle cambiate si confronta ogni file col manifest
+per trovare file nuovi, modificati (dimensione aggiornata) o rimossi.
+
+Un file riscritto "sul posto" non cambia l'mtime della cartella che lo
+contiene: per questo anche nelle cartelle invariate si rifà lo stat dei file
+già noti (senza listdir) e si confronta mtime e dimensione col manifest.
+
+Le cartelle vengono lette in parallelo da un pool di thread di dimensione
+fissa (utile sui dischi di rete, dove ogni stat ha una latenza alta) e i
+risultati vengono scritti sul DB a blocchi man mano che arrivano, per cui la
+memoria usata non cresce con il numero di file. Le cartelle che corrispondono
+ai pattern da ignorare (es. "sample/") vengono scartate senza entrarci.
+"""
+
+import fnmatch
+import os
+import re
+import time
+from collections import defaultdict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .availability import is_reachable, register_volumes, update_volume
+from .fingerprint import (
+    compute_fingerprints,
+    fingerprint_library,
+    fingerprint_workers,
+)
+from .models import Movie, ScanEntry, Volume
+from .utils import VIDEO_EXTENSIONS, parse_release_names
+
+# SQLite ha un limite sul numero di parametri per query: lavoriamo a blocchi
+CHUNK_SIZE = 500
+
+# Numero di voci accumulate prima di scriverle sul DB (una transazione per blocco)
+WRITE_BATCH_SIZE = 2000
+
+DEFAULT_SCAN_WORKERS = 8
+
+# Pattern sul nome di file/cartella; con la "/" finale valgono solo per le cartelle
+DEFAULT_IGNORE_PATTERNS = [
+    "sample/",
+    "samples/",
+    "extras/",
+    "featurettes/",
+    "@eaDir/",
+    "#recycle/",
+    "$RECYCLE.BIN/",
+    "System Volume Information/",
+    "*sample.*",
+]
+
+
+def _chunks(seq, size: int = CHUNK_SIZE):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i : i + size]
+
+
+def _size_mb(size_bytes: int) -> float:
+    return round(size_bytes / (1024 * 1024), 1)
+
+
+def _is_under(path: str, base_dir: str) -> bool:
+    return path == base_dir or path.startswith(base_dir.rstrip(os.sep) + os.sep)
+
+
+def _subtree_q(dir_path: str) -> Q:
+    return Q(path=dir_path) | Q(path__startswith=dir_path.rstrip(os.sep) + os.sep)
+
+
+def compile_ignore_patterns(patterns):
+    """
+    Compila i pattern glob (case-insensitive) in un'unica regex per tipo.
+
+    Ritorna una funzione is_ignored(nome, is_dir) -> bool.
+    """
+    dir_parts = []
+    any_parts = []
+    for pat in patterns or []:
+        pat = pat.strip()
+        if not pat:
+            continue
+        if pat.endswith("/"):
+            dir_parts.append(fnmatch.translate(pat.rstrip("/")))
+        else:
+            any_parts.append(fnmatch.translate(pat))
+
+    dir_re = re.compile("|".join(dir_parts), re.IGNORECASE) if dir_parts else None
+    any_re = re.compile("|".join(any_parts), re.IGNORECASE) if any_parts else None
+
+    def is_ignored(name: str, is_dir: bool) -> bool:
+        if any_re is not None and any_re.match(name):
+            return True
+        return is_dir and dir_re is not None and dir_re.match(name) is not None
+
+    return is_ignored
+
+
+def _known_state(path: str):
+    row = (
+        ScanEntry.objects.filter(path=path)
+        .values_list("is_dir", "mtime_ns", "size", "inode")
+        .first()
+    )
+    return tuple(row) if row else None
+
+
+def _known_children(dir_path: str) -> dict:
+    """Figli diretti di dir_path salvati nel manifest: {path: (is_dir, mtime_ns, size, inode)}."""
+    return {
+        path: (is_dir, mtime_ns, size, inode)
+        for path, is_dir, mtime_ns, size, inode in ScanEntry.objects.filter(
+            parent=dir_path
+        ).values_list("path", "is_dir", "mtime_ns", "size", "inode")
+    }
+
+
+def _scan_dir(dir_path, known_state, known_children, incremental, is_ignored):
+    """
+    Legge UNA cartella (gira nei thread del pool, non tocca il DB).
+
+    Ritorna None se la cartella non è accessibile, altrimenti un dizionario con
+    lo stato della cartella, le sottocartelle da visitare, i file nuovi o
+    cambiati e i figli non più presenti.
+    """
+    try:
+        st = os.stat(dir_path)
+    except OSError:
+        return None
+
+    state = (True, st.st_mtime_ns, 0, st.st_ino)
+    result = {
+        "path": dir_path,
+        "state": state,
+        "changed": state != known_state,
+        "subdirs": [],
+        "files": [],  # (path, nome, estensione, stato, stato_precedente)
+        "unchanged_files": 0,
+        "removed": [],  # (path, is_dir)
+    }
+
+    if incremental and not result["changed"]:
+        # cartella invariata: niente listdir, riusiamo l'elenco salvato
+        for path, child_state in known_children.items():
+            name = os.path.basename(path)
+            if is_ignored(name, child_state[0]):
+                result["removed"].append((path, child_state[0]))
+                continue
+            if child_state[0]:
+                result["subdirs"].append((path, child_state))
+                continue
+            # un file riscritto sul posto non cambia l'mtime della cartella
+            try:
+                fst = os.stat(path)
+            except OSError:
+                result["removed"].append((path, False))
+                continue
+            # l'inode resta quello salvato: os.stat e DirEntry.stat non
+            # riportano lo stesso st_ino su Windows
+            file_state = (False, fst.st_mtime_ns, fst.st_size, child_state[3])
+            if file_state == child_state:
+                result["unchanged_files"] += 1
+            else:
+                ext = os.path.splitext(name)[1].lower()
+                result["files"].append((path, name, ext, file_state, child_state))
+        return result
+
+    present = set()
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        # le cartelle ignorate non vengono nemmeno stat'ate
+                        if is_ignored(entry.name, True):
+                            continue
+                        present.add(entry.path)
+                        result["subdirs"].append(
+                            (entry.path, known_children.get(entry.path))
+                        )
+                        continue
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if ext not in VIDEO_EXTENSIONS or is_ignored(entry.name, False):
+                        continue
+                    if not entry.is_file():
+                        continue
+                    fst = entry.stat()
+                except OSError:
+                    continue
+
+                present.add(entry.path)
+                # su Windows DirEntry.stat() riporta st_ino = 0: resta comunque
+                # stabile tra una scansione e l'altra
+                file_state = (False, fst.st_mtime_ns, fst.st_size, fst.st_ino)
+                old = known_children.get(entry.path)
+                if old == file_state:
+                    result["unchanged_files"] += 1
+                else:
+                    result["files"].append(
+                        (entry.path, entry.name, ext, file_state, old)
+                    )
+    except OSError:
+        return None
+
+    for path, child_state in known_children.items():
+        if path not in present:
+            result["removed"].append((path, child_state[0]))
+    return result
+
+
+class _ScanWriter:
+    """Accumula i risultati delle cartelle e li scrive sul DB a blocchi."""
+
+    def __init__(self, stats: dict, roots=(), fingerprint: bool = False):
+        self.stats = stats
+        self.roots = roots
+        self.fingerprint = fingerprint
+        self.known = None  # {percorso: (pk, dimensione_file_mb)}, caricato una volta
+        self.write_seconds = 0.0
+        self._pool = None
+        self._reset()
+
+    def _get_pool(self):
+        # il pool di processi per le impronte parte solo se ci sono file nuovi
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=fingerprint_workers())
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _reset(self):
+        self.entries = {}  # voci del manifest da (ri)scrivere
+        self.new_files = []  # (path, nome, estensione, dimensione in byte)
+        self.changed_files = []  # (path, dimensione in byte)
+        self.removed_dirs = []
+        self.removed_files = []
+        self.pending = 0
+
+    def add(self, parent: str, result: dict):
+        dir_path = result["path"]
+        if result["changed"]:
+            self.entries[dir_path] = (parent, *result["state"])
+            self.pending += 1
+
+        self.stats["total"] += result["unchanged_files"] + len(result["files"])
+        for path, name, ext, state, old in result["files"]:
+            self.entries[path] = (dir_path, *state)
+            if old is None:
+                self.new_files.append((path, name, ext, state[2]))
+            else:
+                self.changed_files.append((path, state[2]))
+        for path, is_dir in result["removed"]:
+            (self.removed_dirs if is_dir else self.removed_files).append(path)
+
+        self.pending += len(result["files"]) + len(result["removed"])
+        if self.pending >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        started = time.monotonic()
+        with transaction.atomic():
+            self._write_movies()
+            self._write_manifest()
+        self.write_seconds += time.monotonic() - started
+        self._reset()
+
+    def _load_known(self):
+        if self.known is None:
+            self.known = {
+                percorso: (pk, dim)
+                for pk, percorso, dim in Movie.objects.values_list(
+                    "pk", "percorso", "dimensione_file_mb"
+                ).iterator(chunk_size=5000)
+            }
+        return self.known
+
+    def _write_movies(self):
+        if not self.new_files and not self.changed_files:
+            return
+        known = self._load_known()
+
+        # diff in memoria contro i percorsi già a catalogo: nessuna SELECT per file
+        new_files = []
+        for full_path, name, ext, size in self.new_files:
+            if full_path in known:
+                # film già a catalogo prima del manifest: riallinea la dimensione
+                if known[full_path][1] != _size_mb(size):
+                    self.changed_files.append((full_path, size))
+                continue
+            new_files.append((full_path, name, ext, size))
+
+        # titolo, anno e codifica dedotti dal nome del file, in un solo batch
+        parsed = parse_release_names([name for _p, name, _e, _s in new_files])
+        to_create = [
+            Movie(
+                percorso=full_path,
+                titolo=info["title"],
+                anno=info["year"],
+                genere="",
+                regista="",
+                dimensione_file_mb=_size_mb(size),
+                estensione=ext,
+                codifica=info["codec"] or "",
+            )
+            for (full_path, _name, ext, size), info in zip(new_files, parsed)
+        ]
+
+        if self.fingerprint and to_create:
+            to_create = self._relink_moved(to_create, known)
+
+        created = Movie.objects.bulk_create(to_create, batch_size=CHUNK_SIZE)
+        self.stats["new"] += len(created)
+        if created and created[0].pk is None:
+            # SQLite < 3.35 non restituisce le pk: ricarichiamo la mappa
+            self.known = None
+            known = self._load_known()
+        else:
+            for movie in created:
+                known[movie.percorso] = (movie.pk, movie.dimensione_file_mb)
+
+        changed = [(p, size) for p, size in self.changed_files if p in known]
+        update_fields = ["dimensione_file_mb"]
+        prints = {}
+        if self.fingerprint and changed:
+            # il contenuto è cambiato: anche l'impronta va ricalcolata
+            prints = compute_fingerprints([p for p, _size in changed], self._get_pool())
+            update_fields.append("impronta")
+
+        to_update = []
+        for full_path, size in changed:
+            pk, _dim = known[full_path]
+            known[full_path] = (pk, _size_mb(size))
+            to_update.append(
+                Movie(
+                    pk=pk,
+                    dimensione_file_mb=_size_mb(size),
+                    impronta=prints.get(full_path) or "",
+                )
+            )
+        if to_update:
+            Movie.objects.bulk_update(to_update, update_fields, batch_size=CHUNK_SIZE)
+        self.stats["updated"] += len(to_update)
+
+    def _relink_moved(self, to_create, known):
+        """
+        Calcola l'impronta dei file nuovi. Se corrisponde a un film a catalogo il
+        cui file (dentro le cartelle scansionate) non esiste più, il film è stato
+        spostato: aggiorniamo il suo percorso invece di creare un nuovo record,
+        così voto, recensione e metadati restano.
+
+        Ritorna i film da creare davvero.
+        """
+        prints = compute_fingerprints([m.percorso for m in to_create], self._get_pool())
+        for movie in to_create:
+            movie.impronta = prints.get(movie.percorso) or ""
+
+        candidates = defaultdict(list)
+        wanted = {m.impronta for m in to_create if m.impronta}
+        for chunk in _chunks(wanted):
+            for pk, percorso, impronta in Movie.objects.filter(
+                impronta__in=chunk
+            ).values_list("pk", "percorso", "impronta"):
+                # un file su un disco non scansionato (es. scollegato) non è "sparito"
+                if any(_is_under(percorso, root) for root in self.roots):
+                    candidates[impronta].append((pk, percorso))
+
+        remaining = []
+        moved = []
+        for movie in to_create:
+            match = next(
+                (
+                    c
+                    for c in candidates.get(movie.impronta, ())
+                    if not os.path.exists(c[1])
+                ),
+                None,
+            )
+            if match is None:
+                remaining.append(movie)
+                continue
+            candidates[movie.impronta].remove(match)
+            pk, old_path = match
+            known.pop(old_path, None)
+            known[movie.percorso] = (pk, movie.dimensione_file_mb)
+            moved.append(
+                Movie(
+                    pk=pk,
+                    percorso=movie.percorso,
+                    estensione=movie.estensione,
+                    dimensione_file_mb=movie.dimensione_file_mb,
+                )
+            )
+
+        if moved:
+            Movie.objects.bulk_update(
+                moved,
+                ["percorso", "estensione", "dimensione_file_mb"],
+                batch_size=CHUNK_SIZE,
+            )
+        self.stats["moved"] += len(moved)
+        return remaining
+
+    def _write_manifest(self):
+        self.stats["removed"] += len(self.removed_files)
+        for dir_path in self.removed_dirs:
+            subtree = ScanEntry.objects.filter(_subtree_q(dir_path))
+            self.stats["removed"] += subtree.filter(is_dir=False).count()
+            subtree.delete()
+
+        for chunk in _chunks(set(self.removed_files) | self.entries.keys()):
+            ScanEntry.objects.filter(path__in=chunk).delete()
+
+        ScanEntry.objects.bulk_create(
+            [
+                ScanEntry(
+                    path=path,
+                    parent=parent,
+                    is_dir=is_dir,
+                    mtime_ns=mtime_ns,
+                    size=size,
+                    inode=inode,
+                )
+                for path, (
+                    parent,
+                    is_dir,
+                    mtime_ns,
+                    size,
+                    inode,
+                ) in self.entries.items()
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+
+
+def _backfill_fingerprints(roots) -> dict:
+    """
+    Calcola l'impronta dei film sotto le radici che non ce l'hanno ancora
+    (es. a catalogo da prima dell'impronta). Va fatto finché il file è al suo
+    posto: quando sparisce non si può più ricollegarlo alla nuova posizione.
+    Dopo la prima scansione restano solo i file nuovi o non leggibili.
+    """
+    under_roots = Q()
+    for root in roots:
+        under_roots |= Q(percorso=root) | Q(
+            percorso__startswith=root.rstrip(os.sep) + os.sep
+        )
+    movies = Movie.objects.filter(under_roots, impronta="")
+    if not movies.exists():
+        return {"checked": 0, "updated": 0, "failed": 0}
+    return fingerprint_library(movies)
+
+
+def _walk(pending, workers, incremental, is_ignored, writer, stats, progress):
+    """Visita le cartelle con il pool di thread, passando i risultati al writer."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        while pending or in_flight:
+            # al massimo 2 cartelle in coda per thread: la memoria resta costante
+            while pending and len(in_flight) < workers * 2:
+                dir_path, parent, known = pending.pop()
+                future = pool.submit(
+                    _scan_dir,
+                    dir_path,
+                    known,
+                    _known_children(dir_path),
+                    incremental,
+                    is_ignored,
+                )
+                in_flight[future] = parent
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                parent = in_flight.pop(future)
+                result = future.result()
+                if result is None:
+                    stats["errors"] += 1
+                    continue
+                if not result["changed"] and incremental:
+                    stats["skipped_dirs"] += 1
+                pending.extend(
+                    (path, result["path"], state) for path, state in result["subdirs"]
+                )
+                writer.add(parent, result)
+                if progress:
+                    progress(stats)
+
+
+def scan_library(
+    roots,
+    incremental: bool = True,
+    ignore_patterns=None,
+    workers: int = None,
+    progress=None,
+    fingerprint: bool = None,
+) -> dict:
+    """
+    Scansiona una o più cartelle radice in parallelo e aggiorna il catalogo.
+
+    Con incremental=True le cartelle invariate dall'ultima scansione non
+    vengono rilette (dei file già noti si controlla solo lo stat); con incremental=False si rilegge tutto (ma il manifest
+    viene comunque aggiornato). Se ignore_patterns è None si usano
+    settings.SCAN_IGNORE_PATTERNS. progress, se passato, viene chiamato con
+    le statistiche parziali dopo ogni cartella letta.
+
+    I nuovi film vengono inseriti con bulk_create, una transazione per blocco.
+    Con fingerprint=True (default: settings.SCAN_FINGERPRINT) dei file nuovi
+    si calcola l'impronta, per ricollegare i film spostati al loro record;
+    prima della visita si calcola anche quella dei film già a catalogo sotto
+    le radici che non ce l'hanno (vedi _backfill_fingerprints).
+    Le radici vengono registrate come Volume e la disponibilità dei film
+    sotto di esse viene aggiornata (vedi availability.py).
+
+    Ritorna un dizionario con i contatori:
+      total, new, moved, updated, removed, fingerprinted, skipped_dirs,
+      errors, rows_per_sec
+    """
+    if ignore_patterns is None:
+        ignore_patterns = getattr(
+            settings, "SCAN_IGNORE_PATTERNS", DEFAULT_IGNORE_PATTERNS
+        )
+    if not workers:
+        workers = getattr(settings, "SCAN_WORKERS", DEFAULT_SCAN_WORKERS)
+    if fingerprint is None:
+        fingerprint = getattr(settings, "SCAN_FINGERPRINT", True)
+    is_ignored = compile_ignore_patterns(ignore_patterns)
+    roots = [os.path.normpath(root) for root in roots]
+
+    stats = {
+        "total": 0,
+        "new": 0,
+        "moved": 0,
+        "updated": 0,
+        "removed": 0,
+        "fingerprinted": 0,
+        "skipped_dirs": 0,
+        "errors": 0,
+    }
+    if fingerprint:
+        # i film senza impronta non potrebbero essere ricollegati se spostati
+        stats["fingerprinted"] = _backfill_fingerprints(roots)["updated"]
+    writer = _ScanWriter(stats, roots=roots, fingerprint=fingerprint)
+
+    # pila di cartelle da visitare: (path, cartella padre, stato nel manifest)
+    pending = deque()
+    for root in roots:
+        pending.append((root, "", _known_state(root)))
+
+    try:
+        _walk(pending, workers, incremental, is_ignored, writer, stats, progress)
+        writer.flush()
+    finally:
+        writer.close()
+
+    # le radici scansionate sono volumi collegati: riallinea la disponibilità
+    register_volumes(roots)
+    for volume in Volume.objects.filter(path__in=roots):
+        update_volume(volume, online=is_reachable(volume.path))
+
+    written = stats["new"] + stats["moved"] + stats["updated"]
+    stats["rows_per_sec"] = (
+        round(written / writer.write_seconds) if writer.write_seconds else 0
+    )
+    return stats
@@ -0,0 +1,127 @@
+"""
+Ricerca full-text sul catalogo con SQLite FTS5.
+
+La tabella virtuale catalogo_movie_fts indicizza titolo, regista, genere,
+trama e percorso di ogni film (rowid = pk del film). È una tabella FTS5 a
+"contenuto esterno": il testo resta solo in catalogo_movie e l'indice viene
+aggiornato da trigger SQL su INSERT, UPDATE e DELETE (vedi migrazione
+0019), quindi anche da bulk_create, bulk_update e update(), che non
+inviano i segnali di Django. Il comando rebuild_search_index lo ricostruisce
+da capo.
+
+Attenzione: su SQLite una migrazione che ricrea catalogo_movie (per esempio
+AddField di un campo non nullo o di un ManyToMany) elimina i trigger, che
+vanno ricreati come nella migrazione 0021.
+
+Il tokenizer unicode61 con remove_diacritics ignora maiuscole e accenti
+("perche" trova "Perché"); ogni parola cercata vale anche come prefisso
+("matr" trova "Matrix") e i risultati si ordinano per rilevanza con bm25,
+dando più peso al titolo che al percorso.
+
+La ricerca è una JOIN tra catalogo_movie e l'indice (model non gestito
+MovieSearchEntry): SQLite parte dai rowid trovati da MATCH e legge i film
+per pk, con il punteggio nella colonna nascosta rank, senza sottoquery
+per riga.
+
+Su un DB diverso da SQLite (o senza FTS5) la ricerca ripiega su icontains
+sugli stessi campi, senza ordinamento per rilevanza.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Lookup, Q, Value
+
+from .models import SearchDocumentField
+
+FTS_TABLE = "catalogo_movie_fts"
+FTS_COLUMNS = ("titolo", "regista", "genere", "trama", "percorso")
+# pesi bm25 delle colonne (rank), nello stesso ordine di FTS_COLUMNS
+FTS_WEIGHTS = (10.0, 5.0, 3.0, 1.0, 0.5)
+
+MAX_QUERY_TERMS = 8
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+_fts_available = None
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    """documento__match=espressione -> "catalogo_movie_fts" MATCH espressione"""
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+def fts_available() -> bool:
+    """True se il DB è SQLite e la tabella FTS5 esiste."""
+    global _fts_available
+    if _fts_available is None:
+        if connection.vendor != "sqlite":
+            _fts_available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [FTS_TABLE],
+                )
+                _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+
+def match_expression(text: str) -> str:
+    """
+    Espressione MATCH di FTS5 per il testo cercato: tutte le parole, ognuna
+    anche come prefisso. Le parole vanno tra virgolette, così la sintassi di
+    FTS5 (AND, OR, NEAR, *, ...) nel testo dell'utente non ha effetto.
+    """
+    words = WORD_RE.findall(text)[:MAX_QUERY_TERMS]
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_movies(queryset, text: str):
+    """
+    Filtra la queryset sui film che corrispondono al testo e aggiunge
+    l'annotazione search_rank (più bassa = più rilevante).
+    """
+    match = match_expression(text)
+    if not match:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    if not fts_available():
+        cond = Q()
+        for word in WORD_RE.findall(text)[:MAX_QUERY_TERMS]:
+            cond &= (
+                Q(titolo__icontains=word)
+                | Q(regista__icontains=word)
+                | Q(genere__icontains=word)
+                | Q(trama__icontains=word)
+                | Q(percorso__icontains=word)
+            )
+        return queryset.filter(cond).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+    return queryset.filter(ricerca__documento__match=match).annotate(
+        search_rank=F("ricerca__rank")
+    )
+
+
+def rebuild_index() -> int:
+    """Ricostruisce l'indice da catalogo_movie. Ritorna il numero di film indicizzati."""
+    if not fts_available():
+        return 0
+    weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', %s)",
+            [f"bm25({weights})"],
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
@@ -1,21 +1,37 @@
 // catalogo/static/catalogo/banner.js
 document.addEventListener('DOMContentLoaded', function () {
-  const banner = document.querySelector('.random-banner');
-  if (!banner) return;
+  if (!document.querySelector('.random-banner')) return;
+  var loading = false;
 
-  // FRECCE: ogni click ricarica la pagina -> la view sceglie un nuovo random_movie
-  banner.querySelectorAll('.amb-banner-arrow').forEach(function (btn) {
-    btn.addEventListener('click', function (e) {
-      e.preventDefault();
-      window.location.reload();
-    });
+  // FRECCE: chiedono un altro film casuale alla view random_banner (JSON) e
+  // sostituiscono solo il banner; se la richiesta fallisce si ricarica la pagina
+  document.addEventListener('click', function (e) {
+    var btn = e.target.closest('.random-banner .amb-banner-arrow');
+    if (!btn) return;
+    e.preventDefault();
+    if (loading) return;
+    loading = true;
+
+    var banner = btn.closest('.random-banner');
+    var url = new URL(banner.dataset.bannerUrl, window.location.origin);
+    url.searchParams.set('exclude', banner.dataset.movieId || '');
+    url.searchParams.set('next', window.location.pathname + window.location.search);
+
+    fetch(url, { headers: { 'Accept': 'application/json' } })
+      .then(function (r) {
+        if (!r.ok) throw new Error(r.status);
+        return r.json();
+      })
+      .then(function (data) {
+        if (data.html) banner.outerHTML = data.html;
+      })
+      .catch(function () {
+        window.location.reload();
+      })
+      .finally(function () {
+        loading = false;
+      });
   });
 
   // PLAY: lascia che il browser segua l'href verso movie_play (nessun preventDefault)
-  const playBtn = banner.querySelector('.amb-btn-play');
-  if (playBtn) {
-    playBtn.addEventListener('click', function () {
-      // intentionally empty: default navigation
-    });
-  }
 });
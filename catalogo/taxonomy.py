@@ -0,0 +1,206 @@
+"""
+Generi e registi normalizzati.
+
+I campi di testo Movie.genere e Movie.regista restano quelli che si vedono
+e si modificano ("Drammatico, Thriller"), ma ogni nome ha anche la sua riga
+in Genre / Person, legata ai film da MovieGenre / MovieDirector con la
+posizione nel testo (0 = genere principale). I filtri cercano il nome nella
+tabella dei generi o delle persone, che è piccola, e poi i film attraverso
+l'indice dei legami, invece di un LIKE su tutto il catalogo.
+
+I legami si ricavano sempre dal testo con sync_links, che confronta quelli
+attuali con quelli voluti e scrive solo le differenze:
+  - save() di un film (form, admin, update_movie_poster) tramite il segnale
+    post_save (vedi apps.py);
+  - le scritture in blocco (arricchimento, import, ripristino), che non
+    inviano segnali, la chiamano esplicitamente per i film toccati.
+Il comando rebuild_movie_links li ricalcola per tutto il catalogo.
+"""
+
+import re
+
+from django.apps import apps as global_apps
+from django.db import transaction
+
+from .models import Genre, MovieDirector, MovieGenre, Person
+from .pagecache import bump_catalog_version
+
+SYNC_CHUNK_SIZE = 500
+NAME_MAX_LENGTH = 100
+
+NAME_SPLIT_RE = re.compile(r"\s*[,;/|]\s*")
+
+# campo di testo del film -> (model dei nomi, model dei legami, campo FK)
+RELATIONS = {
+    "genere": ("Genre", "MovieGenre", "genre"),
+    "regista": ("Person", "MovieDirector", "person"),
+}
+
+
+def name_key(name: str) -> str:
+    """Nome normalizzato: minuscolo e con gli spazi ridotti a uno."""
+    return " ".join(name.split()).casefold()[:NAME_MAX_LENGTH]
+
+
+def split_names(text: str) -> list:
+    """
+    Nomi distinti di un campo genere/regista, nell'ordine del testo.
+    "Drammatico, Thriller; drammatico" -> ["Drammatico", "Thriller"]
+    """
+    names = {}
+    for name in NAME_SPLIT_RE.split(text or ""):
+        name = " ".join(name.split())[:NAME_MAX_LENGTH]
+        if name:
+            names.setdefault(name_key(name), name)
+    return list(names.values())
+
+
+def _chunks(items, size: int = SYNC_CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _resolve(model, names) -> dict:
+    """{chiave: pk} per i nomi, creando le righe che mancano."""
+    by_key = {name_key(name): name for name in names}
+    ids = {}
+    for chunk in _chunks(by_key):
+        ids.update(model.objects.filter(chiave__in=chunk).values_list("chiave", "pk"))
+    missing = [key for key in by_key if key not in ids]
+    if missing:
+        # ignore_conflicts: un'altra scrittura può averlo appena creato
+        model.objects.bulk_create(
+            [model(nome=by_key[key], chiave=key) for key in missing],
+            batch_size=SYNC_CHUNK_SIZE,
+            ignore_conflicts=True,
+        )
+        for chunk in _chunks(missing):
+            ids.update(
+                model.objects.filter(chiave__in=chunk).values_list("chiave", "pk")
+            )
+    return ids
+
+
+def _sync_relation(apps, text_field: str, rows, stats: dict):
+    entity_name, link_name, fk = RELATIONS[text_field]
+    entity = apps.get_model("catalogo", entity_name)
+    link = apps.get_model("catalogo", link_name)
+
+    names = {pk: split_names(text) for pk, text in rows}
+    ids = _resolve(entity, {n for movie_names in names.values() for n in movie_names})
+    wanted = {
+        (pk, ids[name_key(name)]): position
+        for pk, movie_names in names.items()
+        for position, name in enumerate(movie_names)
+    }
+
+    current = {
+        (movie_id, entity_id): (link_pk, position)
+        for link_pk, movie_id, entity_id, position in link.objects.filter(
+            movie_id__in=list(names)
+        ).values_list("pk", "movie_id", f"{fk}_id", "posizione")
+    }
+    stale = [link_pk for key, (link_pk, _pos) in current.items() if key not in wanted]
+    moved = [
+        link(pk=current[key][0], posizione=position)
+        for key, position in wanted.items()
+        if key in current and current[key][1] != position
+    ]
+    new = [
+        link(movie_id=movie_id, posizione=position, **{f"{fk}_id": entity_id})
+        for (movie_id, entity_id), position in wanted.items()
+        if (movie_id, entity_id) not in current
+    ]
+
+    for chunk in _chunks(stale):
+        link.objects.filter(pk__in=chunk).delete()
+    link.objects.bulk_update(moved, ["posizione"], batch_size=SYNC_CHUNK_SIZE)
+    link.objects.bulk_create(new, batch_size=SYNC_CHUNK_SIZE)
+    stats["added"] += len(new)
+    stats["removed"] += len(stale)
+    stats["moved"] += len(moved)
+
+
+def sync_links(pks, apps=None) -> dict:
+    """
+    Allinea generi e registi dei film con le pk date al testo dei campi
+    genere e regista letto dal DB. apps serve alle migrazioni (model
+    storici); di default i model attuali.
+
+    Ritorna un dizionario con i contatori: movies, added, removed, moved.
+    """
+    apps = apps or global_apps
+    movie = apps.get_model("catalogo", "Movie")
+    stats = {"movies": 0, "added": 0, "removed": 0, "moved": 0}
+    for chunk in _chunks(pk for pk in pks if pk is not None):
+        rows = list(movie.objects.filter(pk__in=chunk).values_list("pk", *RELATIONS))
+        with transaction.atomic():
+            for index, text_field in enumerate(RELATIONS, start=1):
+                _sync_relation(
+                    apps, text_field, [(row[0], row[index]) for row in rows], stats
+                )
+        stats["movies"] += len(rows)
+    if apps is global_apps and (stats["added"] or stats["removed"] or stats["moved"]):
+        bump_catalog_version()  # righe della home e filtri (vedi pagecache.py)
+    return stats
+
+
+def sync_all_links(apps=None, progress=None) -> dict:
+    """sync_links per tutto il catalogo, a blocchi di SYNC_CHUNK_SIZE film."""
+    apps = apps or global_apps
+    movie = apps.get_model("catalogo", "Movie")
+    stats = {"movies": 0, "added": 0, "removed": 0, "moved": 0}
+    pks = movie.objects.order_by("pk").values_list("pk", flat=True)
+    for chunk in _chunks(pks.iterator(chunk_size=5000)):
+        for key, value in sync_links(chunk, apps=apps).items():
+            stats[key] += value
+        if progress:
+            progress(stats)
+    return stats
+
+
+def prune_unused(apps=None) -> int:
+    """Elimina generi e persone senza più film. Ritorna quanti ne ha tolti."""
+    apps = apps or global_apps
+    deleted = 0
+    for entity_name, link_name, fk in RELATIONS.values():
+        entity = apps.get_model("catalogo", entity_name)
+        link = apps.get_model("catalogo", link_name)
+        used = link.objects.values(f"{fk}_id")
+        deleted += entity.objects.exclude(pk__in=used).delete()[0]
+    return deleted
+
+
+def sync_links_on_save(sender, instance, update_fields=None, **kwargs):
+    """Ricevitore di post_save di Movie: legami da riallineare al testo."""
+    if update_fields is not None and not set(RELATIONS) & set(update_fields):
+        return
+    sync_links([instance.pk])
+
+
+def _matching(model, text: str):
+    """
+    Righe di model con il nome text, se esiste (i link delle faccette), se no
+    quelle il cui nome contiene text.
+    """
+    exact = model.objects.filter(chiave=name_key(text))
+    if exact.exists():
+        return exact
+    return model.objects.filter(nome__icontains=text.strip())
+
+
+def filter_by_genre(queryset, text: str):
+    """Film con il genere text o, se non esiste, uno che lo contiene (es. "dramm")."""
+    genres = _matching(Genre, text)
+    return queryset.filter(
+        pk__in=MovieGenre.objects.filter(genre__in=genres).values("movie_id")
+    )
+
+
+def filter_by_director(queryset, text: str):
+    """Film con il regista text o, se non esiste, uno il cui nome lo contiene."""
+    people = _matching(Person, text)
+    return queryset.filter(
+        pk__in=MovieDirector.objects.filter(person__in=people).values("movie_id")
+    )
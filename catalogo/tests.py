@@ -1,3 +1,649 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from .availability import is_reachable
+from .backup import restore_ndjson, stream_ndjson
+from .facets import movie_facets
+from .keyset import SORT_OPTIONS, keyset_page, neighbours
+from .management.commands.bench_release_parser import (
+    DEFAULT_CORPUS,
+    _norm_title,
+    load_corpus,
+)
+from .models import Genre, Movie
+from .omdb import QuotaExceeded, fetch_omdb_ratings, quota_remaining
+from .omdb_scheduler import DRAIN_BATCH_SIZE, drain_ratings_queue, ratings_queue
+from .pagecache import catalog_version
+from .random_pick import _pool
+from .scanner import _size_mb, scan_library
+from .search import search_movies
+from .utils import guess_title_and_year, parse_release_name, parse_release_names
+from .views import build_movie_filters
+
+
+class ReachabilityTests(SimpleTestCase):
+    def test_hung_volume_does_not_block(self):
+        release = threading.Event()
+        with mock.patch(
+            "catalogo.availability.os.path.isdir",
+            side_effect=lambda _path: release.wait(5),
+        ) as isdir:
+            self.assertFalse(is_reachable("/mnt/nas", timeout=0.05))
+            # lo stat di prima è ancora appeso: nessun nuovo thread
+            self.assertFalse(is_reachable("/mnt/nas", timeout=0.05))
+            self.assertEqual(isdir.call_count, 1)
+            stuck = [t for t in threading.enumerate() if t.name == "stat /mnt/nas"]
+            self.assertTrue(stuck)
+
+            release.set()
+            for thread in stuck:
+                thread.join(1)
+            self.assertTrue(is_reachable("/mnt/nas", timeout=1))
+            self.assertEqual(isdir.call_count, 2)
+
+
+class ReleaseNameParserTests(SimpleTestCase):
+    def test_real_world_corpus(self):
+        # ogni nome del corpus etichettato a mano deve restare corretto
+        corpus = load_corpus(DEFAULT_CORPUS)
+        self.assertTrue(corpus)
+        for (name, expected), result in zip(
+            corpus, parse_release_names([name for name, _e in corpus])
+        ):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    _norm_title(result["title"]), _norm_title(expected["title"])
+                )
+                self.assertEqual(result["year"], expected["year"])
+                self.assertEqual(result["resolution"], expected["resolution"])
+                self.assertEqual(result["codec"], expected["codec"])
+                self.assertEqual(result["edition"], expected["edition"])
+                self.assertEqual(result["part"], expected["part"])
+                if expected["language"]:
+                    self.assertIn(expected["language"], result["languages"])
+
+    def test_metadata_words_stay_in_title(self):
+        cases = {
+            "The.French.Connection.1971.1080p.BluRay.x264-AMIABLE.mkv": (
+                "The French Connection",
+                1971,
+            ),
+            "Internal.Affairs.1990.avi": ("Internal Affairs", 1990),
+            "Cheri.2009.iTALiAN.LiMITED.AC3.DVDRip.XviD.GBM.avi": ("Cheri", 2009),
+        }
+        for name, (title, year) in cases.items():
+            with self.subTest(name=name):
+                result = parse_release_name(name)
+                self.assertEqual(result["title"], title)
+                self.assertEqual(result["year"], year)
+
+    def test_year_inside_title(self):
+        self.assertEqual(
+            guess_title_and_year("1917.2019.1080p.BluRay.x264-SPARKS.mkv"),
+            ("1917", 2019),
+        )
+        self.assertEqual(
+            guess_title_and_year("Blade.Runner.2049.2017.2160p.HEVC.mkv"),
+            ("Blade Runner 2049", 2017),
+        )
+
+    def test_metadata_without_year(self):
+        result = parse_release_name("Heat 1080p x264.mkv")
+        self.assertEqual(result["title"], "Heat")
+        self.assertIsNone(result["year"])
+        self.assertEqual(result["resolution"], "1080p")
+        self.assertEqual(result["codec"], "H.264")
+
+    def test_batch_matches_single(self):
+        names = ["Alien.1979.720p.mkv", "[YTS] Up (2009) [1080p].mp4", "Vertigo.avi"]
+        self.assertEqual(
+            parse_release_names(names), [parse_release_name(n) for n in names]
+        )
+
+
+def _expected_order(movies, field, descending):
+    """Ordine atteso calcolato in Python: valore, pk come spareggio, NULL in fondo."""
+    if field == "pk":
+        return sorted(movies, key=lambda m: m.pk, reverse=descending)
+    with_value = [m for m in movies if getattr(m, field) is not None]
+    without = [m for m in movies if getattr(m, field) is None]
+    with_value.sort(key=lambda m: (getattr(m, field), m.pk), reverse=descending)
+    without.sort(key=lambda m: m.pk, reverse=descending)
+    return with_value + without
+
+
+class KeysetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        day = datetime.date(2024, 1, 1)
+        # valori ripetuti e NULL per verificare spareggi e posizione dei NULL
+        rows = [
+            ("Alien", 1979, 9, day),
+            ("Aliens", 1986, 9, None),
+            ("Heat", 1995, None, day),
+            ("Up", None, 7, day + datetime.timedelta(days=3)),
+            ("Alien", 1979, 8, None),
+            ("Vertigo", None, None, None),
+            ("Casablanca", 1942, 10, day - datetime.timedelta(days=5)),
+            ("Alien vs Predator", 2004, 4, day),
+        ]
+        for titolo, anno, voto, ultima_visione in rows:
+            Movie.objects.create(
+                titolo=titolo,
+                anno=anno,
+                voto=voto,
+                ultima_visione=ultima_visione,
+                percorso=f"/film/{titolo}.mkv",
+            )
+        cls.movies = list(Movie.objects.all())
+
+    def sorts(self):
+        return [s for s in SORT_OPTIONS if s != "rilevanza"]
+
+    def test_neighbours_every_sort(self):
+        qs = Movie.objects.all()
+        for sort in self.sorts():
+            expected = _expected_order(self.movies, *SORT_OPTIONS[sort])
+            for i, movie in enumerate(expected):
+                with self.subTest(sort=sort, movie=movie.pk):
+                    prev_movie, next_movie = neighbours(qs, movie, sort)
+                    self.assertEqual(prev_movie, expected[i - 1] if i else None)
+                    self.assertEqual(
+                        next_movie, expected[i + 1] if i + 1 < len(expected) else None
+                    )
+
+    def test_neighbours_by_relevance(self):
+        # il film arriva dal dettaglio, senza l'annotazione search_rank
+        qs = search_movies(Movie.objects.all(), "alien")
+        ranked = sorted(qs, key=lambda m: (m.search_rank, m.pk))
+        self.assertEqual(len(ranked), 4)
+        for i, movie in enumerate(ranked):
+            with self.subTest(movie=movie.pk):
+                prev_movie, next_movie = neighbours(
+                    qs, Movie.objects.get(pk=movie.pk), "rilevanza"
+                )
+                self.assertEqual(prev_movie, ranked[i - 1] if i else None)
+                self.assertEqual(
+                    next_movie, ranked[i + 1] if i + 1 < len(ranked) else None
+                )
+
+    def walk(self, qs, sort, size):
+        """Tutte le pagine di keyset_page seguendo i cursori."""
+        seen = []
+        cursor = None
+        while True:
+            movies, cursor = keyset_page(qs, sort, cursor, size)
+            seen.extend(movies)
+            if cursor is None:
+                return seen
+
+    def test_pages_every_sort(self):
+        for sort in self.sorts():
+            expected = _expected_order(self.movies, *SORT_OPTIONS[sort])
+            for size in (1, 3, len(expected)):
+                with self.subTest(sort=sort, size=size):
+                    self.assertEqual(
+                        self.walk(Movie.objects.all(), sort, size), expected
+                    )
+
+    def test_pages_by_relevance(self):
+        qs = search_movies(Movie.objects.all(), "alien")
+        ranked = sorted(qs, key=lambda m: (m.search_rank, m.pk))
+        self.assertEqual(self.walk(qs, "rilevanza", 1), ranked)
+
+    def test_invalid_cursor_restarts(self):
+        first, _cursor = keyset_page(Movie.objects.all(), "anno_desc", None, 3)
+        for cursor in ("not-base64!", "bnVsbA", "WyJ4IiwgMV0"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(
+                    keyset_page(Movie.objects.all(), "anno_desc", cursor, 3)[0],
+                    first,
+                )
+
+    def test_feed_follows_cursor(self):
+        url = reverse("movie_list_feed")
+        total = 0
+        params = {"sort": "voto_desc"}
+        with mock.patch("catalogo.views.MOVIES_PER_PAGE", 3):
+            for _ in range(len(self.movies)):
+                data = self.client.get(url, params).json()
+                total += data["count"]
+                if not data["next_cursor"]:
+                    break
+                params["cursor"] = data["next_cursor"]
+        self.assertEqual(total, len(self.movies))
+        self.assertIsNone(data["next_cursor"])
+
+
+class ScannerTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        os.makedirs(os.path.join(self.root, "a"))
+        os.makedirs(os.path.join(self.root, "b"))
+
+    def write(self, rel_path, size=300_000):
+        path = os.path.join(self.root, rel_path)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        return path
+
+    def test_moved_file_keeps_its_record(self):
+        old = self.write("a/Alien.1979.mkv")
+        scan_library([self.root])
+        movie = Movie.objects.get()
+        Movie.objects.filter(pk=movie.pk).update(voto=9)
+
+        new = os.path.join(self.root, "b", "Alien.1979.mkv")
+        os.rename(old, new)
+        stats = scan_library([self.root])
+
+        self.assertEqual(stats["moved"], 1)
+        self.assertEqual(stats["new"], 0)
+        movie = Movie.objects.get()
+        self.assertEqual(movie.percorso, new)
+        self.assertEqual(movie.voto, 9)
+
+    def test_existing_film_without_fingerprint_is_relinked(self):
+        # film a catalogo da prima dell'impronta
+        old = self.write("a/Heat.1995.mkv")
+        # con la dimensione già giusta la scansione non lo aggiornerebbe
+        movie = Movie.objects.create(
+            titolo="Heat",
+            anno=1995,
+            percorso=old,
+            voto=8,
+            dimensione_file_mb=_size_mb(os.path.getsize(old)),
+        )
+        self.assertEqual(scan_library([self.root])["fingerprinted"], 1)
+
+        new = os.path.join(self.root, "b", "Heat.1995.mkv")
+        os.rename(old, new)
+        stats = scan_library([self.root])
+
+        self.assertEqual(stats["moved"], 1)
+        self.assertEqual(Movie.objects.get().pk, movie.pk)
+        self.assertEqual(Movie.objects.get().percorso, new)
+
+    def test_copy_is_not_relinked(self):
+        # l'originale esiste ancora: la copia è un film nuovo (duplicato)
+        original = self.write("a/Up.2009.mkv")
+        scan_library([self.root])
+        with open(original, "rb") as src, open(
+            os.path.join(self.root, "b", "Up.2009.mkv"), "wb"
+        ) as dst:
+            dst.write(src.read())
+        stats = scan_library([self.root])
+
+        self.assertEqual(stats["new"], 1)
+        self.assertEqual(stats["moved"], 0)
+        self.assertEqual(Movie.objects.filter(percorso=original).count(), 1)
+
+    def test_incremental_scan_sees_file_rewritten_in_place(self):
+        path = self.write("a/Vertigo.1958.mkv")
+        scan_library([self.root])
+        folder = os.stat(os.path.dirname(path))
+        with open(path, "ab") as f:
+            f.write(os.urandom(2_000_000))
+        # riscrittura sul posto: l'mtime della cartella non cambia
+        os.utime(os.path.dirname(path), ns=(folder.st_atime_ns, folder.st_mtime_ns))
+
+        stats = scan_library([self.root])
+
+        self.assertEqual(stats["updated"], 1)
+        self.assertEqual(
+            Movie.objects.get().dimensione_file_mb, _size_mb(os.path.getsize(path))
+        )
+
+
+def _omdb_reply(status=200, metascore="80"):
+    reply = mock.Mock(status_code=status, text="")
+    reply.json.return_value = {"Response": "True", "Metascore": metascore}
+    return reply
+
+
+@override_settings(
+    OMDB_API_KEY="test", OMDB_DAILY_LIMIT=3, OMDB_REQUESTS_PER_SECOND=1000
+)
+class OmdbQuotaTests(TransactionTestCase):
+    def setUp(self):
+        # niente cache su disco: ogni chiamata arriva a requests.get
+        patcher = mock.patch(
+            "catalogo.omdb.cached_fetch", lambda _endpoint, _params, fetch: fetch()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # il DB di test in memoria non regge scritture concorrenti (table locked)
+        workers = mock.patch("catalogo.omdb_scheduler.DRAIN_WORKERS", 1)
+        workers.start()
+        self.addCleanup(workers.stop)
+
+    def test_reply_consumes_quota(self):
+        with mock.patch("catalogo.omdb.requests.get", return_value=_omdb_reply()):
+            ratings = fetch_omdb_ratings("tt0078748")
+        self.assertEqual(ratings["critic_rating"], 8.0)
+        self.assertEqual(quota_remaining(), 2)
+
+    def test_network_error_refunds_quota(self):
+        with mock.patch("catalogo.omdb.requests.get", side_effect=requests.Timeout()):
+            with self.assertRaises(requests.Timeout):
+                fetch_omdb_ratings("tt0078748", raise_errors=True)
+            self.assertIsNone(fetch_omdb_ratings("tt0078748"))
+        self.assertEqual(quota_remaining(), 3)
+
+    def test_no_call_when_quota_is_spent(self):
+        with mock.patch(
+            "catalogo.omdb.requests.get", return_value=_omdb_reply()
+        ) as get:
+            for _ in range(3):
+                fetch_omdb_ratings("tt0078748")
+            with self.assertRaises(QuotaExceeded):
+                fetch_omdb_ratings("tt0078748", raise_errors=True)
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(quota_remaining(), 0)
+
+    def test_limit_reply_closes_the_day(self):
+        reply = _omdb_reply(status=401)
+        reply.text = "Request limit reached!"
+        with mock.patch("catalogo.omdb.requests.get", return_value=reply):
+            with self.assertRaises(QuotaExceeded):
+                fetch_omdb_ratings("tt0078748", raise_errors=True)
+        self.assertEqual(quota_remaining(), 0)
+
+    def test_drain_stops_at_budget(self):
+        for i in range(5):
+            Movie.objects.create(titolo=f"Film {i}", imdb_id=f"tt{i:07d}")
+        with mock.patch(
+            "catalogo.omdb.requests.get", return_value=_omdb_reply()
+        ) as get:
+            stats = drain_ratings_queue()
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(stats["updated"], 3)
+        self.assertTrue(stats["exhausted"])
+        self.assertEqual(
+            Movie.objects.filter(critic_checked_at__isnull=True).count(), 2
+        )
+
+    @override_settings(OMDB_DAILY_LIMIT=1000)
+    def test_drain_stops_when_network_is_down(self):
+        Movie.objects.bulk_create(
+            Movie(titolo=f"Film {i}", imdb_id=f"tt{i:07d}") for i in range(120)
+        )
+        with mock.patch(
+            "catalogo.omdb.requests.get", side_effect=requests.ConnectionError()
+        ) as get:
+            stats = drain_ratings_queue()
+        # un solo blocco: le richieste fallite non consumano il budget
+        self.assertEqual(get.call_count, DRAIN_BATCH_SIZE)
+        self.assertTrue(stats["offline"])
+        self.assertEqual(stats["quota_left"], 1000)
+
+    def test_drain_does_not_hide_bugs(self):
+        Movie.objects.create(titolo="Alien", imdb_id="tt0078748")
+        with mock.patch("catalogo.omdb.requests.get", side_effect=KeyError("x")):
+            with self.assertRaises(KeyError):
+                drain_ratings_queue()
+
+
+class CatalogVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(titolo="Alien", anno=1979, percorso="/a")
+
+    def assertBumps(self, write, bumps=True):
+        before = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        if bumps:
+            self.assertGreater(catalog_version(), before)
+        else:
+            self.assertEqual(catalog_version(), before)
+
+    def test_visible_writes_bump(self):
+        self.movie.voto = 8
+        self.assertBumps(self.movie.save)
+        self.assertBumps(
+            lambda: Movie.objects.filter(pk=self.movie.pk).update(anno=1980)
+        )
+        self.assertBumps(lambda: Movie.objects.bulk_update([self.movie], ["voto"]))
+        self.assertBumps(self.movie.delete)
+
+    def test_service_writes_do_not_bump(self):
+        self.movie.impronta = "1:abc"
+        self.assertBumps(
+            lambda: self.movie.save(update_fields=["impronta"]), bumps=False
+        )
+        self.assertBumps(
+            lambda: Movie.objects.filter(pk=self.movie.pk).update(probe_firma="1:2"),
+            bumps=False,
+        )
+        self.assertBumps(
+            lambda: Movie.objects.bulk_update([self.movie], ["critic_checked_at"]),
+            bumps=False,
+        )
+
+    def test_update_without_rows_does_not_bump(self):
+        self.assertBumps(lambda: Movie.objects.filter(pk=0).update(voto=1), bumps=False)
+
+    def test_bump_waits_for_commit(self):
+        before = catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                Movie.objects.filter(pk=self.movie.pk).update(voto=3)
+            self.assertEqual(catalog_version(), before)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertGreater(catalog_version(), before)
+
+    def test_cached_page_follows_version(self):
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = "a" * 32
+        url = reverse("movie_detail", args=[self.movie.pk])
+        self.assertContains(self.client.get(url), "Alien")
+
+        # modifica senza passare dal model: la pagina arriva dalla cache
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE catalogo_movie SET titolo = %s WHERE id = %s",
+                ["Aliens", self.movie.pk],
+            )
+        self.assertNotContains(self.client.get(url), "Aliens")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.filter(pk=self.movie.pk).update(titolo="Aliens")
+        self.assertContains(self.client.get(url), "Aliens")
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for codifica, estensione in [
+            ("H.264", ".mkv"),
+            ("H.264", ".mp4"),
+            ("H.264 10bit", ".mkv"),
+            ("HEVC", ".mkv"),
+        ]:
+            Movie.objects.create(
+                titolo="Film", codifica=codifica, estensione=estensione, percorso="/f"
+            )
+
+    def test_value_counts_match_results(self):
+        # "H.264" non deve prendere anche "H.264 10bit"
+        request = RequestFactory().get("/")
+        qs, _filtri = build_movie_filters(request)
+        facets = {f["titolo"]: f["options"] for f in movie_facets(request, qs)}
+        for titolo in ("Codifica", "Estensione"):
+            for option in facets[titolo]:
+                with self.subTest(facet=titolo, value=option["label"]):
+                    filtered, _filtri = build_movie_filters(
+                        RequestFactory().get("/?" + option["query"])
+                    )
+                    self.assertEqual(filtered.count(), option["count"])
+        self.assertIn(
+            ("H.264", 2), [(o["label"], o["count"]) for o in facets["Codifica"]]
+        )
+
+
+class RandomPoolTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_pool_follows_bulk_writes(self):
+        # scrittura in blocco senza segnali: conta solo la versione
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.bulk_create([Movie(titolo="Alien", percorso="/a")])
+        self.assertEqual(len(_pool("all")), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.bulk_create([Movie(titolo="Heat", percorso="/h")])
+        self.assertEqual(len(_pool("all")), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.filter(titolo="Alien").delete()
+        self.assertEqual(_pool("all"), [Movie.objects.get().pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.update(locandina_url="https://example.org/p.jpg")
+        self.assertEqual(len(_pool("poster")), 1)
+
+
+class MovieMigrationTests(TransactionTestCase):
+    """Da 0019 (indice full-text) ai legami generi/registi della 0020."""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("catalogo", target)])
+        executor.loader.build_graph()
+        return executor.loader.project_state(("catalogo", target)).apps
+
+    def latest(self):
+        graph = MigrationExecutor(connection).loader.graph
+        return [name for app, name in graph.leaf_nodes() if app == "catalogo"][0]
+
+    def tearDown(self):
+        self.migrate(self.latest())
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' "
+                "AND name LIKE 'catalogo_movie_fts_%%'"
+            )
+            return cursor.fetchone()[0]
+
+    def test_backfill_and_triggers(self):
+        apps = self.migrate("0019_movie_fts")
+        OldMovie = apps.get_model("catalogo", "Movie")
+        old = OldMovie.objects.create(
+            titolo="Alien",
+            genere="Fantascienza, Horror",
+            regista="Ridley Scott",
+            percorso="/a",
+        )
+        OldMovie.objects.create(
+            titolo="Blade Runner", genere="fantascienza", percorso="/b"
+        )
+
+        self.migrate(self.latest())
+
+        movie = Movie.objects.get(pk=old.pk)
+        self.assertEqual(
+            list(
+                movie.generi.order_by("movie_links__posizione").values_list(
+                    "nome", flat=True
+                )
+            ),
+            ["Fantascienza", "Horror"],
+        )
+        self.assertEqual(
+            list(movie.registi.values_list("nome", flat=True)), ["Ridley Scott"]
+        )
+        # stessa chiave, un solo genere anche con maiuscole diverse
+        self.assertEqual(Genre.objects.count(), 2)
+
+        # i trigger della 0019 ci sono ancora: l'indice segue le scritture
+        self.assertEqual(self.triggers(), 3)
+        Movie.objects.create(titolo="Gladiator", regista="Ridley Scott", percorso="/c")
+        found = search_movies(Movie.objects.all(), "ridley")
+        self.assertEqual(
+            sorted(found.values_list("titolo", flat=True)), ["Alien", "Gladiator"]
+        )
+
+    def test_rollback_keeps_triggers(self):
+        self.migrate("0019_movie_fts")
+        self.assertEqual(self.triggers(), 3)
+
+
+class BackupTests(TestCase):
+    def roundtrip(self):
+        """Esporta il catalogo, lo svuota e lo ripristina dall'NDJSON."""
+        lines = list(stream_ndjson())
+        Movie.objects.all().delete()
+        return restore_ndjson(lines)
+
+    def test_omdb_check_survives_restore(self):
+        # i voti della critica sono nel backup: niente nuova coda OMDb
+        checked = (timezone.now() - datetime.timedelta(days=1)).replace(microsecond=0)
+        Movie.objects.create(
+            titolo="Alien",
+            percorso="/a",
+            imdb_id="tt0078748",
+            critic_rating=8.9,
+            critic_checked_at=checked,
+            impronta="1:abc",
+        )
+        self.roundtrip()
+        movie = Movie.objects.get()
+        self.assertEqual(movie.critic_checked_at, checked)
+        self.assertEqual(movie.impronta, "")
+        self.assertFalse(ratings_queue().exists())
+
+    def restore(self, *rows):
+        return restore_ndjson(json.dumps(row) for row in rows)
+
+    def test_unique_imdb_id_relinks_moved_film(self):
+        movie = Movie.objects.create(
+            titolo="Heat", percorso="/old/heat.mkv", imdb_id="tt1"
+        )
+        stats = self.restore(
+            {"titolo": "Heat", "percorso": "/new/heat.mkv", "imdb_id": "tt1", "voto": 8}
+        )
+        self.assertEqual((stats["created"], stats["updated"]), (0, 1))
+        movie.refresh_from_db()
+        self.assertEqual((movie.percorso, movie.voto), ("/new/heat.mkv", 8))
+
+    def test_shared_imdb_id_creates_films(self):
+        # film in due parti: le righe non devono finire sullo stesso record
+        movie = Movie.objects.create(
+            titolo="Kill Bill", percorso="/old/cd1.mkv", imdb_id="tt2"
+        )
+        stats = self.restore(
+            {"titolo": "Kill Bill", "percorso": "/new/cd1.mkv", "imdb_id": "tt2"},
+            {"titolo": "Kill Bill", "percorso": "/new/cd2.mkv", "imdb_id": "tt2"},
+        )
+        self.assertEqual((stats["created"], stats["updated"]), (2, 0))
+        movie.refresh_from_db()
+        self.assertEqual(movie.percorso, "/old/cd1.mkv")
+        self.assertEqual(Movie.objects.filter(imdb_id="tt2").count(), 3)
+
+        # due film a catalogo con lo stesso imdb_id: nessuno dei due è "quello"
+        stats = self.restore(
+            {"titolo": "Kill Bill", "percorso": "/altro/cd1.mkv", "imdb_id": "tt2"}
+        )
+        self.assertEqual((stats["created"], stats["updated"]), (1, 0))
@@ -1,121 +1,321 @@
+"""
+Client TMDB.
+
+Un solo TMDBClient per processo, con una requests.Session condivisa
+(connessioni keep-alive riusate da tutti i thread) e retry con backoff
+esponenziale sugli errori temporanei (429, 5xx). Per ogni film servono al
+massimo due chiamate: la ricerca e il dettaglio, che con
+append_to_response=credits,external_ids porta anche regista e imdb_id.
+Quando regista e imdb_id non servono basta la ricerca: i generi si ricavano
+dai genre_ids del risultato con la mappa id -> nome, scaricata una volta e
+tenuta in cache.
+
+Se è stato importato l'indice locale dei titoli (tmdb_index.py) e il titolo
+identifica un film con sicurezza, la ricerca si salta del tutto.
+
+Tutte le risposte passano dalla cache su disco (apicache.py) e le chiamate
+di rete dal limitatore di frequenza (ratelimit.py). Per ogni endpoint il
+client tiene le latenze delle chiamate di rete (vedi TMDBClient.metrics).
+"""
+
+import threading
+import time
+from typing import Optional
+
 import requests
 from django.conf import settings
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .apicache import cached_fetch
+from .ratelimit import get_limiter
+from .tmdb_index import YEAR_TOLERANCE, get_title_index
 
-TMDB_SEARCH_URL = "https://api.themoviedb.org/3/search/movie"
+TMDB_API_BASE = "https://api.themoviedb.org/3"
+TMDB_SEARCH_URL = f"{TMDB_API_BASE}/search/movie"
 TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w500"
 
+DEFAULT_TIMEOUT = 5
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # secondi: 0.5, 1, 2, ...
 
-def fetch_movie_data_from_tmdb(
-    title: str, year: Optional[int] = None
-) -> Optional[dict]:
-    """
-    Chiede a TMDB i dati di un film e restituisce un dizionario con:
-      - poster_url
-      - overview (trama)
-      - year
-      - director
-      - genres (stringa tipo "Drammatico, Thriller")
-    Se non trova niente o c'è un errore, restituisce None.
-    """
-    api_key = getattr(settings, "TMDB_API_KEY", None)
-    if not api_key or api_key == "INSERISCI_LA_TUA_API_KEY_QUI":
-        return None
 
-    params = {
-        "api_key": api_key,
-        "query": title,
-        "include_adult": "false",
-        "language": "it-IT",
-    }
-    if year:
-        params["year"] = year
-
-    try:
-        resp = requests.get(TMDB_SEARCH_URL, params=params, timeout=5)
-        resp.raise_for_status()
-    except Exception:
-        return None
+def _release_year(release_date: str) -> Optional[int]:
+    if release_date and len(release_date) >= 4:
+        try:
+            return int(release_date[:4])
+        except ValueError:
+            return None
+    return None
 
-    data = resp.json()
-    results = data.get("results") or []
-    if not results:
-        return None
 
-    movie = results[0]
-    movie_id = movie.get("id")
-    poster_path = movie.get("poster_path")
-    release_date = movie.get("release_date") or ""
-    overview_it = movie.get("overview") or ""
+def _year_matches(data: dict, year: Optional[int]) -> bool:
+    found = _release_year(data.get("release_date") or "")
+    return not year or not found or abs(found - year) <= YEAR_TOLERANCE
 
-    director_name = None
-    genres_str = None
 
-    if movie_id:
-        try:
-            detail_resp = requests.get(
-                f"https://api.themoviedb.org/3/movie/{movie_id}",
-                params={
-                    "api_key": api_key,
-                    "language": "it-IT",
-                    "append_to_response": "credits",
-                },
-                timeout=5,
+class TMDBClient:
+    """Client TMDB con sessione condivisa, retry, cache e metriche di latenza."""
+
+    def __init__(
+        self,
+        api_key: str,
+        language: str = "it-IT",
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        pool_size: int = 10,
+    ):
+        self.api_key = api_key
+        self.language = language
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+
+        self._genres = None
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    # --- HTTP -------------------------------------------------------------
+
+    def _record(self, endpoint: str, elapsed_ms: float, ok: bool):
+        with self._lock:
+            m = self._metrics.setdefault(
+                endpoint, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
             )
-            detail_resp.raise_for_status()
-            detail_data = detail_resp.json()
+            m["calls"] += 1
+            m["errors"] += 0 if ok else 1
+            m["total_ms"] += elapsed_ms
+            m["max_ms"] = max(m["max_ms"], elapsed_ms)
+
+    def _get(self, endpoint: str, path: str, params: dict) -> dict:
+        url = f"{TMDB_API_BASE}{path}"
+        params = {"api_key": self.api_key, **params}
+
+        def fetch():
+            get_limiter("tmdb").acquire()
+            started = time.perf_counter()
+            ok = False
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+                resp.raise_for_status()
+                data = resp.json()
+                ok = True
+                return data
+            finally:
+                self._record(endpoint, (time.perf_counter() - started) * 1000, ok)
+
+        return cached_fetch(endpoint, {"url": url, **params}, fetch)
+
+    def metrics(self) -> dict:
+        """Latenze delle chiamate di rete: {endpoint: {calls, errors, avg_ms, max_ms}}."""
+        with self._lock:
+            return {
+                endpoint: {
+                    "calls": m["calls"],
+                    "errors": m["errors"],
+                    "avg_ms": round(m["total_ms"] / m["calls"], 1),
+                    "max_ms": round(m["max_ms"], 1),
+                }
+                for endpoint, m in self._metrics.items()
+                if m["calls"]
+            }
+
+    # --- endpoint ---------------------------------------------------------
+
+    def search(self, title: str, year: Optional[int] = None) -> list:
+        params = {"query": title, "include_adult": "false", "language": self.language}
+        if year:
+            params["year"] = year
+        return self._get("tmdb_search", "/search/movie", params).get("results") or []
 
+    def details(self, movie_id: int) -> dict:
+        """Dettaglio del film con crediti e id esterni in una sola chiamata."""
+        return self._get(
+            "tmdb_movie",
+            f"/movie/{movie_id}",
+            {
+                "language": self.language,
+                "append_to_response": "credits,external_ids",
+            },
+        )
+
+    def genre_map(self) -> dict:
+        """Mappa id genere -> nome (nella lingua del client)."""
+        if self._genres is None:
+            data = self._get(
+                "tmdb_genres", "/genre/movie/list", {"language": self.language}
+            )
+            self._genres = {
+                g["id"]: g["name"] for g in data.get("genres") or [] if g.get("name")
+            }
+        return self._genres
+
+    # --- film -------------------------------------------------------------
+
+    def fetch_movie_data(
+        self,
+        title: str,
+        year: Optional[int] = None,
+        details: bool = True,
+        raise_errors: bool = False,
+    ) -> Optional[dict]:
+        """
+        Cerca il film e ritorna i dati nel formato di apply_tmdb_data, oppure
+        None se non c'è nessun risultato o la ricerca fallisce (con
+        raise_errors=True un errore di rete rilancia l'eccezione, per
+        distinguerlo da "non trovato").
+
+        Con details=False si fa solo la ricerca: regista e imdb_id restano
+        vuoti e i generi vengono dalla mappa dei genre_ids. Se l'indice locale
+        risolve il titolo si fa invece solo il dettaglio (con tutti i campi).
+        """
+        movie = detail_data = None
+
+        # indice locale: se il titolo identifica un solo film basta il dettaglio
+        index = get_title_index()
+        tmdb_id = index.resolve(title, year) if index is not None else None
+        if tmdb_id:
+            try:
+                detail_data = self.details(tmdb_id)
+            except Exception:
+                detail_data = None
+            if detail_data and _year_matches(detail_data, year):
+                movie = detail_data
+            else:
+                # l'anno sbagliato serve comunque a scartare l'omonimo la prossima volta
+                if detail_data:
+                    index.learn_year(
+                        tmdb_id, _release_year(detail_data.get("release_date") or "")
+                    )
+                index.reject()
+                detail_data = None
+
+        if movie is None:
+            try:
+                results = self.search(title, year)
+            except Exception:
+                if raise_errors:
+                    raise
+                return None
+            if not results:
+                return None
+
+            movie = results[0]
+            if details and movie.get("id"):
+                try:
+                    detail_data = self.details(movie["id"])
+                except Exception:
+                    detail_data = None
+
+        release_date = movie.get("release_date") or ""
+        overview_it = movie.get("overview") or ""
+
+        director_name = None
+        genres_str = None
+        imdb_id = None
+
+        if detail_data:
             genres = detail_data.get("genres") or []
             if genres:
                 genres_str = ", ".join(g.get("name") for g in genres if g.get("name"))
 
-            credits = detail_data.get("credits") or {}
-            crew = credits.get("crew") or []
+            crew = (detail_data.get("credits") or {}).get("crew") or []
             for person in crew:
                 if person.get("job") == "Director":
                     director_name = person.get("name")
                     break
 
+            imdb_id = (detail_data.get("external_ids") or {}).get(
+                "imdb_id"
+            ) or detail_data.get("imdb_id")
+
             if not overview_it:
                 overview_it = detail_data.get("overview") or ""
-        except Exception:
-            pass
 
-    poster_url = f"{TMDB_IMAGE_BASE}{poster_path}" if poster_path else None
+        if not genres_str and movie.get("genre_ids"):
+            try:
+                names = self.genre_map()
+            except Exception:
+                names = {}
+            genres_str = (
+                ", ".join(names[g] for g in movie["genre_ids"] if g in names) or None
+            )
 
-    year_val: Optional[int] = None
-    if release_date and len(release_date) >= 4:
-        try:
-            year_val = int(release_date[:4])
-        except ValueError:
-            year_val = None
+        poster_path = movie.get("poster_path")
+        poster_url = f"{TMDB_IMAGE_BASE}{poster_path}" if poster_path else None
 
-    vote_average = movie.get("vote_average")
-    vote_count = movie.get("vote_count")
+        year_val = _release_year(release_date)
+        if index is not None and detail_data:
+            index.learn_year(detail_data.get("id"), year_val)
 
-    imdb_id = None
-    if movie_id:
-        try:
-            ext = requests.get(
-                f"https://api.themoviedb.org/3/movie/{movie_id}/external_ids",
-                params={"api_key": api_key},
-                timeout=5,
+        return {
+            "poster_url": poster_url,
+            "overview": (overview_it.strip() or None),
+            "year": year_val,
+            "director": director_name,
+            "genres": genres_str,
+            "public_rating": movie.get("vote_average"),
+            "public_votes": movie.get("vote_count"),
+            "imdb_id": imdb_id,
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_tmdb_client() -> Optional[TMDBClient]:
+    """Client condiviso, oppure None se settings.TMDB_API_KEY non è impostata."""
+    global _client
+    api_key = getattr(settings, "TMDB_API_KEY", None)
+    if not api_key or api_key == "INSERISCI_LA_TUA_API_KEY_QUI":
+        return None
+    with _client_lock:
+        if _client is None or _client.api_key != api_key:
+            _client = TMDBClient(
+                api_key,
+                retries=getattr(settings, "TMDB_RETRIES", DEFAULT_RETRIES),
+                pool_size=getattr(settings, "ENRICH_WORKERS", 10),
             )
-            ext.raise_for_status()
-            imdb_id = ext.json().get("imdb_id")
-        except Exception:
-            imdb_id = None
-
-    return {
-        "poster_url": poster_url,
-        "overview": (overview_it.strip() or None),
-        "year": year_val,
-        "director": director_name,
-        "genres": genres_str,
-        "public_rating": vote_average,
-        "public_votes": vote_count,
-        "imdb_id": imdb_id,
-    }
+        return _client
+
+
+def fetch_movie_data_from_tmdb(
+    title: str,
+    year: Optional[int] = None,
+    details: bool = True,
+    raise_errors: bool = False,
+) -> Optional[dict]:
+    """
+    Chiede a TMDB i dati di un film e restituisce un dizionario con:
+      - poster_url
+      - overview (trama)
+      - year
+      - director
+      - genres (stringa tipo "Drammatico, Thriller")
+      - public_rating, public_votes, imdb_id
+    Con details=False basta la ricerca (niente regista e imdb_id).
+    Se non trova niente o c'è un errore, restituisce None (con
+    raise_errors=True gli errori di rete rilanciano l'eccezione).
+    """
+    client = get_tmdb_client()
+    if client is None:
+        return None
+    return client.fetch_movie_data(
+        title, year, details=details, raise_errors=raise_errors
+    )
 
 
 # catalogo/tmdb.py
@@ -0,0 +1,244 @@
+"""
+Indice locale titolo -> id TMDB, costruito dai file di export giornalieri di
+TMDB (movie_ids_MM_DD_YYYY.json.gz: una riga JSON per film con id,
+original_title, popularity, adult, video).
+
+Con l'indice il client TMDB può saltare la ricerca: se il titolo normalizzato
+(minuscolo, senza accenti e punteggiatura) corrisponde a un solo film, o a un
+film molto più popolare degli altri omonimi, si chiede direttamente il
+dettaglio di quell'id. L'export non contiene l'anno: l'anno del dettaglio
+viene confrontato con quello del file e salvato nell'indice, così le volte
+successive gli omonimi si distinguono anche per anno. Senza l'anno del file
+quel controllo non c'è (un remake o un omonimo più recente dell'export
+passerebbe per buono) e si fa sempre la ricerca.
+
+Come la cache delle risposte (apicache.py) l'indice sta in un file SQLite a
+parte: sono quasi un milione di righe che non c'entrano col catalogo.
+"""
+
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Optional
+
+from django.conf import settings
+
+# il film più popolare vince sugli omonimi solo se lo è almeno di questo fattore
+POPULARITY_DOMINANCE = 5.0
+
+# differenza massima tra l'anno del file e quello di uscita su TMDB
+YEAR_TOLERANCE = 1
+
+INSERT_BATCH_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS title (
+    id INTEGER PRIMARY KEY,
+    norm TEXT NOT NULL,
+    original TEXT NOT NULL,
+    popularity REAL NOT NULL DEFAULT 0,
+    year INTEGER
+);
+CREATE INDEX IF NOT EXISTS title_norm ON title (norm, year);
+"""
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_title(title: str) -> str:
+    """'L'Été meurtrier' -> 'l ete meurtrier'."""
+    text = unicodedata.normalize("NFKD", title or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+
+
+def _open_export(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+class TitleIndex:
+    """Indice titolo normalizzato (+ anno) -> id TMDB su file SQLite."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.stats = {"resolved": 0, "ambiguous": 0, "unknown": 0, "rejected": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def ingest(self, paths, replace: bool = True, progress=None) -> dict:
+        """
+        Carica uno o più file di export (gzip o testo, una riga JSON per
+        film). Con replace=True il contenuto precedente viene sostituito;
+        gli anni già imparati restano per gli id ancora presenti.
+
+        Ritorna un dizionario con i contatori: read, imported, skipped.
+        """
+        conn = self._conn()
+        stats = {"read": 0, "imported": 0, "skipped": 0}
+
+        years = {}
+        if replace:
+            years = dict(
+                conn.execute("SELECT id, year FROM title WHERE year IS NOT NULL")
+            )
+
+        conn.execute("BEGIN")
+        try:
+            if replace:
+                conn.execute("DELETE FROM title")
+            rows = []
+            for path in paths:
+                with _open_export(path) as f:
+                    for line in f:
+                        stats["read"] += 1
+                        try:
+                            item = json.loads(line)
+                        except ValueError:
+                            stats["skipped"] += 1
+                            continue
+                        title = item.get("original_title") or item.get("title")
+                        if (
+                            not item.get("id")
+                            or not title
+                            or item.get("adult")
+                            or item.get("video")
+                        ):
+                            stats["skipped"] += 1
+                            continue
+                        norm = normalize_title(title)
+                        if not norm:
+                            stats["skipped"] += 1
+                            continue
+                        rows.append(
+                            (
+                                item["id"],
+                                norm,
+                                title,
+                                float(item.get("popularity") or 0),
+                                years.get(item["id"]),
+                            )
+                        )
+                        if len(rows) >= INSERT_BATCH_SIZE:
+                            stats["imported"] += self._insert(conn, rows)
+                            rows = []
+                            if progress:
+                                progress(stats)
+            stats["imported"] += self._insert(conn, rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return stats
+
+    @staticmethod
+    def _insert(conn, rows) -> int:
+        conn.executemany(
+            "INSERT OR REPLACE INTO title (id, norm, original, popularity, year) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        return len(rows)
+
+    def resolve(self, title: str, year: Optional[int] = None) -> Optional[int]:
+        """
+        Ritorna l'id TMDB del film se la corrispondenza è sicura, altrimenti
+        None (in quel caso serve la ricerca online). Senza anno non è mai
+        sicura: non si potrebbe verificare il dettaglio.
+        """
+        norm = normalize_title(title)
+        if not norm:
+            return None
+        if not year:
+            self._count("ambiguous")
+            return None
+        candidates = (
+            self._conn()
+            .execute(
+                "SELECT id, popularity, year FROM title WHERE norm = ? "
+                "ORDER BY popularity DESC",
+                (norm,),
+            )
+            .fetchall()
+        )
+        if not candidates:
+            self._count("unknown")
+            return None
+
+        # gli anni imparati escludono gli omonimi di altre epoche
+        candidates = [
+            c for c in candidates if c[2] is None or abs(c[2] - year) <= YEAR_TOLERANCE
+        ]
+        dated = [c for c in candidates if c[2] is not None]
+        if len(dated) == 1:
+            self._count("resolved")
+            return dated[0][0]
+
+        if len(candidates) == 1 or (
+            len(candidates) > 1
+            and candidates[0][1] >= POPULARITY_DOMINANCE * max(candidates[1][1], 0.1)
+        ):
+            self._count("resolved")
+            return candidates[0][0]
+
+        self._count("ambiguous")
+        return None
+
+    def reject(self):
+        """La corrispondenza trovata non andava bene (es. anno diverso)."""
+        self._count("rejected")
+
+    def learn_year(self, tmdb_id: int, year: Optional[int]):
+        if year:
+            self._conn().execute(
+                "UPDATE title SET year = ? WHERE id = ? AND year IS NULL",
+                (year, tmdb_id),
+            )
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM title").fetchone()[0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def index_path():
+    return getattr(
+        settings, "TMDB_INDEX_PATH", settings.BASE_DIR / "tmdb_index.sqlite3"
+    )
+
+
+def get_title_index(create: bool = False) -> Optional[TitleIndex]:
+    """
+    Indice condiviso, oppure None se il file non esiste ancora (e create è
+    False) o se settings.TMDB_INDEX_ENABLED è False.
+    """
+    global _index
+    if not getattr(settings, "TMDB_INDEX_ENABLED", True):
+        return None
+    path = str(index_path())
+    with _index_lock:
+        if _index is None or _index.path != path:
+            if not create and not os.path.exists(path):
+                return None
+            _index = TitleIndex(path)
+        return _index
@@ -3,7 +3,9 @@ from . import views
 
 urlpatterns = [
     path("generi/", views.movie_by_genre, name="movie_by_genre"),
+    path("generi/<slug:slug>/altri/", views.movie_rail_more, name="movie_rail_more"),
     path("", views.movie_list, name="movie_list"),
+    path("feed/", views.movie_list_feed, name="movie_list_feed"),
     path("play/<int:pk>/", views.movie_play, name="movie_play"),
     path("movie/<int:pk>/", views.movie_detail, name="movie_detail"),
     path("movie/<int:pk>/edit/", views.movie_edit, name="movie_edit"),
@@ -15,5 +17,23 @@ urlpatterns = [
     ),
     path("scan/", views.scan_folder, name="scan_folder"),
     path("update_posters/", views.update_posters, name="update_posters"),
+    path(
+        "update_posters/status/",
+        views.update_posters_status,
+        name="update_posters_status",
+    ),
     path("random/", views.random_movie, name="random_movie"),
+    path("random/banner/", views.random_banner, name="random_banner"),
+    path("duplicati/", views.movie_duplicates, name="movie_duplicates"),
+    path("esporta/<slug:fmt>/", views.movie_export, name="movie_export"),
+    path(
+        "locandine/<slug:digest>/<int:size>/",
+        views.poster_image,
+        name="poster_image",
+    ),
+    path(
+        "locandine/<slug:digest>/sfondo/",
+        views.poster_backdrop,
+        name="poster_backdrop",
+    ),
 ]
@@ -4,108 +4,321 @@ from typing import Optional, Tuple
 
 VIDEO_EXTENSIONS = [".mp4", ".mkv", ".avi", ".mov", ".wmv", ".mpg", ".mpeg"]
 YEAR_RE = re.compile(r"(19[0-9]{2}|20[0-3][0-9])")
+
+# Token riconosciuti nei nomi dei file "da release" (confronto in minuscolo).
+# Le codifiche usano gli stessi nomi di probe.py, così il campo codifica è
+# coerente sia che venga dal nome del file sia dall'header.
+RESOLUTION_TOKENS = {
+    "2160p": "2160p",
+    "4k": "2160p",
+    "uhd": "2160p",
+    "1080p": "1080p",
+    "1080i": "1080p",
+    "720p": "720p",
+    "576p": "576p",
+    "480p": "480p",
+}
+
+CODEC_TOKENS = {
+    "x264": "H.264",
+    "h264": "H.264",
+    "avc": "H.264",
+    "x265": "HEVC",
+    "h265": "HEVC",
+    "hevc": "HEVC",
+    "av1": "AV1",
+    "vp9": "VP9",
+    "xvid": "MPEG-4",
+    "divx": "MPEG-4",
+    "mpeg2": "MPEG-2",
+    "vc1": "VC-1",
+}
+
+LANGUAGE_TOKENS = {
+    "ita": "ita",
+    "italian": "ita",
+    "italiano": "ita",
+    "eng": "eng",
+    "english": "eng",
+    "fre": "fra",
+    "fra": "fra",
+    "french": "fra",
+    "ger": "deu",
+    "german": "deu",
+    "deu": "deu",
+    "spa": "spa",
+    "spanish": "spa",
+    "esp": "spa",
+    "jap": "jpn",
+    "japanese": "jpn",
+    "multi": "multi",
+}
+
+EDITION_TOKENS = {
+    "extended": "Extended",
+    "uncut": "Uncut",
+    "unrated": "Unrated",
+    "remastered": "Remastered",
+    "restored": "Restored",
+    "limited": "Limited",
+    "theatrical": "Theatrical",
+    "criterion": "Criterion",
+    "imax": "IMAX",
+}
+
+# Edizioni su due token: riconosciute solo dopo la fine del titolo
+# ("The Final Cut" resta un titolo), tranne il "director's cut"
+EDITION_PAIRS = {
+    ("directors", "cut"): "Director's Cut",
+    ("director's", "cut"): "Director's Cut",
+    ("final", "cut"): "Final Cut",
+    ("special", "edition"): "Special Edition",
+    ("extended", "cut"): "Extended",
+    ("extended", "edition"): "Extended",
+}
+
 NOISE_TOKENS = {
-    "italian",
-    "italiano",
-    "eng",
-    "english",
-    "multi",
     "sub",
     "subs",
+    "subbed",
+    "dubbed",
     "ac3",
     "dts",
-    "xvid",
-    "divx",
-    "h264",
-    "x264",
-    "h265",
-    "x265",
+    "aac",
     "dvdrip",
     "bdrip",
+    "brrip",
     "webrip",
     "webdl",
+    "web-dl",
+    "web",
     "bluray",
+    "blu-ray",
     "hdrip",
+    "hdtv",
+    "dvdscr",
+    "remux",
     "cam",
-    "limited",
-    "uncut",
-    "extended",
-    "remastered",
-    "1080p",
-    "720p",
-    "2160p",
-    "4k",
-    "uhd",
+    "proper",
+    "repack",
+    "internal",
+    "hdr",
+    "hdr10",
+    "10bit",
     "gbm",
     "i_n_r_g",
-    "ita",
+}
+
+# Token che sono anche parole comuni nei titoli ("The French Connection",
+# "Charlotte's Web", "Internal Affairs"): sono metadati solo dopo l'anno o,
+# senza anno, se vengono subito prima di altri metadati ("Cheri.iTALiAN.AC3")
+AMBIGUOUS_TOKENS = {
+    "web",
+    "cam",
+    "sub",
     "proper",
-    "repack",
+    "internal",
+    "multi",
+    "italian",
+    "italiano",
+    "english",
+    "french",
+    "german",
+    "spanish",
+    "japanese",
+    "extended",
+    "uncut",
+    "unrated",
+    "remastered",
+    "restored",
+    "limited",
+    "theatrical",
+    "criterion",
+    "imax",
 }
 
+# un unico dizionario token -> (tipo, valore): una sola lookup per token
+_TOKEN_KINDS = {}
+for _kind, _table in (
+    ("noise", {t: None for t in NOISE_TOKENS}),
+    ("edition", EDITION_TOKENS),
+    ("language", LANGUAGE_TOKENS),
+    ("codec", CODEC_TOKENS),
+    ("resolution", RESOLUTION_TOKENS),
+):
+    for _token, _value in _table.items():
+        _TOKEN_KINDS[_token] = (_kind, _value)
+
+TOKEN_RE = re.compile(r"[^\s._\[\]()]+")
+LEADING_GROUP_RE = re.compile(r"^\s*\[[^\]]*\]\s*")
+PART_RE = re.compile(r"(?:cd|disc|dvd|part|pt)(\d{1,2})")
+AUDIO_RE = re.compile(r"(?:ddp?|eac3|ac3|aac|dts|truehd|atmos|flac|opus|mp3)[\d+]*")
+
+
 TMDB_SEARCH_URL = "https://api.themoviedb.org/3/search/movie"
 TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w500"
 
 
-def guess_title_and_year(filename: str) -> Tuple[str, Optional[int]]:
+def _classify_token(low: str, next_low: str):
     """
-    Cerca di dedurre il titolo del film e l'anno da un nome file tipo:
-    'Cheri.2009.iTALiAN.LiMITED.AC3.DVDRip.XviD.GBM.avi'
-
-    Ritorna:
-        (titolo_pulito, anno_oppure_None)
+    Ritorna (tipo, valore) per un token in minuscolo, oppure None se il token
+    può far parte del titolo. next_low serve per i codec tipo "H.264".
     """
+    found = _TOKEN_KINDS.get(low)
+    if found:
+        return found
+    if low == "h":
+        # "H.264-GRP" viene spezzato in "h" + "264-grp"
+        number = next_low.split("-", 1)[0]
+        if number in ("264", "265"):
+            return "codec", CODEC_TOKENS["h" + number]
+    match = PART_RE.fullmatch(low)
+    if match:
+        return "part", int(match.group(1))
+    if AUDIO_RE.fullmatch(low):
+        return "noise", None
+    if "-" in low:
+        # "x264-GBM", "ITA-ENG", "WEB-DL": conta la prima parte (il resto è il gruppo)
+        head = low.split("-", 1)[0]
+        found = _TOKEN_KINDS.get(head)
+        if found:
+            return found
+    return None
 
-    # 1) Tieni solo il nome del file senza path
-    base = os.path.basename(filename)
 
-    # 2) Togli l'estensione (.mkv, .avi, .mp4, ecc.)
-    name, _ext = os.path.splitext(base)
+def parse_release_name(filename: str) -> dict:
+    """
+    Analizza un nome file tipo
+    'Cheri.2009.iTALiAN.LiMITED.AC3.DVDRip.XviD.GBM.avi'
+    in un solo passaggio sui token.
 
-    # 3) Sostituisci puntini/underscore con spazi
-    #    es: "Cheri.2009.iTALiAN..." → "Cheri 2009 iTALiAN..."
-    name_clean = re.sub(r"[._]+", " ", name).strip()
+    Ritorna un dizionario con:
+      title, year, resolution, codec, languages (lista), edition, part
+    """
+    # 1) Tieni solo il nome del file, senza path ed estensione video
+    base = os.path.basename(filename)
+    name, ext = os.path.splitext(base)
+    if ext.lower() not in VIDEO_EXTENSIONS:
+        name = base
 
-    # 4) Cerca un anno usando la regex
-    match_year = YEAR_RE.search(name_clean)
-    anno: Optional[int] = None
-    if match_year:
-        anno = int(match_year.group(0))
-        # prendiamo la parte prima dell'anno come base del titolo
-        title_part = name_clean[: match_year.start()]
-    else:
-        # se non troviamo anno, usiamo tutta la stringa
-        title_part = name_clean
+    # 2) Togli un eventuale tag del gruppo in testa: "[YTS] Titolo (2010)"
+    name = LEADING_GROUP_RE.sub("", name)
+    tokens = TOKEN_RE.findall(name)
+    lows = [t.lower() for t in tokens]
 
-    # 5) Spezzettiamo in token (parole)
-    tokens = title_part.split()
+    result = {
+        "title": "",
+        "year": None,
+        "resolution": None,
+        "codec": None,
+        "languages": [],
+        "edition": None,
+        "part": None,
+    }
 
-    cleaned_tokens = []
-    for t in tokens:
-        t_norm = t.lower()
+    # 3) Un solo giro: classifichiamo ogni token come anno, metadato
+    #    (inizio, fine, tipo, valore, ambiguo) o parola del titolo
+    years = []  # (indice, anno)
+    found_meta = []
+    i = 0
+    while i < len(lows):
+        low = lows[i]
+        next_low = lows[i + 1] if i + 1 < len(lows) else ""
+        if len(low) == 4 and YEAR_RE.fullmatch(low):
+            years.append((i, int(low)))
+            i += 1
+            continue
 
-        # se vediamo un token di "rumore", assumiamo che da lì in poi non sia più titolo
-        if t_norm in NOISE_TOKENS:
-            break
+        pair = EDITION_PAIRS.get((low, next_low))
+        if pair:
+            # "The Final Cut" può essere un titolo, il "director's cut" no
+            ambiguous = not low.startswith("director")
+            found_meta.append((i, i + 2, "edition", pair, ambiguous))
+            i += 2
+            continue
 
-        # salta cose tipo CD1, CD2, DISC1...
-        if re.match(r"cd\d+", t_norm) or re.match(r"disc\d+", t_norm):
+        found = _classify_token(low, next_low)
+        if found is None:
+            i += 1
             continue
+        kind, value = found
+        span = 2 if kind == "codec" and low == "h" else 1
+        ambiguous = low in AMBIGUOUS_TOKENS or low.split("-", 1)[0] in AMBIGUOUS_TOKENS
+        found_meta.append((i, i + span, kind, value, ambiguous))
+        i += span
 
-        cleaned_tokens.append(t)
+    # 4) Il titolo finisce all'ultimo anno prima dei metadati certi, ma mai
+    #    in prima posizione ("1917.2019.1080p", "Blade.Runner.2049.2017");
+    #    senza anno, prima dei metadati certi e di quelli ambigui attaccati
+    first_certain = next(
+        (start for start, _end, _k, _v, ambiguous in found_meta if not ambiguous),
+        len(tokens),
+    )
+    before = [(i, y) for i, y in years if 0 < i < first_certain]
+    if before:
+        title_end, result["year"] = before[-1]
+    else:
+        title_end = first_certain
+        ends = {end: start for start, end, _k, _v, ambiguous in found_meta if ambiguous}
+        while ends.get(title_end, 0) > 0:
+            title_end = ends[title_end]
+        after = [(i, y) for i, y in years if i >= title_end]
+        if after:
+            result["year"] = after[0][1]
 
-    # 6) Ricostruisci il titolo pulito
-    titolo = " ".join(cleaned_tokens).strip()
+    # 5) Metadati: solo quelli dopo il titolo
+    for start, _end, kind, value, _ambiguous in found_meta:
+        if start < title_end:
+            continue
+        if kind == "codec":
+            result["codec"] = result["codec"] or value
+        elif kind == "resolution":
+            result["resolution"] = result["resolution"] or value
+        elif kind == "language":
+            # "ITA-ENG": tutte le parti che sono lingue
+            for part in lows[start].split("-"):
+                lang = LANGUAGE_TOKENS.get(part)
+                if lang and lang not in result["languages"]:
+                    result["languages"].append(lang)
+        elif kind == "edition":
+            result["edition"] = result["edition"] or value
+        elif kind == "part":
+            result["part"] = value
 
-    # Se per qualche motivo è vuoto, fai un fallback sulla parte prima dell'anno
+    # 6) Ricostruisci il titolo pulito (senza trattini penzolanti); se è vuoto
+    #    ("1080p.ITA.Tron.mkv") restano le parole che non sono né anni né
+    #    metadati, e solo in ultimo tutto il nome
+    titolo = " ".join(tokens[:title_end]).strip(" -")
     if not titolo:
-        titolo = title_part.strip()
+        skip = {i for i, _y in years}
+        for start, end, *_rest in found_meta:
+            skip.update(range(start, end))
+        words = [t for i, t in enumerate(tokens) if i not in skip]
+        titolo = " ".join(words or tokens).strip(" -")
 
     # 7) Normalizza la capitalizzazione, se è tutto maiuscolo tipo CHERI → Cheri
     if titolo.isupper():
         titolo = titolo.title()
+    result["title"] = titolo
+
+    return result
+
+
+def parse_release_names(filenames) -> list:
+    """Versione batch di parse_release_name (stesso ordine dell'input)."""
+    return [parse_release_name(f) for f in filenames]
+
 
-    return titolo, anno
+def guess_title_and_year(filename: str) -> Tuple[str, Optional[int]]:
+    """
+    Cerca di dedurre il titolo del film e l'anno da un nome file tipo:
+    'Cheri.2009.iTALiAN.LiMITED.AC3.DVDRip.XviD.GBM.avi'
+
+    Ritorna:
+        (titolo_pulito, anno_oppure_None)
+    """
+    parsed = parse_release_name(filename)
+    return parsed["title"], parsed["year"]
 
     gruppi = defaultdict(list)
 
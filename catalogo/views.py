@@ -1,3 +1,4 @@
+import hashlib
 import os
 import platform
 import subprocess
@@ -5,20 +6,43 @@ from .forms import MovieForm
 import re
 import requests
 from django.db.models import Q
-import random
 from typing import Optional, Tuple
 import sys
-from collections import defaultdict
 from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 from .models import Movie
 from django.contrib import messages
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from .tmdb import fetch_movie_data_from_tmdb, apply_tmdb_data
+from .tmdb import fetch_movie_data_from_tmdb, apply_tmdb_data, get_tmdb_client
 from .utils import guess_title_and_year
 from .omdb import fetch_omdb_ratings
-
+from .omdb_scheduler import critic_rating_is_fresh, drain_in_background
+from .scanner import scan_library
+from .fingerprint import find_duplicates
+from .availability import refresh_in_background
+from .posters import backdrop_file, poster_file
+from .backup import EXPORT_FORMATS, stream_export, xlsx_available
+from .keyset import DEFAULT_SORT, keyset_page, neighbours
+from .search import search_movies
+from .taxonomy import filter_by_director, filter_by_genre
+from .pagecache import cached_page, catalog_version
+from .rails import home_rails, rail_page
+from .facets import movie_facets
+from .random_pick import random_movie as pick_random_movie, random_movie_with_poster
+from .enrichment import (
+    enrich_movies,
+    enrichment_status,
+    record_enrichment,
+    start_background_enrichment,
+)
+
+MOVIES_PER_PAGE = 24
+DEFAULT_MOVIE_COUNT_TTL = 60  # secondi
 
 VIDEO_EXTENSIONS = [".mp4", ".mkv", ".avi", ".mov", ".wmv", ".mpg", ".mpeg"]
 
@@ -27,86 +51,50 @@ YEAR_RE = re.compile(r"(19[0-9]{2}|20[0-3][0-9])")
 
 
 # Sezione Helper------------------------------
-def group_movies_by_genre(movies, max_per_genre: int = 24):
-    """
-    Restituisce una lista di sezioni già pronte per il template
-    (comprese “Top rated” e “Continua a guardare” se presenti).
-    """
-    sezioni = []
-
-    # Top rated (voto >= 8)
-    top_rated = Movie.objects.filter(voto__gte=8).order_by("-voto", "-id")[
-        :max_per_genre
-    ]
-    if top_rated:
-        sezioni.append(
-            {
-                "titolo": "Film 4 stelle e oltre",
-                "movies": top_rated,
-                "special": True,
-                "slug": "top-rated",
-            }
-        )
-
-    # Continua a guardare (ultima_visione recente)
-    continua_qs = Movie.objects.filter(ultima_visione__isnull=False).order_by(
-        "-ultima_visione"
-    )[:12]
-    if continua_qs:
-        sezioni.append(
-            {
-                "titolo": "Continua a guardare",
-                "movies": continua_qs,
-                "special": True,
-                "slug": "continua-a-guardare",
-            }
-        )
-
-    # Raggruppamento per genere (dall’elenco movies passato)
-    gruppi = defaultdict(list)
-    for m in movies:
-        raw_genere = (m.genere or "").strip()
-        main_genre = raw_genere.split(",")[0].strip() if raw_genere else "Senza genere"
-        gruppi[main_genre].append(m)
-
-    for genere, lista in sorted(gruppi.items(), key=lambda x: x[0]):
-        sezioni.append(
-            {
-                "titolo": genere,
-                "movies": lista[:max_per_genre],
-                "special": False,
-                "slug": None,
-            }
-        )
-
-    return sezioni
-
-
-def get_random_movie_with_poster():
-    qs = Movie.objects.exclude(locandina_url__isnull=True).exclude(
-        locandina_url__exact=""
-    )
-    if not qs.exists():
-        return None
-    return random.choice(list(qs))
-
-
 def pagination_base_query(request):
     q = request.GET.copy()
     q.pop("page", None)
+    q.pop("cursor", None)
     return q.urlencode()
 
 
+def sort_param(request) -> str:
+    """Ordinamento richiesto; con la ricerca libera di default per rilevanza."""
+    searching = bool(request.GET.get("q", "").strip())
+    sort = request.GET.get("sort") or ("rilevanza" if searching else DEFAULT_SORT)
+    if sort == "rilevanza" and not searching:
+        sort = DEFAULT_SORT
+    return sort
+
+
+def _cached_count(qs, base_query: str) -> int:
+    """
+    Numero di film della lista filtrata, in cache per MOVIE_COUNT_TTL secondi
+    o fino alla prossima modifica del catalogo.
+    """
+    digest = hashlib.md5(base_query.encode()).hexdigest()
+    key = f"movie_count:{catalog_version()}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = qs.count()
+        cache.set(
+            key, count, getattr(settings, "MOVIE_COUNT_TTL", DEFAULT_MOVIE_COUNT_TTL)
+        )
+    return count
+
+
 # ---------------------------------------------
 
 
-def build_movie_filters(request):
+def build_movie_filters(request, with_genre: bool = True):
     """
     Applica i filtri letti dalla querystring e restituisce
     la queryset filtrata e il dizionario dei filtri per il template.
+    with_genre=False ignora il filtro per genere (base della faccetta Genere).
     """
     qs = Movie.objects.all()
 
+    q = request.GET.get("q", "").strip()  # ricerca libera (indice full-text)
     titolo = request.GET.get("titolo", "")
     anno_da = request.GET.get("anno_da", "")
     anno_a = request.GET.get("anno_a", "")
@@ -117,22 +105,28 @@ def build_movie_filters(request):
     voto_a = request.GET.get("voto_a", "")
     codifica = request.GET.get("codifica", "")
     estensione = request.GET.get("estensione", "")
+    # valori esatti scelti dalle faccette (i campi del form sono "contiene")
+    codifica_eq = request.GET.get("codifica_eq", "")
+    estensione_eq = request.GET.get("estensione_eq", "")
     dim_da = request.GET.get("dim_da", "")
     dim_a = request.GET.get("dim_a", "")
     percorso = request.GET.get("percorso", "")
     stato = request.GET.get("stato", "")
     no_poster = request.GET.get("no_poster", "")
+    disponibile = request.GET.get("disponibile", "")  # "", "si", "no"
 
+    if q:
+        qs = search_movies(qs, q)
     if titolo:
         qs = qs.filter(titolo__icontains=titolo)
     if anno_da:
         qs = qs.filter(anno__gte=anno_da)
     if anno_a:
         qs = qs.filter(anno__lte=anno_a)
-    if genere:
-        qs = qs.filter(genere__icontains=genere)
+    if genere and with_genre:
+        qs = filter_by_genre(qs, genere)
     if regista:
-        qs = qs.filter(regista__icontains=regista)
+        qs = filter_by_director(qs, regista)
     if visto == "si":
         qs = qs.filter(visto=True)
     elif visto == "no":
@@ -145,6 +139,10 @@ def build_movie_filters(request):
         qs = qs.filter(codifica__icontains=codifica)
     if estensione:
         qs = qs.filter(estensione__icontains=estensione)
+    if codifica_eq:
+        qs = qs.filter(codifica=codifica_eq)
+    if estensione_eq:
+        qs = qs.filter(estensione=estensione_eq)
     if dim_da:
         qs = qs.filter(dimensione_file_mb__gte=dim_da)
     if dim_a:
@@ -155,8 +153,13 @@ def build_movie_filters(request):
         qs = qs.filter(stato=stato)
     if no_poster:
         qs = qs.filter(Q(locandina_url__isnull=True) | Q(locandina_url__exact=""))
+    if disponibile == "si":
+        qs = qs.filter(disponibile=True)
+    elif disponibile == "no":
+        qs = qs.filter(disponibile=False)
 
     filtri = {
+        "q": q,
         "titolo": titolo,
         "anno_da": anno_da,
         "anno_a": anno_a,
@@ -167,62 +170,102 @@ def build_movie_filters(request):
         "voto_a": voto_a,
         "codifica": codifica,
         "estensione": estensione,
+        "codifica_eq": codifica_eq,
+        "estensione_eq": estensione_eq,
         "dim_da": dim_da,
         "dim_a": dim_a,
         "percorso": percorso,
+        "stato": stato,
+        "no_poster": no_poster,
+        "disponibile": disponibile,
     }
     return qs, filtri
 
 
-def movie_list(request):
+def _render_banner(request, movie, next_url=None) -> str:
+    return render_to_string(
+        "catalogo/_banner_random.html",
+        {"movie": movie, "banner_next": next_url},
+        request=request,
+    )
 
-    qs, filtri = build_movie_filters(request)
-    sort_param = request.GET.get("sort", "titolo_az")
-    sort_map = {
-        "titolo_az": "titolo",
-        "titolo_za": "-titolo",
-        "anno_desc": "-anno",
-        "anno_asc": "anno",
-        "voto_desc": "-voto",
-        "voto_asc": "voto",
-        "ultima_visione": "-ultima_visione",
-        "recenti": "-id",
-    }
-    order_field = sort_map.get(sort_param, "titolo")
-    qs = qs.order_by(order_field)
 
-    # --- PAGINAZIONE ---
-    paginator = Paginator(qs, 24)  # 24 film per pagina
-    page_number = request.GET.get("page")  # numero pagina da URL ?page=2
+def _banner_html(request) -> str:
+    """HTML del banner con un film a caso ("" se nessun film ha la locandina)."""
+    return _render_banner(request, random_movie_with_poster())
 
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
 
-    # mantieni i filtri nei link di paginazione
-    base_query = pagination_base_query(request)
+def movie_list(request):
+
+    # disponibilità dei dischi e coda dei voti OMDb aggiornate in background
+    # (non bloccano la pagina)
+    refresh_in_background()
+    drain_in_background()
 
-    # 🔥 Film random con locandina per l'header
-    all_with_poster = Movie.objects.exclude(locandina_url__isnull=True).exclude(
-        locandina_url__exact=""
+    return _movie_list_page(request)
+
+
+# pagina in cache per versione del catalogo; il banner casuale no
+@cached_page(fill=_banner_html)
+def _movie_list_page(request):
+    # paginazione a chiave: i primi film dopo il cursore, senza COUNT né OFFSET
+    qs, filtri = build_movie_filters(request)
+    sort = sort_param(request)
+    movies, next_cursor = keyset_page(
+        qs, sort, request.GET.get("cursor"), MOVIES_PER_PAGE
     )
-    random_movie = random_movie = get_random_movie_with_poster()
+
+    # mantieni filtri e ordinamento nei link (pagina successiva, dettaglio)
+    base_query = pagination_base_query(request)
 
     return render(
         request,
         "catalogo/movie_list.html",
         {
             "active_page": "all_movies",
-            "movies": page_obj,
+            "movies": movies,
             "filtri": filtri,
-            "page_obj": page_obj,
-            "is_paginated": page_obj.has_other_pages(),
+            "current_sort": sort,
+            "total_count": _cached_count(qs, base_query),
+            # conteggi per valore dei filtri (una query raggruppata, in cache)
+            "facets": movie_facets(
+                request, qs, build_movie_filters(request, with_genre=False)[0]
+            ),
+            "cursor": request.GET.get("cursor", ""),
+            "next_cursor": next_cursor,
+            "base_query": base_query,
+            "list_url": request.get_full_path(),
+        },
+    )
+
+
+@cached_page()
+def movie_list_feed(request):
+    """
+    Blocco successivo di card della lista (stessi filtri, ordinamento e
+    cursore della querystring) per lo scroll infinito: HTML delle card e
+    cursore del blocco dopo.
+    """
+    qs, _filtri = build_movie_filters(request)
+    movies, next_cursor = keyset_page(
+        qs,
+        sort_param(request),
+        request.GET.get("cursor"),
+        MOVIES_PER_PAGE,
+    )
+    base_query = pagination_base_query(request)
+    html = render_to_string(
+        "catalogo/_movie_grid_cards.html",
+        {
+            "movies": movies,
             "base_query": base_query,
-            "random_movie": random_movie,
+            "list_url": reverse("movie_list")
+            + (f"?{base_query}" if base_query else ""),
         },
+        request=request,
+    )
+    return JsonResponse(
+        {"html": html, "count": len(movies), "next_cursor": next_cursor}
     )
 
 
@@ -234,6 +277,14 @@ def movie_play(request, pk):
         messages.error(request, "Nessun percorso file è stato salvato per questo film.")
         return redirect("movie_list")
 
+    # film su un disco scollegato: lo sappiamo dall'indice, niente accesso al disco
+    if not movie.disponibile:
+        messages.error(
+            request,
+            f"Il disco che contiene il film non è collegato:\n{file_path}",
+        )
+        return redirect("movie_list")
+
     file_path = os.path.normpath(file_path)
 
     if not os.path.exists(file_path):
@@ -263,81 +314,50 @@ def movie_play(request, pk):
 
 
 def scan_folder(request):
-    """Scansiona una cartella e aggiunge i file video al catalogo (con tentativo di anno dal nome)."""
+    """Scansiona una o più cartelle (una per riga) e aggiunge i file video al catalogo."""
     if request.method != "POST":
         return redirect("movie_list")
 
-    base_dir = request.POST.get("base_dir", "").strip()
+    base_dirs = [
+        d.strip() for d in request.POST.get("base_dir", "").splitlines() if d.strip()
+    ]
 
-    if not base_dir:
+    if not base_dirs:
         messages.error(request, "Devi specificare una cartella da scansionare.")
         return redirect("movie_list")
 
-    if not os.path.isdir(base_dir):
-        messages.error(
-            request, f"La cartella '{base_dir}' non esiste o non è accessibile."
-        )
-        return redirect("movie_list")
+    for base_dir in base_dirs:
+        if not os.path.isdir(base_dir):
+            messages.error(
+                request, f"La cartella '{base_dir}' non esiste o non è accessibile."
+            )
+            return redirect("movie_list")
 
-    count_total = 0
-    count_new = 0
-
-    for root, dirs, files in os.walk(base_dir):
-        for name in files:
-            ext = os.path.splitext(name)[1].lower()
-            if ext in VIDEO_EXTENSIONS:
-                count_total += 1
-                full_path = os.path.join(root, name)
-                size_mb = os.path.getsize(full_path) / (1024 * 1024)
-
-                # usa la funzione helper per capire titolo e anno
-                titolo, anno_trovato = guess_title_and_year(name)
-
-                # se non trova anno, metti un default (es. 2000)
-                anno = anno_trovato
-
-                movie, created = Movie.objects.get_or_create(
-                    percorso=full_path,
-                    defaults={
-                        "titolo": titolo,
-                        "anno": anno,
-                        "genere": "",
-                        "regista": "",
-                        "dimensione_file_mb": round(size_mb, 1),
-                        "estensione": ext,
-                        "codifica": "",
-                    },
-                )
-                if created:
-                    count_new += 1
-
-    if count_total == 0:
+    # di default la scansione è incrementale: le cartelle invariate non vengono rilette
+    incremental = not request.POST.get("full_scan")
+    stats = scan_library(base_dirs, incremental=incremental)
+
+    if stats["total"] == 0:
         messages.info(request, "Nessun file video trovato nella cartella.")
     else:
         messages.success(
             request,
-            f"Trovati {count_total} file video, aggiunti {count_new} nuovi film al catalogo.",
+            f"Trovati {stats['total']} file video, aggiunti {stats['new']} nuovi film al catalogo"
+            f" ({stats['moved']} spostati, {stats['updated']} aggiornati, {stats['removed']} non più presenti,"
+            f" {stats['skipped_dirs']} cartelle invariate, {stats['rows_per_sec']} righe/s).",
         )
 
     return redirect("movie_list")
 
 
+@cached_page(conditional=True)
 def movie_detail(request, pk):
     movie = get_object_or_404(Movie, pk=pk)
 
-    # stesso ordinamento della lista (titolo)
-    qs = Movie.objects.order_by("titolo").values_list("pk", flat=True)
-    ids = list(qs)
-
-    prev_movie = None
-    next_movie = None
-
-    if movie.pk in ids:
-        idx = ids.index(movie.pk)
-        if idx > 0:
-            prev_movie = Movie.objects.get(pk=ids[idx - 1])
-        if idx < len(ids) - 1:
-            next_movie = Movie.objects.get(pk=ids[idx + 1])
+    # stessi filtri e ordinamento della lista da cui si arriva (querystring):
+    # una query indicizzata per il precedente e una per il successivo
+    qs, _filtri = build_movie_filters(request)
+    prev_movie, next_movie = neighbours(qs, movie, sort_param(request))
 
     return render(
         request,
@@ -346,6 +366,7 @@ def movie_detail(request, pk):
             "movie": movie,
             "prev_movie": prev_movie,
             "next_movie": next_movie,
+            "nav_query": pagination_base_query(request),
         },
     )
 
@@ -406,40 +427,40 @@ def update_posters(request):
     if request.method != "POST":
         return redirect("movie_list")
 
-    movies = Movie.objects.filter(Q(trama__isnull=True) | Q(trama__exact=""))
-
-    count_checked = 0
-    count_updated = 0
-
-    for movie in movies:
-        count_checked += 1
-        data = fetch_movie_data_from_tmdb(movie.titolo, movie.anno)
-        if not data:
-            continue
-
-        changed_fields = apply_tmdb_data(movie, data, overwrite=False)
+    if get_tmdb_client() is None:
+        messages.error(request, "Chiave API di TMDB non configurata (TMDB_API_KEY).")
+        return redirect("movie_list")
 
-        imdb_id = data.get("imdb_id") or movie.imdb_id
-        if imdb_id:
-            omdb_data = fetch_omdb_ratings(imdb_id)
-            if omdb_data:
-                changed_fields += apply_tmdb_data(movie, omdb_data, overwrite=False)
+    if request.POST.get("background"):
+        if start_background_enrichment():
+            messages.info(
+                request,
+                "Aggiornamento dei metadati avviato in background: "
+                "puoi continuare a usare il catalogo.",
+            )
+        else:
+            messages.warning(request, "Un aggiornamento dei metadati è già in corso.")
+        return redirect("movie_list")
 
-        if changed_fields:
-            movie.save(update_fields=changed_fields)
-            count_updated += 1
+    stats = enrich_movies()
 
-    if count_checked == 0:
+    if stats["checked"] == 0:
         messages.info(request, "Non ci sono film da aggiornare.")
     else:
         messages.success(
             request,
-            f"Controllati {count_checked} film, aggiornati {count_updated} record.",
+            f"Controllati {stats['checked']} film, aggiornati {stats['updated']} record "
+            f"({stats['missed']} non trovati: verranno ricercati più avanti).",
         )
 
     return redirect("movie_list")
 
 
+def update_posters_status(request):
+    """Stato dell'aggiornamento metadati in background (JSON per il modal)."""
+    return JsonResponse(enrichment_status())
+
+
 def update_movie_poster(request, pk):
     """
     Aggiorna locandina e metadati per UN singolo film,
@@ -450,6 +471,8 @@ def update_movie_poster(request, pk):
     # qui usiamo la stessa funzione che usi in update_posters
     # supponiamo che ritorni un dizionario con i dati, oppure None se non trova nulla
     tmdb_data = fetch_movie_data_from_tmdb(movie.titolo, movie.anno)
+    if get_tmdb_client() is not None:
+        record_enrichment(movie, matched=bool(tmdb_data))
     if not tmdb_data:
         messages.warning(
             request, f"Nessun risultato trovato su TMDB per '{movie.titolo}'."
@@ -458,11 +481,14 @@ def update_movie_poster(request, pk):
 
     changed = apply_tmdb_data(movie, tmdb_data, overwrite=True)
 
+    # il voto della critica costa una richiesta OMDb: solo se non è recente
     imdb_id = tmdb_data.get("imdb_id") or movie.imdb_id
-    if imdb_id:
+    if imdb_id and not critic_rating_is_fresh(movie):
         omdb_data = fetch_omdb_ratings(imdb_id)
         if omdb_data:
             changed += apply_tmdb_data(movie, omdb_data, overwrite=True)
+            movie.critic_checked_at = timezone.now()
+            changed.append("critic_checked_at")
 
     if changed:
         movie.save(update_fields=changed)
@@ -476,14 +502,10 @@ def update_movie_poster(request, pk):
     return redirect("movie_list")
 
 
+@cached_page(fill=_banner_html)
 def movie_by_genre(request):
-    movies = Movie.objects.all().order_by("-id")
-    sezioni = group_movies_by_genre(movies, max_per_genre=24)
-
-    all_with_poster = Movie.objects.exclude(locandina_url__isnull=True).exclude(
-        locandina_url__exact=""
-    )
-    random_movie = get_random_movie_with_poster()
+    # righe per genere calcolate dal DB (vedi rails.py)
+    sezioni = home_rails()
 
     return render(
         request,
@@ -491,15 +513,116 @@ def movie_by_genre(request):
         {
             "active_page": "home",
             "sections": sezioni,
-            "random_movie": random_movie,
         },
     )
 
 
+@cached_page()
+def movie_rail_more(request, slug):
+    """
+    Card successive di una riga della home (freccia destra / scorrimento in
+    fondo alla riga): HTML delle card e cursore del blocco dopo.
+    """
+    page = rail_page(slug, request.GET.get("cursor"))
+    if page is None:
+        raise Http404("Riga non trovata")
+    movies, next_cursor = page
+    html = render_to_string(
+        "catalogo/_rail_cards.html", {"movies": movies}, request=request
+    )
+    return JsonResponse(
+        {"html": html, "count": len(movies), "next_cursor": next_cursor}
+    )
+
+
 def random_movie(request):
-    ids = list(Movie.objects.values_list("pk", flat=True))
-    if not ids:
+    movie = pick_random_movie()
+    if movie is None:
         messages.error(request, "Nessun film disponibile.")
         return redirect("movie_list")
-    pk = random.choice(ids)
-    return redirect("movie_detail", pk=pk)
+    return redirect("movie_detail", pk=movie.pk)
+
+
+def random_banner(request):
+    """
+    Un altro film a caso per il banner (frecce del banner): HTML del banner
+    in JSON, senza ricaricare la pagina. ?exclude=pk evita di ripescare il
+    film già mostrato, ?next= è la pagina a cui torna il tasto Riproduci.
+    """
+    try:
+        exclude = int(request.GET.get("exclude", ""))
+    except ValueError:
+        exclude = None
+    movie = random_movie_with_poster(exclude=exclude)
+    if movie is None:
+        return JsonResponse({"pk": None, "html": ""})
+
+    next_url = request.GET.get("next")
+    if not next_url or not url_has_allowed_host_and_scheme(
+        next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        next_url = reverse("movie_list")
+    html = _render_banner(request, movie, next_url)
+    return JsonResponse({"pk": movie.pk, "html": html})
+
+
+def movie_duplicates(request):
+    """Elenca i film con lo stesso contenuto salvati in percorsi diversi."""
+    gruppi = find_duplicates()
+    return render(
+        request,
+        "catalogo/movie_duplicates.html",
+        {
+            "groups": gruppi,
+        },
+    )
+
+
+def movie_export(request, fmt):
+    """
+    Esporta in streaming i film (con gli stessi filtri della lista) in CSV,
+    NDJSON o XLSX, senza caricarli tutti in memoria.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise Http404("Formato non supportato")
+    if fmt == "xlsx" and not xlsx_available():
+        messages.error(request, "Per esportare in XLSX serve openpyxl.")
+        return redirect("movie_list")
+
+    qs, _filtri = build_movie_filters(request)
+    content_type, ext = EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(
+        stream_export(fmt, qs.order_by("pk")), content_type=content_type
+    )
+    filename = f"filmoteca-{timezone.localdate():%Y%m%d}.{ext}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def poster_image(request, digest, size):
+    """
+    Copia locale di una locandina. L'URL contiene l'hash del contenuto, quindi
+    non cambia mai: il browser può tenerla in cache per sempre.
+    """
+    path = poster_file(digest, size)
+    if path is None:
+        raise Http404("Locandina non trovata")
+    return _immutable_image(path, f"{digest}-{size}")
+
+
+def poster_backdrop(request, digest):
+    """Sfondo già sfocato del banner, calcolato insieme alle copie locali."""
+    path = backdrop_file(digest)
+    if path is None:
+        raise Http404("Sfondo non trovato")
+    return _immutable_image(path, f"{digest}-sfondo")
+
+
+def _immutable_image(path, etag: str):
+    response = FileResponse(
+        open(path, "rb"),
+        content_type="image/webp" if path.suffix == ".webp" else "image/jpeg",
+    )
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    response["ETag"] = f'"{etag}"'
+    return response
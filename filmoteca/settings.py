@@ -111,6 +111,76 @@ AUTH_PASSWORD_VALIDATORS = [
 TMDB_API_KEY = "4a1ce42bf325082c86924f32159e7285"
 OMDB_API_KEY = "e476679b"
 
+# Scansione cartelle: thread paralleli e pattern da ignorare (la "/" finale = solo cartelle)
+SCAN_WORKERS = 8
+SCAN_IGNORE_PATTERNS = [
+    "sample/",
+    "samples/",
+    "extras/",
+    "featurettes/",
+    "@eaDir/",
+    "#recycle/",
+    "$RECYCLE.BIN/",
+    "System Volume Information/",
+    "*sample.*",
+]
+
+# Impronta dei file nuovi durante la scansione (riconosce i film spostati) e processi usati
+SCAN_FINGERPRINT = True
+FINGERPRINT_WORKERS = 4
+
+# Thread usati per leggere gli header dei file video (codec, durata, risoluzione)
+PROBE_WORKERS = 8
+
+# Disponibilità dei dischi: ogni quanti secondi ricontrollare i volumi e quanto
+# aspettare un disco che non risponde (NAS in standby, share di rete)
+AVAILABILITY_TTL = 300
+AVAILABILITY_TIMEOUT = 3.0
+
+# Arricchimento metadati: lookup in parallelo e richieste al secondo per servizio
+ENRICH_WORKERS = 8
+TMDB_REQUESTS_PER_SECOND = 40
+OMDB_REQUESTS_PER_SECOND = 5
+
+# Budget giornaliero di OMDb (chiave gratuita: 1000 richieste al giorno), giorni
+# dopo i quali il voto della critica va riletto e secondi tra due svuotamenti
+# automatici della coda
+OMDB_DAILY_LIMIT = 1000
+OMDB_REFRESH_DAYS = 90
+OMDB_DRAIN_INTERVAL = 900
+
+# Cache su disco delle risposte TMDB/OMDb (durata per endpoint in secondi)
+API_CACHE_ENABLED = True
+API_CACHE_PATH = BASE_DIR / "api_cache.sqlite3"
+API_CACHE_MAX_MB = 200
+API_CACHE_TTL = {
+    "tmdb_search": 7 * 24 * 3600,
+    "tmdb_movie": 30 * 24 * 3600,
+    "tmdb_genres": 30 * 24 * 3600,
+    "omdb": 7 * 24 * 3600,
+}
+
+# Indice locale titolo -> id TMDB (comando import_tmdb_ids)
+TMDB_INDEX_ENABLED = True
+TMDB_INDEX_PATH = BASE_DIR / "tmdb_index.sqlite3"
+
+# Copie locali delle locandine in WebP (comando sync_posters, serve Pillow)
+POSTER_ROOT = BASE_DIR / "locandine"
+POSTER_WORKERS = 8
+POSTER_WEBP_QUALITY = 80
+
+# Secondi per cui il numero totale di film della lista (con i filtri) resta in cache
+MOVIE_COUNT_TTL = 60
+
+# Secondi dopo i quali gli elenchi di pk per le scelte a caso (banner, film
+# casuale) vengono riletti anche senza modifiche ai film
+RANDOM_POOL_TTL = 600
+
+# Secondi di vita massima delle pagine in cache (lista, home, dettaglio): una
+# modifica ai film le rende comunque vecchie subito (vedi catalogo/pagecache.py).
+# Con più processi serve una cache condivisa in CACHES.
+PAGE_CACHE_TTL = 24 * 3600
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 